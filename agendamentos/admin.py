@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import Agendamento, Cliente, Servico
+from .models import Agendamento, Cliente, MensagemSMS, ResumoDiario, Servico
 
 
 @admin.register(Cliente)
@@ -16,6 +16,26 @@ class ServicoAdmin(admin.ModelAdmin):
 
 @admin.register(Agendamento)
 class AgendamentoAdmin(admin.ModelAdmin):
-    list_display = ("cliente", "servico", "data", "hora", "status")
+    list_display = ("cliente", "servico", "data", "hora", "status", "valor")
     list_filter = ("data", "status")
     search_fields = ("cliente__nome",)
+
+
+@admin.register(ResumoDiario)
+class ResumoDiarioAdmin(admin.ModelAdmin):
+    list_display = (
+        "data",
+        "servico",
+        "status",
+        "status_pagamento",
+        "quantidade",
+        "valor_total",
+    )
+    list_filter = ("status", "status_pagamento")
+
+
+@admin.register(MensagemSMS)
+class MensagemSMSAdmin(admin.ModelAdmin):
+    list_display = ("telefone", "tipo", "status", "tentativas", "criado_em")
+    list_filter = ("status", "tipo")
+    search_fields = ("telefone",)
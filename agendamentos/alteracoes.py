@@ -0,0 +1,180 @@
+"""
+Alterações de status e de pagamento feitas direto no banco.
+
+As ações rápidas do painel (requisições XHR) não carregam o agendamento nem
+chamam ``save()``: cada alteração é um único
+``UPDATE ... WHERE id IN (...) AND <campo> = <valor anterior> RETURNING ...``.
+A condição no valor anterior faz a alteração valer só se o agendamento ainda
+estiver no estado que a tela mostrava, e as linhas devolvidas trazem tudo de
+que os sinais de ``save()`` precisariam. Como ``update()`` não passa pelos
+sinais nem por ``auto_now``, esta função mesma:
+
+- grava ``atualizado_em``;
+- move a contribuição das linhas alteradas no resumo diário, uma vez por
+  grupo de linhas com a mesma chave (``ajustar_resumo``);
+- invalida o cache das datas alteradas.
+
+Quando o valor anterior já é o novo (toque repetido), nada é gravado. O
+``RETURNING`` também aceita ``anotacoes`` (subqueries correlacionadas, como o
+nome do cliente), para quem precisa renderizar o resultado sem ler o
+agendamento de novo.
+
+``RETURNING`` existe no PostgreSQL e no SQLite 3.35+.
+"""
+
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import cache_consultas
+from .models import Agendamento
+from .relatorios import CAMPOS_RESUMO, ajustar_resumo
+
+VALORES = {
+    "status": [valor for valor, _ in Agendamento.STATUS_CHOICES],
+    "status_pagamento": [valor for valor, _ in Agendamento.PAGAMENTO_CHOICES],
+}
+
+CAMPOS_DEVOLVIDOS = (
+    "id",
+    "data",
+    "status",
+    "status_pagamento",
+    "servico_id",
+    "valor",
+    "previsao_chegada",
+)
+
+
+def _devolvidos(anotacoes):
+    """
+    Expressões do ``RETURNING``: as colunas de ``CAMPOS_DEVOLVIDOS`` e as
+    ``anotacoes`` resolvidas contra a tabela de agendamentos, sem joins
+
+    Returns:
+        tuple: (nomes, expressões resolvidas, sql, parâmetros)
+    """
+    meta = Agendamento._meta
+    query = Agendamento.objects.all().query
+    compiler = query.get_compiler(connection=connection)
+    nomes = list(CAMPOS_DEVOLVIDOS)
+    expressoes = [
+        meta.get_field(nome_campo).get_col(meta.db_table) for nome_campo in nomes
+    ]
+    sqls = [connection.ops.quote_name(coluna.target.column) for coluna in expressoes]
+    parametros = []
+    for nome_campo, expressao in (anotacoes or {}).items():
+        resolvida = expressao.resolve_expression(query, allow_joins=False)
+        sql, params = compiler.compile(resolvida)
+        nomes.append(nome_campo)
+        expressoes.append(resolvida)
+        sqls.append(sql)
+        parametros.extend(params)
+    return nomes, expressoes, ", ".join(sqls), parametros
+
+
+def _atualizar(pks, campo, anterior, valores, anotacoes=None):
+    """Um UPDATE condicional; devolve as linhas alteradas como dicionários"""
+    meta = Agendamento._meta
+    nome = connection.ops.quote_name
+    atribuicoes, parametros = [], []
+    for nome_campo, valor in valores.items():
+        field = meta.get_field(nome_campo)
+        atribuicoes.append(f"{nome(field.column)} = %s")
+        parametros.append(field.get_db_prep_save(valor, connection))
+    nomes, expressoes, devolvidos, parametros_devolvidos = _devolvidos(anotacoes)
+
+    sql = (
+        f"UPDATE {nome(meta.db_table)} SET {', '.join(atribuicoes)} "
+        f"WHERE {nome(meta.pk.column)} IN ({', '.join(['%s'] * len(pks))}) "
+        f"AND {nome(meta.get_field(campo).column)} = %s "
+        f"RETURNING {devolvidos}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*parametros, *pks, anterior, *parametros_devolvidos])
+        resultado = cursor.fetchall()
+
+    # Os mesmos conversores que o ORM aplica (datas e decimais no SQLite)
+    conversores = [
+        connection.ops.get_db_converters(expressao)
+        + expressao.get_db_converters(connection)
+        for expressao in expressoes
+    ]
+    linhas = []
+    for valores_linha in resultado:
+        linha = {}
+        for nome_campo, coluna, funcoes, valor in zip(
+            nomes, expressoes, conversores, valores_linha
+        ):
+            for funcao in funcoes:
+                valor = funcao(valor, coluna, connection)
+            linha[nome_campo] = valor
+        linhas.append(linha)
+    return linhas
+
+
+def _mover_resumo(linhas, campo):
+    grupos = defaultdict(lambda: [0, 0])
+    for linha in linhas:
+        atual = {chave: linha[chave] for chave in CAMPOS_RESUMO}
+        antiga = {**atual, campo: linha["anterior"]}
+        if antiga == atual:
+            continue
+        grupo = grupos[tuple(antiga.items()), tuple(atual.items())]
+        grupo[0] += 1
+        grupo[1] += linha["valor"]
+
+    for (antiga, atual), (quantidade, valor) in grupos.items():
+        ajustar_resumo(dict(antiga), -quantidade, -valor)
+        ajustar_resumo(dict(atual), quantidade, valor)
+
+
+def alterar(pks, campo, novo, anteriores=None, anotacoes=None, **outros):
+    """
+    Grava ``campo = novo`` (e ``outros``) nos agendamentos ``pks`` cujo
+    ``campo`` está em ``anteriores``
+
+    Há um UPDATE por valor anterior possível (padrão: todos menos ``novo``),
+    interrompido quando todos os ``pks`` já foram alterados; informar o valor
+    anterior exibido na tela reduz a alteração a um único UPDATE. Sem
+    ``outros``, ``novo`` como anterior não muda nada e não é gravado.
+
+    Args:
+        pks (list): ids dos agendamentos
+        campo (str): "status" ou "status_pagamento"
+        novo (str): Valor a gravar
+        anteriores (list): Valores de ``campo`` que podem ser substituídos
+        anotacoes (dict): Expressões devolvidas junto com cada linha, sem
+            joins (ex.: ``Subquery`` com ``OuterRef``)
+        **outros: Outros campos gravados junto (ex.: previsao_chegada)
+
+    Returns:
+        list: [{'id', 'data', 'status', ..., 'anterior'}, ...] das linhas
+              alteradas, com os valores novos
+    """
+    if anteriores is None:
+        anteriores = [valor for valor in VALORES[campo] if valor != novo]
+    elif not outros:
+        anteriores = [valor for valor in anteriores if valor != novo]
+    valores = {campo: novo, **outros, "atualizado_em": timezone.now()}
+
+    restantes = list(dict.fromkeys(pks))
+    alteradas = []
+    # Sem savepoint quando já está dentro da transação de quem chama
+    with transaction.atomic(savepoint=False):
+        for anterior in anteriores:
+            if not restantes:
+                break
+            linhas = _atualizar(restantes, campo, anterior, valores, anotacoes)
+            for linha in linhas:
+                linha["anterior"] = anterior
+            alteradas.extend(linhas)
+            if linhas:
+                ids = {linha["id"] for linha in linhas}
+                restantes = [pk for pk in restantes if pk not in ids]
+
+        if alteradas:
+            _mover_resumo(alteradas, campo)
+            cache_consultas.invalidar_datas(*(linha["data"] for linha in alteradas))
+    return alteradas
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class AgendamentosConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "agendamentos"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from . import consultas_lentas, signals  # noqa: F401
+
+        connection_created.connect(consultas_lentas.instalar)
@@ -0,0 +1,187 @@
+"""
+Benchmark das páginas principais em camadas de volume.
+
+Cada cenário (painel, financeiro com cada filtro, calendário mensal, lista de
+clientes e agendamento) é medido com o cliente de testes do Django em dois
+modos:
+
+- ``frio`` - o cache de consultas é limpo antes de cada requisição, então a
+  medida inclui as queries de dados e a gravação no cache;
+- ``quente`` - as requisições reaproveitam o cache.
+
+Cada modo tem requisições de aquecimento descartadas, seguidas de
+``repeticoes`` medidas, resumidas em mínimo, média, percentis e máximo (em
+milissegundos), além da quantidade de queries e do tamanho da resposta. O
+resultado é um dicionário serializável em JSON que ``comparar`` confronta
+com uma execução de referência.
+
+O comando ``manage.py benchmark`` cria um banco de teste, popula a camada
+escolhida e grava o JSON.
+"""
+
+import platform
+import statistics
+import time
+from datetime import datetime
+
+import django
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import dados_sinteticos
+from .models import Agendamento
+
+CAMADAS = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+PERCENTIS = (50, 90, 95, 99)
+MODOS = ("frio", "quente")
+USUARIO = "benchmark"
+
+
+def popular(quantidade, referencia, seed=42):
+    """
+    Gera ``quantidade`` agendamentos em um ano terminando um mês depois de
+    ``referencia`` (``dados_sinteticos.gerar``). Volumes que não cabem em um
+    ano sem sobreposição recuam o início (``dados_sinteticos.dias_necessarios``)
+
+    Returns:
+        int: Quantidade de agendamentos criados
+    """
+    inicio, fim = dados_sinteticos.periodo(
+        referencia, dias=dados_sinteticos.dias_necessarios(quantidade)
+    )
+    gerados = dados_sinteticos.gerar(quantidade, inicio, fim, referencia, seed=seed)
+    return gerados["agendamentos"]
+
+
+def cenarios(referencia):
+    """[(nome, url, parametros), ...] medidos pelo benchmark"""
+    data = referencia.isoformat()
+    financeiro = reverse("financeiro")
+    return [
+        ("painel_barbeiro", reverse("painel_barbeiro"), {"data": data}),
+        ("financeiro", financeiro, {"data": data}),
+        ("financeiro_pendente", financeiro, {"data": data, "filtro": "pendente"}),
+        ("financeiro_pago", financeiro, {"data": data, "filtro": "pago"}),
+        (
+            "agendamentos_mensais",
+            reverse("agendamentos_mensais"),
+            {"ano": referencia.year, "mes": referencia.month},
+        ),
+        ("lista_clientes", reverse("lista_clientes"), {}),
+        ("agendar", reverse("agendar"), {}),
+    ]
+
+
+def resumir(tempos):
+    """Mínimo, média, percentis e máximo de ``tempos`` (segundos) em ms"""
+    milissegundos = sorted(tempo * 1000 for tempo in tempos)
+    cortes = statistics.quantiles(milissegundos, n=100, method="inclusive")
+    resumo = {
+        "min": milissegundos[0],
+        "media": statistics.fmean(milissegundos),
+        **{f"p{percentil}": cortes[percentil - 1] for percentil in PERCENTIS},
+        "max": milissegundos[-1],
+    }
+    return {chave: round(valor, 3) for chave, valor in resumo.items()}
+
+
+def medir(client, url, parametros, repeticoes, aquecimento, limpar_cache):
+    """Mede uma página; ``limpar_cache`` esvazia o cache antes de cada GET"""
+    for _ in range(aquecimento):
+        client.get(url, parametros)
+
+    tempos = []
+    for _ in range(repeticoes):
+        if limpar_cache:
+            cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            inicio = time.perf_counter()
+            response = client.get(url, parametros)
+            tempos.append(time.perf_counter() - inicio)
+        if response.status_code != 200:
+            raise RuntimeError(f"{url} respondeu {response.status_code}")
+
+    return {
+        "ms": resumir(tempos),
+        "queries": len(queries),
+        "bytes": len(response.content),
+    }
+
+
+def executar(camada, referencia, repeticoes=20, aquecimento=3):
+    """
+    Mede todos os cenários no banco atual, já populado
+
+    Returns:
+        dict: {'camada', 'agendamentos', 'ambiente', 'cenarios': {nome:
+               {'frio': {...}, 'quente': {...}}}}
+    """
+    if repeticoes < 2:
+        raise ValueError("São necessárias pelo menos 2 repetições")
+
+    usuario, _ = User.objects.get_or_create(username=USUARIO)
+    client = Client()
+    client.force_login(usuario)
+
+    resultados = {}
+    for nome, url, parametros in cenarios(referencia):
+        resultados[nome] = {
+            modo: medir(
+                client,
+                url,
+                parametros,
+                repeticoes,
+                aquecimento,
+                limpar_cache=modo == "frio",
+            )
+            for modo in MODOS
+        }
+
+    return {
+        "camada": camada,
+        "agendamentos": Agendamento.objects.count(),
+        "ambiente": {
+            "executado_em": datetime.now().isoformat(timespec="seconds"),
+            "referencia": referencia.isoformat(),
+            "banco": connection.vendor,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "repeticoes": repeticoes,
+            "aquecimento": aquecimento,
+        },
+        "cenarios": resultados,
+    }
+
+
+def comparar(atual, referencia, tolerancia=0.25, percentil="p95"):
+    """
+    Aponta as regressões de ``atual`` em relação a ``referencia``
+
+    Uma regressão é um ``percentil`` mais de ``tolerancia`` (fração) acima do
+    da referência ou qualquer query a mais.
+
+    Returns:
+        list: Descrições das regressões (vazia se não houver)
+    """
+    regressoes = []
+    for nome, modos in atual["cenarios"].items():
+        for modo, medida in modos.items():
+            anterior = referencia.get("cenarios", {}).get(nome, {}).get(modo)
+            if anterior is None:
+                continue
+            limite = anterior["ms"][percentil] * (1 + tolerancia)
+            if medida["ms"][percentil] > limite:
+                regressoes.append(
+                    f"{nome} ({modo}): {percentil} {medida['ms'][percentil]:.1f}ms, "
+                    f"referência {anterior['ms'][percentil]:.1f}ms"
+                )
+            if medida["queries"] > anterior["queries"]:
+                regressoes.append(
+                    f"{nome} ({modo}): {medida['queries']} queries, "
+                    f"referência {anterior['queries']}"
+                )
+    return regressoes
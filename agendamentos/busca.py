@@ -0,0 +1,52 @@
+"""
+Busca de clientes por prefixo para o autocomplete do agendamento.
+
+O nome é comparado pela coluna indexada ``Cliente.nome_busca`` (sem acentos
+e em minúsculas) e o telefone pela coluna indexada ``Cliente.telefone_busca``
+(só dígitos, sem +55), para que números gravados formatados como
+"(11) 9..." ou "+55 11 9..." também sejam achados. O prefixo vira
+um intervalo ``[prefixo, próximo prefixo)``, que usa o índice B-tree tanto no
+SQLite quanto no PostgreSQL (um ``LIKE 'prefixo%'`` não usa o índice no
+SQLite, que compara sem diferenciar maiúsculas).
+"""
+
+from django.db.models import Q
+
+from .models import Cliente, normalizar_nome, normalizar_telefone
+
+LIMITE_PADRAO = 10
+LIMITE_MAXIMO = 50
+
+
+def intervalo_prefixo(campo, prefixo):
+    """Filtro de ``campo`` começando com ``prefixo`` em forma de intervalo"""
+    proximo = prefixo[:-1] + chr(ord(prefixo[-1]) + 1)
+    return Q(**{f"{campo}__gte": prefixo, f"{campo}__lt": proximo})
+
+
+def buscar_clientes(termo, limite=LIMITE_PADRAO):
+    """
+    Busca clientes cujo nome ou telefone começa com ``termo``
+
+    Args:
+        termo (str): Início do nome (acentos e caixa são ignorados) ou do
+            telefone
+        limite (int): Quantidade máxima de resultados
+
+    Returns:
+        list: [{'id', 'nome', 'telefone'}, ...] em ordem alfabética
+    """
+    nome = normalizar_nome(termo)
+    if not nome:
+        return []
+
+    filtro = intervalo_prefixo("nome_busca", nome)
+    telefone = normalizar_telefone(termo)
+    if telefone:
+        filtro |= intervalo_prefixo("telefone_busca", telefone)
+
+    return list(
+        Cliente.objects.filter(filtro)
+        .order_by("nome_busca", "pk")
+        .values("id", "nome", "telefone")[:limite]
+    )
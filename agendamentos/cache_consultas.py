@@ -0,0 +1,266 @@
+"""
+Cache compartilhado das páginas de consulta (painel, financeiro e calendário).
+
+O cache usa o backend ``default`` do Django (tabela no banco ou arquivos em
+disco, ver ``CACHES`` em settings), então todos os workers do gunicorn
+enxergam os mesmos valores. Cada valor é guardado junto com as versões dos
+escopos de que depende:
+
+- ``dia:AAAA-MM-DD``, ``mes:AAAA-MM`` e ``ano:AAAA`` - os agendamentos de
+  uma data; qualquer alteração em uma data troca a versão dos três;
+- ``geral`` - clientes, serviços e cargas em massa (``bulk_create``,
+  reconstrução do resumo), que podem afetar qualquer data.
+
+A leitura busca o valor e as versões em uma única chamada (``get_many``) e
+só aproveita o valor se as versões gravadas com ele ainda forem as atuais.
+A invalidação (``invalidar``) só troca as versões, então um valor calculado
+com dados antigos e gravado depois da troca nunca é aproveitado. Versões
+ausentes (expiradas ou descartadas pelo backend) são recriadas com
+``cache.add``, sempre com um valor novo.
+
+Os contadores de acertos e faltas são por processo.
+"""
+
+import base64
+import pickle
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.db import DatabaseCache
+from django.db import connections, router, transaction
+
+PREFIXO = "agenda"
+GERAL = "geral"
+
+_contadores = defaultdict(lambda: {"acertos": 0, "faltas": 0})
+_lock_contadores = threading.Lock()
+
+
+def escopo_dia(data):
+    return f"dia:{data.isoformat()}"
+
+
+def escopo_mes(data):
+    return f"mes:{data:%Y-%m}"
+
+
+def escopo_ano(data):
+    return f"ano:{data:%Y}"
+
+
+def escopos_da_data(data):
+    """Escopos afetados por uma alteração em ``data``"""
+    return [escopo_dia(data), escopo_mes(data), escopo_ano(data)]
+
+
+def _chave_versao(escopo):
+    return f"{PREFIXO}:versao:{escopo}"
+
+
+def _chave_valor(nome, parametros):
+    return ":".join([PREFIXO, nome, *(str(parametro) for parametro in parametros)])
+
+
+def _nova_versao():
+    return time.time_ns()
+
+
+def _cache_no_banco():
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], DatabaseCache)
+
+
+def _conexao_do_cache():
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    return connections[router.db_for_write(backend.cache_model_class)]
+
+
+def _gravar_no_banco(valores):
+    """
+    Grava ``valores`` (sem expiração) no cache do banco em um único INSERT
+
+    O ``set_many`` do DatabaseCache faz contagem, savepoint, SELECT e
+    INSERT/UPDATE para cada chave: cinco queries por versão, quinze por data
+    alterada. Aqui todas as versões vão em um ``INSERT ... ON CONFLICT DO
+    UPDATE`` (PostgreSQL e SQLite). A limpeza de entradas antigas (cull)
+    continua a cargo das gravações de valores.
+    """
+    backend = caches[DEFAULT_CACHE_ALIAS]
+    conexao = _conexao_do_cache()
+    nome = conexao.ops.quote_name
+    expira = conexao.ops.adapt_datetimefield_value(datetime.max.replace(microsecond=0))
+    parametros = []
+    for chave, valor in valores.items():
+        parametros += [
+            backend.make_and_validate_key(chave),
+            base64.b64encode(pickle.dumps(valor, backend.pickle_protocol)).decode(
+                "latin1"
+            ),
+            expira,
+        ]
+    colunas = [nome(coluna) for coluna in ("cache_key", "value", "expires")]
+    sql = (
+        f"INSERT INTO {nome(backend._table)} ({', '.join(colunas)}) "
+        f"VALUES {', '.join(['(%s, %s, %s)'] * len(valores))} "
+        f"ON CONFLICT ({colunas[0]}) DO UPDATE SET "
+        f"{colunas[1]} = EXCLUDED.{colunas[1]}, {colunas[2]} = EXCLUDED.{colunas[2]}"
+    )
+    with conexao.cursor() as cursor:
+        cursor.execute(sql, parametros)
+
+
+def _trocar_versoes(escopos):
+    versao = _nova_versao()
+    valores = {_chave_versao(escopo): versao for escopo in escopos}
+    if _cache_no_banco() and _conexao_do_cache().vendor in ("postgresql", "sqlite"):
+        _gravar_no_banco(valores)
+    else:
+        cache.set_many(valores, None)
+
+
+def invalidar(*escopos):
+    """
+    Troca a versão de ``escopos``, descartando os valores que dependem deles
+
+    Com o cache no banco a troca entra na mesma transação da alteração. Com
+    outro backend ela é repetida depois do commit, para que um valor
+    calculado antes do commit com os dados antigos não seja aproveitado.
+    """
+    escopos = sorted(set(escopos))
+    if not escopos:
+        return
+    _trocar_versoes(escopos)
+    if transaction.get_connection().in_atomic_block and not _cache_no_banco():
+        transaction.on_commit(lambda: _trocar_versoes(escopos))
+
+
+def invalidar_datas(*datas):
+    """Invalida o dia, o mês e o ano de cada uma de ``datas``"""
+    invalidar(*(escopo for data in set(datas) for escopo in escopos_da_data(data)))
+
+
+def _contar(nome, resultado):
+    with _lock_contadores:
+        _contadores[nome][resultado] += 1
+
+
+def _resolver_versoes(chaves_versao, encontrados):
+    versoes = []
+    for chave_versao in chaves_versao:
+        versao = encontrados.get(chave_versao)
+        if versao is None:
+            versao = _nova_versao()
+            if not cache.add(chave_versao, versao, None):
+                # Outro processo criou a versão ao mesmo tempo
+                versao = None
+        versoes.append(versao)
+    return tuple(versoes)
+
+
+def versoes(escopos):
+    """
+    Versões atuais de ``escopos`` (e de ``GERAL``), sem ler nenhum valor
+
+    Na mesma ordem de ``Leitura(...).versoes`` para os mesmos escopos.
+    """
+    chaves_versao = [_chave_versao(escopo) for escopo in [*escopos, GERAL]]
+    return _resolver_versoes(chaves_versao, cache.get_many(chaves_versao))
+
+
+class Leitura:
+    """
+    Valor de uma consulta e versões de que ele depende, lidos juntos
+
+    As versões servem também de carimbo barato do estado dos dados (ex.: para
+    ETags): mudam sempre que algo de que os escopos dependem é alterado.
+
+    Args:
+        nome (str): Identifica a consulta (ex.: "painel")
+        parametros (list): O que distingue um valor de outro da mesma
+            consulta (data, filtro...)
+        escopos (list): Escopos de que o valor depende; ``GERAL`` é sempre
+            incluído
+    """
+
+    def __init__(self, nome, parametros, escopos):
+        self.nome = nome
+        self.chave = _chave_valor(nome, parametros)
+        chaves_versao = [_chave_versao(escopo) for escopo in [*escopos, GERAL]]
+        encontrados = cache.get_many([self.chave, *chaves_versao])
+        self.versoes = _resolver_versoes(chaves_versao, encontrados)
+        self._guardado = encontrados.get(self.chave)
+
+    @property
+    def completa(self):
+        """Indica se todas as versões são conhecidas"""
+        return None not in self.versoes
+
+    def valor(self, calcular):
+        """
+        Devolve o valor guardado se as versões ainda forem as atuais ou
+        ``calcular()``, que é gravado no cache. O valor precisa ser
+        serializável com pickle.
+        """
+        if self._guardado is not None and self._guardado[0] == self.versoes:
+            _contar(self.nome, "acertos")
+            return self._guardado[1]
+
+        _contar(self.nome, "faltas")
+        valor = calcular()
+        if self.completa:
+            cache.set(self.chave, (self.versoes, valor))
+        return valor
+
+
+def obter(nome, parametros, escopos, calcular):
+    """Atalho para ``Leitura(nome, parametros, escopos).valor(calcular)``"""
+    return Leitura(nome, parametros, escopos).valor(calcular)
+
+
+def projetar(queryset, *campos):
+    """
+    Lê só ``campos`` de ``queryset`` como dicionários leves para o cache
+
+    Campos de relações (``cliente__nome``) viram dicionários aninhados
+    (``{'cliente': {'nome': ...}}``), então os templates continuam usando
+    ``agendamento.cliente.nome``.
+
+    Returns:
+        list: [{...}, ...] na ordem do queryset
+    """
+    return [aninhar(zip(campos, valores)) for valores in queryset.values_list(*campos)]
+
+
+def aninhar(pares):
+    """
+    Monta uma linha de ``projetar`` a partir de pares (campo, valor)
+
+    Returns:
+        dict: ``{'hora': ..., 'cliente': {'nome': ...}}``
+    """
+    linha = {}
+    for campo, valor in pares:
+        *caminho, ultimo = campo.split("__")
+        destino = linha
+        for parte in caminho:
+            destino = destino.setdefault(parte, {})
+        destino[ultimo] = valor
+    return linha
+
+
+def estatisticas():
+    """
+    Acertos e faltas de cada consulta neste processo
+
+    Returns:
+        dict: {nome: {'acertos': int, 'faltas': int}}
+    """
+    with _lock_contadores:
+        return {nome: dict(contagem) for nome, contagem in _contadores.items()}
+
+
+def zerar_estatisticas():
+    with _lock_contadores:
+        _contadores.clear()
@@ -0,0 +1,151 @@
+"""
+Log de queries lentas.
+
+Com ``CONSULTAS_LENTAS_MS`` maior que zero, ``instalar`` (ligado ao sinal
+``connection_created`` em ``apps.py``) acrescenta ``registrar`` aos
+``execute_wrappers`` de cada conexão. Toda query mais lenta que o limite vira
+uma linha de log em JSON, no logger ``agendamentos.consultas_lentas``, com:
+
+- a forma normalizada da query (parâmetros já são ``%s``; listas de ``IN``
+  viram um só ``%s...``) e um identificador curto dessa forma;
+- a view de origem (a função mais externa de ``agendamentos.views`` na
+  pilha);
+- a linha do código do projeto que disparou a query.
+
+A pilha só é percorrida para as queries lentas. Os parâmetros não vão para o
+log, porque trazem nomes e telefones.
+
+No PostgreSQL, com ``CONSULTAS_LENTAS_EXPLAIN`` ligado, a primeira
+ocorrência de cada forma de SELECT lenta (por processo) leva junto o plano
+de ``EXPLAIN (ANALYZE, BUFFERS)``. O EXPLAIN executa a query de novo em um
+cursor à parte, dentro de um savepoint quando há transação aberta.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import sys
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_RAIZ = str(Path(settings.BASE_DIR))
+_LISTA_PARAMETROS = re.compile(r"%s(?:\s*,\s*%s)+")
+_ESPACOS = re.compile(r"\s+")
+
+# Formas que já tiveram o plano capturado neste processo
+_explicadas = set()
+
+
+def normalizar(sql):
+    """Forma da query: espaços colapsados e listas de parâmetros unidas"""
+    return _LISTA_PARAMETROS.sub("%s...", _ESPACOS.sub(" ", sql).strip())
+
+
+def identificar(forma):
+    """Identificador curto e estável de uma forma de query"""
+    return hashlib.sha1(forma.encode()).hexdigest()[:12]
+
+
+def origem():
+    """
+    View e linha de código que dispararam a query em andamento
+
+    Returns:
+        tuple: (view, local) - ex.: ("agendamentos.views.financeiro",
+               "agendamentos/views.py:812 (_dados_financeiro)"); None quando
+               não houver
+    """
+    view = local = None
+    frame = sys._getframe(1)
+    while frame is not None:
+        modulo = frame.f_globals.get("__name__", "")
+        arquivo = frame.f_code.co_filename
+        if (
+            local is None
+            and modulo not in (__name__, "__main__")
+            and arquivo.startswith(_RAIZ)
+            and "site-packages" not in arquivo
+        ):
+            caminho = Path(arquivo).relative_to(_RAIZ).as_posix()
+            local = f"{caminho}:{frame.f_lineno} ({frame.f_code.co_name})"
+        if modulo == "agendamentos.views":
+            # A mais externa da pilha é a view; as internas são auxiliares
+            view = f"{modulo}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return view, local
+
+
+def explicar(conexao, sql, params):
+    """
+    Plano de ``EXPLAIN (ANALYZE, BUFFERS)`` de um SELECT no PostgreSQL
+
+    Usa um cursor do driver, fora dos ``execute_wrappers``, e não deixa uma
+    falha do EXPLAIN abortar a transação de quem fez a query.
+
+    Returns:
+        str: Plano, ou None se não for possível obtê-lo
+    """
+    if conexao.vendor != "postgresql" or not sql.lstrip().upper().startswith(
+        ("SELECT", "WITH")
+    ):
+        return None
+    em_transacao = conexao.in_atomic_block
+    with conexao.connection.cursor() as cursor:
+        if em_transacao:
+            cursor.execute("SAVEPOINT consulta_lenta_explain")
+        try:
+            cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+            plano = "\n".join(linha[0] for linha in cursor.fetchall())
+        except Exception:
+            logger.exception("Falha no EXPLAIN da consulta lenta")
+            plano = None
+            if em_transacao:
+                cursor.execute("ROLLBACK TO SAVEPOINT consulta_lenta_explain")
+        if em_transacao:
+            cursor.execute("RELEASE SAVEPOINT consulta_lenta_explain")
+    return plano
+
+
+def registrar(execute, sql, params, many, context):
+    """``execute_wrapper`` que loga as queries acima do limite"""
+    inicio = time.perf_counter()
+    resultado = execute(sql, params, many, context)
+    duracao_ms = (time.perf_counter() - inicio) * 1000
+
+    limite_ms = settings.CONSULTAS_LENTAS_MS
+    if not limite_ms or duracao_ms < limite_ms:
+        return resultado
+
+    forma = normalizar(sql)
+    identificador = identificar(forma)
+    view, local = origem()
+    registro = {
+        "duracao_ms": round(duracao_ms, 1),
+        "limite_ms": limite_ms,
+        "forma": identificador,
+        "view": view,
+        "origem": local,
+        "sql": forma,
+    }
+    if (
+        settings.CONSULTAS_LENTAS_EXPLAIN
+        and not many
+        and identificador not in _explicadas
+    ):
+        plano = explicar(context["connection"], sql, params)
+        if plano is not None:
+            _explicadas.add(identificador)
+            registro["plano"] = plano
+    logger.warning(json.dumps(registro, ensure_ascii=False, separators=(",", ":")))
+    return resultado
+
+
+def instalar(sender, connection, **kwargs):
+    """Receptor de ``connection_created``: instala ``registrar`` na conexão"""
+    if settings.CONSULTAS_LENTAS_MS and registrar not in connection.execute_wrappers:
+        connection.execute_wrappers.append(registrar)
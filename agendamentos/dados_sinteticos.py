@@ -0,0 +1,329 @@
+"""
+Dados sintéticos de clientes, serviços e agendamentos.
+
+Usado pelo comando ``manage.py gerar_dados`` e pelo benchmark. Os
+agendamentos são montados em memória e gravados em lotes de ``lote``
+linhas: com ``bulk_create`` no SQLite e com ``COPY`` no PostgreSQL, o que
+leva 1 milhão de agendamentos a poucos minutos. Tudo roda em uma única
+transação.
+
+Nenhum dos dois caminhos envia sinais, então no fim o cache das páginas é
+invalidado e o resumo diário do período é reconstruído.
+
+Como na agenda real, os agendamentos de um dia não se sobrepõem: a quantidade
+é repartida por igual entre os dias e cada dia é preenchido andando pela
+grade de horários, com a duração de cada serviço e folgas sorteadas entre
+eles. Um dia comporta no máximo ``CAPACIDADE_DIA`` agendamentos (o
+expediente dividido pelo serviço mais longo); ``dias_necessarios`` diz
+quantos dias uma quantidade pede.
+
+A distribuição segue a agenda real: dias passados têm agendamentos
+concluídos, cancelados ou que ficaram confirmados (``STATUS_PASSADO``), dias
+de hoje em diante só têm confirmados, e uma fração (``TAXA_PAGOS``) dos
+concluídos está paga.
+"""
+
+import io
+import math
+import random
+from datetime import timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.db import connection, transaction
+
+from . import cache_consultas
+from .disponibilidade import INTERVALO_MINUTOS, grade_horarios
+from .models import Agendamento, Cliente, MensagemSMS, ResumoDiario, Servico
+from .relatorios import reconstruir_resumo
+
+SERVICOS = [
+    ("Corte", 30, "35.00"),
+    ("Barba", 20, "25.00"),
+    ("Corte e barba", 50, "55.00"),
+    ("Sobrancelha", 10, "15.00"),
+    ("Pigmentação", 40, "45.00"),
+]
+NOMES = (
+    "Ana Bruno Carlos Daniel Eduardo Felipe Gabriel Gustavo Henrique Igor João "
+    "José Lucas Marcos Mateus Paulo Pedro Rafael Rodrigo Thiago Vinícius"
+).split()
+SOBRENOMES = (
+    "Almeida Alves Araújo Barbosa Carvalho Costa Ferreira Gomes Lima Martins "
+    "Oliveira Pereira Ribeiro Rocha Santos Silva Souza"
+).split()
+
+# Pesos dos status em dias passados
+STATUS_PASSADO = {"concluido": 85, "cancelado": 10, "confirmado": 5}
+# Fração dos concluídos que já foi paga
+TAXA_PAGOS = 0.9
+# Período padrão: um ano terminando um mês depois de hoje
+DIAS = 365
+DIAS_FUTUROS = 30
+TAMANHO_LOTE = 10_000
+
+
+def _passos(duracao):
+    """Horários da grade que um serviço de ``duracao`` minutos ocupa"""
+    return math.ceil(duracao / INTERVALO_MINUTOS)
+
+
+def _capacidade(duracoes):
+    """Agendamentos que sempre cabem em um dia, com qualquer um dos serviços"""
+    return len(grade_horarios()) // max(_passos(duracao) for duracao in duracoes)
+
+
+# Com os serviços de SERVICOS: 96 horários / 5 do mais longo = 19 por dia
+CAPACIDADE_DIA = _capacidade(duracao for _, duracao, _ in SERVICOS)
+
+
+def dias_necessarios(agendamentos):
+    """Dias para ``agendamentos`` sem sobreposição, e pelo menos ``DIAS``"""
+    return max(DIAS, math.ceil(agendamentos / CAPACIDADE_DIA))
+
+
+def periodo(hoje, dias=DIAS, futuros=DIAS_FUTUROS):
+    """(inicio, fim) com ``dias`` dias, dos quais ``futuros`` a partir de hoje"""
+    fim = hoje + timedelta(days=futuros - 1)
+    return fim - timedelta(days=dias - 1), fim
+
+
+def quantidade_clientes(agendamentos):
+    """Clientes gerados por padrão: um para cada 20 agendamentos"""
+    return min(max(agendamentos // 20, 50), 50_000)
+
+
+def limpar():
+    """
+    Apaga agendamentos, resumo diário e clientes
+
+    DELETE direto no banco: excluir pelo ORM passaria pelos sinais de cada
+    agendamento. As mensagens de SMS ficam, sem o agendamento.
+    """
+    nome = connection.ops.quote_name
+    with transaction.atomic():
+        MensagemSMS.objects.filter(agendamento__isnull=False).update(agendamento=None)
+        with connection.cursor() as cursor:
+            for modelo in (ResumoDiario, Agendamento, Cliente):
+                cursor.execute(f"DELETE FROM {nome(modelo._meta.db_table)}")
+    cache_consultas.invalidar(cache_consultas.GERAL)
+
+
+def _servicos():
+    return [
+        Servico.objects.get_or_create(
+            nome=nome, defaults={"duracao": duracao, "preco": Decimal(preco)}
+        )[0]
+        for nome, duracao, preco in SERVICOS
+    ]
+
+
+def _clientes(quantidade, sorteio, lote):
+    """Cria ``quantidade`` clientes com telefones ainda não usados"""
+    usados = set(Cliente.objects.values_list("telefone", flat=True))
+    telefones = (f"119{numero:08d}" for numero in range(100_000_000))
+    clientes = []
+    for telefone in telefones:
+        if len(clientes) == quantidade:
+            break
+        if telefone in usados:
+            continue
+        nome = f"{sorteio.choice(NOMES)} {sorteio.choice(SOBRENOMES)}"
+        clientes.append(Cliente(nome=nome, telefone=telefone))
+    return Cliente.objects.bulk_create(clientes, batch_size=lote)
+
+
+def _horarios_do_dia(servicos, sorteio):
+    """
+    [(servico, hora), ...] sem sobreposição, andando pela grade
+
+    A folga do dia (horários que sobram depois dos serviços) é repartida em
+    sorteio antes de cada agendamento.
+    """
+    grade = grade_horarios()
+    passos = [_passos(servico.duracao) for servico in servicos]
+    folga = len(grade) - sum(passos)
+    cortes = sorted(sorteio.randint(0, folga) for _ in servicos)
+
+    horarios, posicao, anterior = [], 0, 0
+    for servico, ocupados, corte in zip(servicos, passos, cortes):
+        posicao += corte - anterior
+        anterior = corte
+        horarios.append((servico, grade[posicao]))
+        posicao += ocupados
+    return horarios
+
+
+def _quantidades_por_dia(agendamentos, dias, sorteio):
+    """Mesma quantidade em todos os dias; o resto vai para dias sorteados"""
+    por_dia, resto = divmod(agendamentos, dias)
+    com_um_a_mais = set(sorteio.sample(range(dias), resto))
+    return [por_dia + (indice in com_um_a_mais) for indice in range(dias)]
+
+
+def _status(passado, nomes, pesos, taxa_pagos, sorteio):
+    """(status, status_pagamento) sorteados; de hoje em diante, confirmado"""
+    if not passado:
+        return "confirmado", "pendente"
+    escolhido = sorteio.choices(nomes, pesos)[0]
+    pago = escolhido == "concluido" and sorteio.random() < taxa_pagos
+    return escolhido, "pago" if pago else "pendente"
+
+
+def _valor_copy(valor):
+    """Valor no formato texto do COPY (``\\N`` é nulo)"""
+    if valor is None:
+        return "\\N"
+    return (
+        str(valor)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def _copiar(agendamentos):
+    """Grava um lote com ``COPY ... FROM STDIN`` (PostgreSQL)"""
+    campos = [
+        campo for campo in Agendamento._meta.concrete_fields if not campo.primary_key
+    ]
+    buffer = io.StringIO()
+    for agendamento in agendamentos:
+        buffer.write(
+            "\t".join(
+                _valor_copy(
+                    campo.get_db_prep_save(
+                        campo.pre_save(agendamento, True), connection
+                    )
+                )
+                for campo in campos
+            )
+            + "\n"
+        )
+    buffer.seek(0)
+
+    nome = connection.ops.quote_name
+    sql = (
+        f"COPY {nome(Agendamento._meta.db_table)} "
+        f"({', '.join(nome(campo.column) for campo in campos)}) FROM STDIN"
+    )
+    with connection.cursor() as cursor:
+        bruto = cursor.cursor
+        if hasattr(bruto, "copy_expert"):
+            # psycopg2
+            bruto.copy_expert(sql, buffer)
+        else:
+            # psycopg 3
+            with bruto.copy(sql) as copia:
+                copia.write(buffer.getvalue())
+
+
+def gerar(
+    agendamentos,
+    inicio,
+    fim,
+    hoje,
+    clientes=None,
+    status=None,
+    taxa_pagos=TAXA_PAGOS,
+    seed=42,
+    lote=TAMANHO_LOTE,
+):
+    """
+    Gera serviços, clientes e agendamentos entre ``inicio`` e ``fim``
+
+    Os serviços de ``SERVICOS`` são reaproveitados se já existirem. Os
+    agendamentos de um mesmo dia não se sobrepõem.
+
+    Args:
+        agendamentos (int): Quantidade de agendamentos
+        inicio (date): Primeiro dia
+        fim (date): Último dia; o período precisa comportar os
+            agendamentos sem sobreposição (``dias_necessarios``)
+        hoje (date): Dias antes dele seguem ``status``; dele em diante, só
+            confirmados
+        clientes (int): Quantidade de clientes (padrão:
+            ``quantidade_clientes``)
+        status (dict): Pesos dos status em dias passados (padrão:
+            ``STATUS_PASSADO``)
+        taxa_pagos (float): Fração dos concluídos que está paga
+        seed (int): Semente do sorteio; a mesma seed gera os mesmos dados
+        lote (int): Linhas por INSERT ou COPY
+
+    Returns:
+        dict: {'servicos', 'clientes', 'agendamentos', 'resumo'} com as
+              quantidades gravadas
+
+    Raises:
+        ValueError: Período invertido, status inválidos ou agendamentos demais
+            para o período
+    """
+    if fim < inicio:
+        raise ValueError("O período termina antes de começar")
+    pesos = status or STATUS_PASSADO
+    validos = {valor for valor, _ in Agendamento.STATUS_CHOICES}
+    if not set(pesos) <= validos or sum(pesos.values()) <= 0:
+        raise ValueError(f"Distribuição de status inválida: {pesos}")
+    if clientes is None:
+        clientes = quantidade_clientes(agendamentos)
+
+    sorteio = random.Random(seed)
+    nomes_status, pesos_status = list(pesos), list(pesos.values())
+    dias = (fim - inicio).days + 1
+    copiar = connection.vendor == "postgresql"
+
+    with transaction.atomic():
+        servicos = _servicos()
+        capacidade = _capacidade(servico.duracao for servico in servicos)
+        if agendamentos > dias * capacidade:
+            raise ValueError(
+                f"{dias} dia(s) comportam no máximo {dias * capacidade} "
+                "agendamentos sem sobreposição"
+            )
+        ids_clientes = [cliente.pk for cliente in _clientes(clientes, sorteio, lote)]
+
+        def do_dia(dia, quantidade):
+            escolhidos = [sorteio.choice(servicos) for _ in range(quantidade)]
+            for servico, hora in _horarios_do_dia(escolhidos, sorteio):
+                escolhido, pagamento = _status(
+                    dia < hoje, nomes_status, pesos_status, taxa_pagos, sorteio
+                )
+                yield Agendamento(
+                    cliente_id=sorteio.choice(ids_clientes) if ids_clientes else None,
+                    servico=servico,
+                    valor=servico.preco,
+                    data=dia,
+                    hora=hora,
+                    status=escolhido,
+                    status_pagamento=pagamento,
+                )
+
+        todos = (
+            agendamento
+            for indice, quantidade in enumerate(
+                _quantidades_por_dia(agendamentos, dias, sorteio)
+            )
+            for agendamento in do_dia(inicio + timedelta(days=indice), quantidade)
+        )
+
+        criados = 0
+        while criados < agendamentos:
+            objetos = list(islice(todos, lote))
+            if copiar:
+                _copiar(objetos)
+            else:
+                # O resumo do período é reconstruído uma vez, no fim
+                Agendamento.objects.bulk_create(objetos, atualizar_resumo=False)
+            criados += len(objetos)
+
+        linhas_resumo = reconstruir_resumo(data__gte=inicio, data__lte=fim)
+        if copiar:
+            cache_consultas.invalidar(cache_consultas.GERAL)
+
+    return {
+        "servicos": len(servicos),
+        "clientes": len(ids_clientes),
+        "agendamentos": criados,
+        "resumo": linhas_resumo,
+    }
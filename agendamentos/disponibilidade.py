@@ -0,0 +1,227 @@
+"""
+Horários livres da agenda.
+
+Os agendamentos de um dia são lidos uma única vez (hora de início e duração
+do serviço) e convertidos em intervalos ``[inicio, fim)`` em minutos desde a
+meia-noite. Os intervalos ocupados são unidos e os horários livres são o
+complemento deles dentro do expediente; um horário de início é possível
+quando o serviço inteiro cabe em um intervalo livre. Agendamentos cancelados
+não ocupam a agenda.
+
+A verificação de sobreposição feita na validação do formulário pode ficar
+desatualizada até a gravação; por isso a gravação repete a verificação
+dentro de uma transação que detém ``bloquear_dia``.
+"""
+
+from datetime import time, timedelta
+from itertools import groupby
+from operator import itemgetter
+
+from django.db import connection
+
+from .models import Agendamento
+
+INICIO_EXPEDIENTE = time(6, 0)
+FIM_EXPEDIENTE = time(22, 0)
+INTERVALO_MINUTOS = 10
+
+STATUS_LIVRES = ("cancelado",)
+
+# Busca do próximo horário livre
+QUANTIDADE_PADRAO = 5
+QUANTIDADE_MAXIMA = 20
+DIAS_PADRAO = 7
+DIAS_MAXIMO = 60
+
+# Primeira chave do advisory lock dos dias da agenda no PostgreSQL
+CHAVE_LOCK_AGENDA = 1001
+
+
+def _minutos(hora):
+    return hora.hour * 60 + hora.minute
+
+
+def _hora(minutos):
+    return time(minutos // 60, minutos % 60)
+
+
+def grade_horarios():
+    """Todos os horários de início do expediente, de 10 em 10 minutos"""
+    return [
+        _hora(minutos)
+        for minutos in range(
+            _minutos(INICIO_EXPEDIENTE), _minutos(FIM_EXPEDIENTE), INTERVALO_MINUTOS
+        )
+    ]
+
+
+def unir_intervalos(intervalos):
+    """Une intervalos ``(inicio, fim)`` sobrepostos ou encostados, em ordem"""
+    unidos = []
+    for inicio, fim in sorted(intervalos):
+        if fim <= inicio:
+            continue
+        if unidos and inicio <= unidos[-1][1]:
+            unidos[-1][1] = max(unidos[-1][1], fim)
+        else:
+            unidos.append([inicio, fim])
+    return [tuple(intervalo) for intervalo in unidos]
+
+
+def ocupacoes(data, ignorar=None):
+    """
+    Intervalos ocupados de ``data`` em minutos, unidos e em ordem
+
+    Args:
+        data (date): Dia consultado
+        ignorar (int): pk de um agendamento que não deve contar (o que está
+            sendo editado)
+
+    Returns:
+        list: [(inicio, fim), ...]
+    """
+    agendamentos = Agendamento.objects.filter(data=data).exclude(
+        status__in=STATUS_LIVRES
+    )
+    if ignorar:
+        agendamentos = agendamentos.exclude(pk=ignorar)
+
+    linhas = agendamentos.order_by().values_list("hora", "servico__duracao")
+    return unir_intervalos(
+        (_minutos(hora), _minutos(hora) + duracao) for hora, duracao in linhas
+    )
+
+
+def intervalos_livres(ocupados, inicio=INICIO_EXPEDIENTE, fim=FIM_EXPEDIENTE):
+    """Complemento de ``ocupados`` (já unidos) dentro de [inicio, fim)"""
+    livres = []
+    cursor = _minutos(inicio)
+    limite = _minutos(fim)
+    for ocupado_inicio, ocupado_fim in ocupados:
+        if ocupado_inicio > cursor:
+            livres.append((cursor, min(ocupado_inicio, limite)))
+        cursor = max(cursor, ocupado_fim)
+        if cursor >= limite:
+            break
+    if cursor < limite:
+        livres.append((cursor, limite))
+    return [(a, b) for a, b in livres if a < b]
+
+
+def inicios_possiveis(livres, duracao, passo=INTERVALO_MINUTOS):
+    """Horários de início da grade em que ``duracao`` minutos cabem livres"""
+    duracao = max(duracao, 1)
+    inicios = []
+    for inicio, fim in livres:
+        # Primeiro horário da grade dentro do intervalo
+        minutos = -(-inicio // passo) * passo
+        while minutos + duracao <= fim:
+            inicios.append(_hora(minutos))
+            minutos += passo
+    return inicios
+
+
+def horarios_disponiveis(data, duracao, ignorar=None):
+    """
+    Calcula os horários livres de ``data`` para um serviço de ``duracao``
+
+    Returns:
+        dict: {'horarios': [time, ...], 'livres': [(time, time), ...]}
+    """
+    livres = intervalos_livres(ocupacoes(data, ignorar))
+    return {
+        "horarios": inicios_possiveis(livres, duracao),
+        "livres": [(_hora(inicio), _hora(fim)) for inicio, fim in livres],
+    }
+
+
+def termina_no_expediente(hora, duracao):
+    """Indica se um serviço de ``duracao`` iniciado em ``hora`` acaba até o fim do expediente"""
+    return _minutos(hora) + max(duracao, 1) <= _minutos(FIM_EXPEDIENTE)
+
+
+def conflita(data, hora, duracao, ignorar=None):
+    """Indica se [hora, hora + duracao) sobrepõe outro agendamento de ``data``"""
+    inicio = _minutos(hora)
+    fim = inicio + max(duracao, 1)
+    return any(
+        ocupado_inicio < fim and inicio < ocupado_fim
+        for ocupado_inicio, ocupado_fim in ocupacoes(data, ignorar)
+    )
+
+
+def proximos_horarios(
+    duracao,
+    inicio,
+    quantidade=QUANTIDADE_PADRAO,
+    dias=DIAS_PADRAO,
+    a_partir_de=None,
+):
+    """
+    Primeiros horários livres para ``duracao`` minutos a partir de ``inicio``
+
+    Os agendamentos de [inicio, inicio + dias) vêm de uma única query
+    ordenada por data e hora, percorrida uma vez: cada dia é agrupado,
+    unido e complementado à medida que a busca avança, e a leitura para
+    assim que ``quantidade`` horários foram encontrados.
+
+    Args:
+        duracao (int): Duração do serviço em minutos
+        inicio (date): Primeiro dia da busca
+        quantidade (int): Quantos horários devolver
+        dias (int): Quantos dias examinar
+        a_partir_de (time): Horário mínimo no primeiro dia (ex.: agora)
+
+    Returns:
+        list: [(date, time), ...] em ordem cronológica
+    """
+    linhas = (
+        Agendamento.objects.filter(
+            data__gte=inicio, data__lt=inicio + timedelta(days=dias)
+        )
+        .exclude(status__in=STATUS_LIVRES)
+        .order_by("data", "hora")
+        .values_list("data", "hora", "servico__duracao")
+    )
+    dias_ocupados = groupby(linhas.iterator(), key=itemgetter(0))
+    proximo_ocupado = next(dias_ocupados, None)
+
+    encontrados = []
+    for deslocamento in range(dias):
+        dia = inicio + timedelta(days=deslocamento)
+        ocupados = []
+        if proximo_ocupado and proximo_ocupado[0] == dia:
+            ocupados = unir_intervalos(
+                (_minutos(hora), _minutos(hora) + duracao_servico)
+                for _, hora, duracao_servico in proximo_ocupado[1]
+            )
+            proximo_ocupado = next(dias_ocupados, None)
+
+        abertura = INICIO_EXPEDIENTE
+        if deslocamento == 0 and a_partir_de and a_partir_de > abertura:
+            abertura = a_partir_de.replace(second=0, microsecond=0)
+            if abertura >= FIM_EXPEDIENTE:
+                continue
+
+        for hora in inicios_possiveis(intervalos_livres(ocupados, abertura), duracao):
+            encontrados.append((dia, hora))
+            if len(encontrados) == quantidade:
+                return encontrados
+    return encontrados
+
+
+def bloquear_dia(data):
+    """
+    Serializa as gravações de agendamentos de ``data`` até o fim da transação
+
+    No PostgreSQL pega um advisory lock transacional só daquele dia, então
+    dias diferentes não esperam uns pelos outros. No SQLite a transação
+    IMMEDIATE (ver settings) já detém o lock de escrita do banco desde o
+    BEGIN. Deve ser chamada dentro de ``transaction.atomic()``.
+    """
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_advisory_xact_lock(%s, %s)",
+                [CHAVE_LOCK_AGENDA, data.toordinal()],
+            )
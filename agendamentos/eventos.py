@@ -0,0 +1,119 @@
+"""
+Atualização ao vivo do painel por server-sent events (SSE).
+
+Cada aba aberta do painel mantém uma conexão ``EventSource`` com o fluxo da
+data exibida. O fluxo não usa broker: a cada ``INTERVALO_CONSULTA`` segundos
+ele lê só as versões do cache de consultas (``cache_consultas.versoes``, uma
+leitura do cache) e, quando elas mudam, lê os agendamentos do dia (o mesmo
+valor em cache do painel) e envia apenas os cards que mudaram:
+
+- ``completo`` - todos os cards do dia, quando a versão que o navegador tem
+  (``Last-Event-ID`` ou a versão embutida na página) não é a atual;
+- ``delta`` - ``alterados`` (cards novos ou modificados, já renderizados) e
+  ``removidos`` (ids).
+
+O ``id`` de cada evento é a versão dos dados, então o navegador retoma de
+onde parou ao reconectar. Sob ASGI (``barbearia/asgi.py``) a conexão fica
+aberta por até ``DURACAO_MAXIMA`` segundos; sob WSGI ela responde uma única
+vez e o navegador reconecta depois de ``RECONEXAO_MS``, o que vira uma
+consulta periódica sem prender um worker.
+
+O fluxo só existe com ``PAINEL_AO_VIVO`` ligado: cada aba aberta ocupa uma
+conexão, então o padrão do deploy (gunicorn em WSGI) fica sem ele.
+"""
+
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+
+INTERVALO_CONSULTA = 2
+DURACAO_MAXIMA = 300
+RECONEXAO_MS = 3000
+INTERVALO_KEEPALIVE = 15
+
+
+def identificador(versoes):
+    """Versão dos dados como texto, usada como ``id`` dos eventos"""
+    if None in versoes:
+        return ""
+    return "-".join(str(versao) for versao in versoes)
+
+
+def formatar(nome, dados, identificador=None):
+    """Um evento no formato ``text/event-stream``"""
+    linhas = []
+    if identificador:
+        linhas.append(f"id: {identificador}")
+    linhas.append(f"event: {nome}")
+    linhas.append(f"data: {json.dumps(dados, separators=(',', ':'))}")
+    return "\n".join(linhas) + "\n\n"
+
+
+def diferencas(anteriores, atuais):
+    """
+    Compara dois estados ``{id: linha}`` de um dia
+
+    Returns:
+        tuple: (alterados, removidos) - linhas novas ou diferentes, na ordem
+               de ``atuais``, e ids que deixaram de existir
+    """
+    alterados = [linha for pk, linha in atuais.items() if anteriores.get(pk) != linha]
+    removidos = [pk for pk in anteriores if pk not in atuais]
+    return alterados, removidos
+
+
+async def fluxo(carimbo, carregar, renderizar, versao_cliente, duracao):
+    """
+    Gera os eventos de um dia até ``duracao`` segundos
+
+    Args:
+        carimbo: Função que devolve a versão atual (``identificador``)
+        carregar: Função que devolve ``(versao, [linha, ...])`` do dia; cada
+            linha é um dicionário com ``id``
+        renderizar: Função que recebe linhas e devolve
+            ``[{'id', 'hora', 'status', 'html'}, ...]``
+        versao_cliente (str): Versão que o navegador já tem
+        duracao (int): Segundos até encerrar (0: responde uma vez)
+    """
+    carimbo = sync_to_async(carimbo)
+    carregar = sync_to_async(carregar)
+    renderizar = sync_to_async(renderizar)
+
+    versao, anteriores = versao_cliente, None
+    if duracao and await carimbo() == versao_cliente:
+        # A conexão fica aberta: lê o estado que o navegador já tem, para
+        # que a primeira mudança já vá como delta
+        versao_lida, linhas = await carregar()
+        if versao_lida == versao_cliente:
+            anteriores = {linha["id"]: linha for linha in linhas}
+
+    yield f"retry: {RECONEXAO_MS}\n\n"
+    inicio = ultimo_envio = time.monotonic()
+    while True:
+        atual = await carimbo()
+        if atual != versao:
+            nova_versao, linhas = await carregar()
+            atuais = {linha["id"]: linha for linha in linhas}
+            if nova_versao != versao:
+                if anteriores is None:
+                    nome, alterados, removidos = "completo", linhas, []
+                else:
+                    nome = "delta"
+                    alterados, removidos = diferencas(anteriores, atuais)
+                dados = {
+                    "alterados": await renderizar(alterados),
+                    "removidos": removidos,
+                }
+                yield formatar(nome, dados, nova_versao)
+                ultimo_envio = time.monotonic()
+            versao, anteriores = nova_versao, atuais
+
+        agora = time.monotonic()
+        if agora - inicio >= duracao:
+            return
+        if agora - ultimo_envio >= INTERVALO_KEEPALIVE:
+            yield ": keep-alive\n\n"
+            ultimo_envio = agora
+        await asyncio.sleep(INTERVALO_CONSULTA)
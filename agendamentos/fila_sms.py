@@ -0,0 +1,162 @@
+"""
+Fila de saída de SMS (MensagemSMS) e seu processamento.
+
+As views chamam ``enfileirar_*``, que só grava a mensagem depois do commit
+da transação corrente: se a alteração do agendamento for desfeita, nenhum
+SMS é enviado. O envio acontece fora da requisição, em
+``processar_fila``, chamado pelo comando ``manage.py processar_fila_sms``.
+
+Cada rodada reserva um lote de mensagens empurrando ``proxima_tentativa``
+para frente (com ``SELECT ... FOR UPDATE SKIP LOCKED`` no PostgreSQL), então
+vários workers podem rodar ao mesmo tempo e uma mensagem reservada por um
+worker que morreu volta para a fila quando a reserva expira.
+
+Só as falhas transitórias (erro HTTP, conexão) voltam para a fila com espera
+crescente. Uma falha permanente (SMS desabilitado, sem credenciais ou
+telefone inválido) marca a mensagem como ``falhou`` na primeira tentativa.
+"""
+
+import logging
+from datetime import timedelta
+from functools import partial
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import MensagemSMS
+from .smsdev_service import smsdev_service
+
+logger = logging.getLogger(__name__)
+
+MAX_TENTATIVAS = 5
+ESPERA_INICIAL = timedelta(seconds=30)
+ESPERA_MAXIMA = timedelta(hours=1)
+RESERVA = timedelta(minutes=5)
+TAMANHO_LOTE = 50
+
+
+def _gravar(**campos):
+    MensagemSMS.objects.create(**campos)
+
+
+def enfileirar_sms(telefone, mensagem, tipo, agendamento=None):
+    """Grava a mensagem na fila quando a transação atual for confirmada"""
+    transaction.on_commit(
+        partial(
+            _gravar,
+            telefone=telefone,
+            mensagem=mensagem,
+            tipo=tipo,
+            agendamento=agendamento,
+        )
+    )
+
+
+def enfileirar_barbeiro_a_caminho(agendamento, previsao_minutos=None):
+    """
+    Enfileira o SMS de "barbeiro a caminho"
+
+    Returns:
+        dict: {'sucesso': bool, 'erro': str} - sucesso indica que a mensagem
+              foi aceita na fila, não que já foi entregue
+    """
+    if not agendamento.cliente or not agendamento.cliente.telefone:
+        return {"sucesso": False, "erro": "Cliente sem telefone"}
+
+    if previsao_minutos is None:
+        previsao_minutos = agendamento.previsao_chegada
+
+    mensagem = smsdev_service.montar_mensagem_barbeiro_a_caminho(
+        agendamento, previsao_minutos
+    )
+    enfileirar_sms(agendamento.cliente.telefone, mensagem, "a_caminho", agendamento)
+    return {"sucesso": True, "erro": None}
+
+
+def espera_para(tentativas):
+    """Intervalo até a próxima tentativa: 30s, 1min, 2min... até 1h"""
+    return min(ESPERA_INICIAL * 2 ** (tentativas - 1), ESPERA_MAXIMA)
+
+
+def reservar_lote(agora, tamanho, **filtros):
+    """
+    Reserva até ``tamanho`` mensagens pendentes cujo horário chegou
+
+    A reserva empurra ``proxima_tentativa`` para ``agora + RESERVA``: até lá
+    nenhum outro worker (nem outra execução dos lembretes) pega a mensagem.
+
+    Args:
+        agora (datetime): Horário de referência
+        tamanho (int): Máximo de mensagens
+        **filtros: Filtros adicionais de ``MensagemSMS``
+
+    Returns:
+        list: As mensagens reservadas, em ordem de pk
+    """
+    # Dentro de outra transação (lembretes) não precisa de savepoint
+    with transaction.atomic(savepoint=False):
+        ids = list(
+            MensagemSMS.objects.select_for_update(skip_locked=True)
+            .filter(status="pendente", proxima_tentativa__lte=agora, **filtros)
+            .order_by("proxima_tentativa")
+            .values_list("pk", flat=True)[:tamanho]
+        )
+        MensagemSMS.objects.filter(pk__in=ids).update(proxima_tentativa=agora + RESERVA)
+    return list(MensagemSMS.objects.filter(pk__in=ids).order_by("pk"))
+
+
+# Campos alterados por ``aplicar_resultado``
+CAMPOS_RESULTADO = [
+    "status",
+    "tentativas",
+    "proxima_tentativa",
+    "erro",
+    "id_externo",
+    "enviado_em",
+]
+
+
+def aplicar_resultado(mensagem, resultado, agora):
+    """Atualiza a mensagem (sem salvar) com o resultado de uma tentativa"""
+    mensagem.tentativas += 1
+    if resultado["sucesso"]:
+        mensagem.status = "enviado"
+        mensagem.enviado_em = agora
+        mensagem.erro = ""
+        mensagem.id_externo = str(resultado.get("id") or "")
+    else:
+        mensagem.erro = resultado.get("erro") or "Erro desconhecido"
+        if resultado.get("permanente") or mensagem.tentativas >= MAX_TENTATIVAS:
+            mensagem.status = "falhou"
+        else:
+            mensagem.proxima_tentativa = agora + espera_para(mensagem.tentativas)
+
+
+def processar_fila(tamanho_lote=TAMANHO_LOTE):
+    """
+    Envia um lote de mensagens pendentes cujo horário de tentativa chegou
+
+    Returns:
+        dict: {'enviados': int, 'reagendados': int, 'falhas': int}
+    """
+    totais = {"enviados": 0, "reagendados": 0, "falhas": 0}
+    for mensagem in reservar_lote(timezone.now(), tamanho_lote):
+        try:
+            resultado = smsdev_service.enviar_sms(mensagem.telefone, mensagem.mensagem)
+        except Exception as e:
+            logger.exception(f"Fila SMS: erro ao enviar mensagem {mensagem.pk}")
+            resultado = {"sucesso": False, "erro": str(e), "id": None}
+
+        aplicar_resultado(mensagem, resultado, timezone.now())
+        mensagem.save(update_fields=CAMPOS_RESULTADO)
+        if mensagem.status == "enviado":
+            totais["enviados"] += 1
+        elif mensagem.status == "falhou":
+            totais["falhas"] += 1
+            logger.error(
+                f"Fila SMS: mensagem {mensagem.pk} descartada após "
+                f"{mensagem.tentativas} tentativas - {mensagem.erro}"
+            )
+        else:
+            totais["reagendados"] += 1
+    return totais
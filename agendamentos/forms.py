@@ -1,5 +1,16 @@
 from django import forms
+from django.db import transaction
+from django.utils.choices import CallableChoiceIterator
 
+from .disponibilidade import (
+    FIM_EXPEDIENTE,
+    STATUS_LIVRES,
+    bloquear_dia,
+    conflita,
+    grade_horarios,
+    horarios_disponiveis,
+    termina_no_expediente,
+)
 from .models import Agendamento, Cliente, Servico
 
 
@@ -31,6 +42,13 @@ class ClienteForm(forms.ModelForm):
         }
 
 
+MENSAGEM_CONFLITO = "Horário indisponível: já existe um agendamento neste período."
+MENSAGEM_FIM_EXPEDIENTE = (
+    f"Horário indisponível: o serviço terminaria depois das "
+    f"{FIM_EXPEDIENTE:%H:%M}, fim do expediente."
+)
+
+
 class AgendamentoForm(forms.ModelForm):
     class Meta:
         model = Agendamento
@@ -59,16 +77,86 @@ class AgendamentoForm(forms.ModelForm):
         self.fields["cliente"].empty_label = "Selecione um cliente"
         self.fields["cliente"].label = "Cliente"
 
-        # Gerar opções de horário de 10 em 10 minutos
-        from datetime import time
+        # Calculadas só quando o campo é renderizado
+        self.fields["hora"].widget.choices = CallableChoiceIterator(self._opcoes_hora)
+
+    def _opcoes_hora(self):
+        """
+        Com data e serviço escolhidos, só os inícios em que o serviço cabe
+        livre; antes disso, a grade de 10 em 10 minutos do expediente
+        """
+        horarios = self.horarios_disponiveis()
+        if horarios is None:
+            horarios = [horario.strftime("%H:%M") for horario in grade_horarios()]
+        return [("", "Selecione um horário...")] + [
+            (horario, horario) for horario in horarios
+        ]
+
+    def _valor_escolhido(self, campo):
+        try:
+            return self.fields[campo].clean(self[campo].value())
+        except forms.ValidationError:
+            return None
+
+    def cliente_selecionado(self):
+        """Cliente já escolhido (edição ou formulário reenviado com erro)"""
+        return self._valor_escolhido("cliente")
+
+    def horarios_disponiveis(self):
+        """
+        Horários de início livres ("HH:MM") para a data e o serviço escolhidos,
+        ou None enquanto um dos dois não foi informado
+        """
+        if not hasattr(self, "_horarios_disponiveis"):
+            self._horarios_disponiveis = None
+            data = self._valor_escolhido("data")
+            servico = self._valor_escolhido("servico")
+            if data and servico:
+                disponiveis = horarios_disponiveis(
+                    data, servico.duracao, ignorar=self.instance.pk
+                )
+                self._horarios_disponiveis = [
+                    horario.strftime("%H:%M") for horario in disponiveis["horarios"]
+                ]
+        return self._horarios_disponiveis
+
+    def _conflita(self, data, hora, servico):
+        return self.instance.status not in STATUS_LIVRES and conflita(
+            data, hora, servico.duracao, ignorar=self.instance.pk
+        )
+
+    def clean(self):
+        cleaned_data = super().clean()
+        data = cleaned_data.get("data")
+        hora = cleaned_data.get("hora")
+        servico = cleaned_data.get("servico")
+        if hora and servico and not termina_no_expediente(hora, servico.duracao):
+            self.add_error("hora", MENSAGEM_FIM_EXPEDIENTE)
+        elif data and hora and servico and self._conflita(data, hora, servico):
+            self.add_error("hora", MENSAGEM_CONFLITO)
+        return cleaned_data
 
-        horarios = []
-        for hora in range(6, 22):  # Das 6h às 21h50
-            for minuto in [0, 10, 20, 30, 40, 50]:
-                horario = time(hora, minuto)
-                horarios.append((horario.strftime("%H:%M"), horario.strftime("%H:%M")))
+    def save(self, commit=True):
+        """
+        Grava o agendamento repetindo a verificação de sobreposição com o dia
+        bloqueado, já que outra requisição pode ter ocupado o horário depois
+        da validação
 
-        self.fields["hora"].choices = [("", "Selecione um horário...")] + horarios
+        Raises:
+            forms.ValidationError: O horário deixou de estar livre
+        """
+        # O preço vigente do serviço é registrado por Agendamento.save()
+        agendamento = super().save(commit=False)
+        if commit:
+            with transaction.atomic():
+                bloquear_dia(agendamento.data)
+                if self._conflita(
+                    agendamento.data, agendamento.hora, agendamento.servico
+                ):
+                    raise forms.ValidationError(MENSAGEM_CONFLITO, code="conflito")
+                agendamento.save()
+            self._save_m2m()
+        return agendamento
 
 
 class ServicoForm(forms.ModelForm):
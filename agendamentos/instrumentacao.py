@@ -0,0 +1,211 @@
+"""
+Instrumentação por requisição: queries, SQL, templates e view.
+
+Com ``INSTRUMENTACAO`` ligado (variável de ambiente de mesmo nome), o
+``InstrumentacaoMiddleware`` mede cada requisição:
+
+- queries e tempo de SQL, por um ``execute_wrapper`` na conexão;
+- tempo de renderização dos templates, pelo backend ``TemplatesMedidos``
+  (configurado em ``TEMPLATES``);
+- tempo da view (de ``process_view`` até a resposta voltar ao middleware);
+- tempo total, incluindo os outros middlewares (ele é o primeiro da lista).
+
+O resultado vai para o header ``Server-Timing``, que aparece na aba de rede
+do navegador junto com as ``QUERIES_DETALHADAS`` queries mais lentas (tipo e
+tabela, sem parâmetros), e para uma linha de log em JSON no logger
+``agendamentos.instrumentacao``.
+
+O middleware funciona em WSGI e em ASGI: sob ASGI ele é assíncrono e não
+obriga a cadeia (nem o fluxo SSE do painel) a passar por uma thread.
+Desligado, ele se retira da cadeia na inicialização (``MiddlewareNotUsed``) e
+não custa nada por requisição.
+"""
+
+import contextvars
+import json
+import logging
+import re
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.template.backends.django import DjangoTemplates, Template
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+logger = logging.getLogger(__name__)
+
+QUERIES_DETALHADAS = 3
+
+_TABELA = re.compile(r"\b(?:FROM|INTO|UPDATE)\s+[\"`]?(\w+)", re.IGNORECASE)
+
+# Medição da requisição em andamento (None fora de requisições)
+_medicao = contextvars.ContextVar("medicao", default=None)
+
+
+def descrever_sql(sql):
+    """Tipo e tabela de uma query, ex.: "SELECT agendamentos_agendamento" """
+    partes = sql.split(None, 1)
+    if not partes:
+        return ""
+    tabela = _TABELA.search(sql)
+    tipo = partes[0].upper()
+    return f"{tipo} {tabela.group(1)}" if tabela else tipo
+
+
+class Medicao:
+    """Tempos (em segundos) e queries de uma requisição"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.inicio_view = None
+        self.total = None
+        self.view = None
+        self.sql = 0.0
+        self.template = 0.0
+        self.queries = []
+
+    def registrar_query(self, sql, duracao):
+        self.sql += duracao
+        self.queries.append((duracao, sql))
+
+    def encerrar(self):
+        agora = time.perf_counter()
+        self.total = agora - self.inicio
+        if self.inicio_view is not None:
+            self.view = agora - self.inicio_view
+
+    def mais_lentas(self, quantidade=QUERIES_DETALHADAS):
+        """[(duracao, sql), ...] das queries mais lentas, da mais lenta"""
+        return sorted(self.queries, key=lambda query: query[0], reverse=True)[
+            :quantidade
+        ]
+
+    def server_timing(self):
+        """Valor do header ``Server-Timing``"""
+        metricas = [
+            f'db;dur={self.sql * 1000:.1f};desc="{len(self.queries)} queries"',
+            f"template;dur={self.template * 1000:.1f}",
+        ]
+        if self.view is not None:
+            metricas.append(f"view;dur={self.view * 1000:.1f}")
+        metricas.append(f"total;dur={self.total * 1000:.1f}")
+        for posicao, (duracao, sql) in enumerate(self.mais_lentas(), start=1):
+            metricas.append(
+                f'q{posicao};dur={duracao * 1000:.1f};desc="{descrever_sql(sql)}"'
+            )
+        return ", ".join(metricas)
+
+    def registro(self, request, response):
+        """Campos da linha de log da requisição"""
+        resolver_match = getattr(request, "resolver_match", None)
+        return {
+            "metodo": request.method,
+            "caminho": request.path,
+            "rota": resolver_match.url_name if resolver_match else None,
+            "status": response.status_code,
+            "queries": len(self.queries),
+            "sql_ms": round(self.sql * 1000, 1),
+            "template_ms": round(self.template * 1000, 1),
+            "view_ms": None if self.view is None else round(self.view * 1000, 1),
+            "total_ms": round(self.total * 1000, 1),
+        }
+
+
+def medicao_atual():
+    """Medição da requisição em andamento, ou None"""
+    return _medicao.get()
+
+
+def _medir_query(execute, sql, params, many, context):
+    medicao = _medicao.get()
+    if medicao is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicao.registrar_query(sql, time.perf_counter() - inicio)
+
+
+class TemplateMedido(Template):
+    """Template que soma o tempo de ``render`` na medição atual"""
+
+    def render(self, context=None, request=None):
+        medicao = _medicao.get()
+        if medicao is None:
+            return super().render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            medicao.template += time.perf_counter() - inicio
+
+
+class TemplatesMedidos(DjangoTemplates):
+    """Backend ``DjangoTemplates`` cujos templates entram na medição"""
+
+    def from_string(self, template_code):
+        return TemplateMedido(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TemplateMedido(template.template, self)
+
+
+class InstrumentacaoMiddleware:
+    """Server-Timing e log estruturado de cada requisição"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.INSTRUMENTACAO:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        medicao = Medicao()
+        token = _medicao.set(medicao)
+        try:
+            with connection.execute_wrapper(_medir_query):
+                response = self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        return self._concluir(medicao, request, response)
+
+    async def __acall__(self, request):
+        medicao = Medicao()
+        token = _medicao.set(medicao)
+        try:
+            with connection.execute_wrapper(_medir_query):
+                response = await self.get_response(request)
+        finally:
+            _medicao.reset(token)
+        return self._concluir(medicao, request, response)
+
+    def _concluir(self, medicao, request, response):
+        medicao.encerrar()
+        timing = medicao.server_timing()
+        if response.has_header("Server-Timing"):
+            timing = f"{response['Server-Timing']}, {timing}"
+        response["Server-Timing"] = timing
+        logger.info(
+            json.dumps(
+                medicao.registro(request, response),
+                ensure_ascii=False,
+                separators=(",", ":"),
+            )
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        medicao = _medicao.get()
+        if medicao is not None:
+            medicao.inicio_view = time.perf_counter()
@@ -0,0 +1,119 @@
+"""
+Lembretes por SMS dos agendamentos do dia seguinte.
+
+``enviar_lembretes`` percorre os agendamentos confirmados de uma data com
+``iterator()`` (sem carregar o dia inteiro na memória) e, para cada lote:
+
+1. grava os lembretes em ``MensagemSMS`` (tipo "lembrete") como pendentes e
+   os reserva na fila (``fila_sms.reservar_lote``), na mesma transação;
+2. envia as mensagens reservadas com ``smsdev_service.enviar_lote``;
+3. marca cada uma como enviada ou agenda a nova tentativa.
+
+Como o registro vem antes do envio, uma execução que cai no meio do lote não
+reenvia nada na próxima: o que ficou pendente é enviado pelo worker
+(``processar_fila_sms``) quando a reserva expira. A restrição única
+``mensagem_sms_lembrete_unico`` impede dois lembretes ativos para o mesmo
+agendamento, então duas execuções simultâneas não duplicam mensagens: a
+segunda ignora o lembrete já gravado e não consegue reservá-lo.
+"""
+
+from datetime import date, timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import cache_consultas
+from .fila_sms import CAMPOS_RESULTADO, aplicar_resultado, reservar_lote
+from .models import Agendamento, MensagemSMS
+from .smsdev_service import smsdev_service
+
+TAMANHO_LOTE = 100
+
+
+def agendamentos_para_lembrete(data):
+    """Agendamentos confirmados de ``data`` com telefone e ainda sem lembrete"""
+    lembrete = MensagemSMS.objects.filter(
+        agendamento=OuterRef("pk"),
+        tipo="lembrete",
+        status__in=["pendente", "enviado"],
+    )
+    return (
+        Agendamento.objects.filter(
+            data=data,
+            status="confirmado",
+            cliente__telefone__isnull=False,
+        )
+        .exclude(cliente__telefone="")
+        .exclude(Exists(lembrete))
+        .select_related("cliente", "servico")
+        .only("data", "hora", "cliente__nome", "cliente__telefone", "servico__nome")
+        .order_by("hora", "pk")
+    )
+
+
+def _registrar_pendentes(lote):
+    """Grava os lembretes do lote e reserva os que esta execução vai enviar"""
+    agora = timezone.now()
+    with transaction.atomic():
+        # Lembrete ativo já existente (outra execução) é ignorado
+        MensagemSMS.objects.bulk_create(
+            [
+                MensagemSMS(
+                    agendamento=agendamento,
+                    tipo="lembrete",
+                    telefone=agendamento.cliente.telefone,
+                    mensagem=smsdev_service.montar_mensagem_lembrete(agendamento),
+                    proxima_tentativa=agora,
+                )
+                for agendamento in lote
+            ],
+            ignore_conflicts=True,
+        )
+        return reservar_lote(
+            agora,
+            len(lote),
+            tipo="lembrete",
+            agendamento__in=[agendamento.pk for agendamento in lote],
+        )
+
+
+def enviar_lembretes(data=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Envia os lembretes dos agendamentos de ``data`` (padrão: amanhã)
+
+    Returns:
+        dict: {'enviados': int, 'falhas': int}
+    """
+    if data is None:
+        data = date.today() + timedelta(days=1)
+
+    totais = {"enviados": 0, "falhas": 0}
+    agendamentos = agendamentos_para_lembrete(data).iterator(chunk_size=tamanho_lote)
+    while True:
+        lote = list(islice(agendamentos, tamanho_lote))
+        if not lote:
+            break
+
+        mensagens = _registrar_pendentes(lote)
+        if not mensagens:
+            continue
+        resultados = smsdev_service.enviar_lote(
+            [(mensagem.telefone, mensagem.mensagem) for mensagem in mensagens]
+        )
+
+        agora = timezone.now()
+        for mensagem, resultado in zip(mensagens, resultados):
+            # Falhas transitórias ficam pendentes para o worker tentar de novo
+            aplicar_resultado(mensagem, resultado, agora)
+            if mensagem.status == "enviado":
+                totais["enviados"] += 1
+            else:
+                totais["falhas"] += 1
+        MensagemSMS.objects.bulk_update(mensagens, CAMPOS_RESULTADO)
+
+    if totais["enviados"] or totais["falhas"]:
+        # O painel do dia mostra o status do último SMS
+        cache_consultas.invalidar(cache_consultas.escopo_dia(data))
+    return totais
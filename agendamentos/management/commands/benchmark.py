@@ -0,0 +1,132 @@
+import json
+from datetime import date, datetime
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from agendamentos import benchmark, dados_sinteticos
+from agendamentos.models import Agendamento
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede painel, financeiro, calendário, clientes e agendamento em um banco "
+        "de teste com 1k, 100k ou 1M agendamentos e grava o resultado em JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--camada",
+            choices=benchmark.CAMADAS,
+            default="1k",
+            help="Volume de agendamentos (padrão: 1k)",
+        )
+        parser.add_argument(
+            "--repeticoes",
+            type=int,
+            default=20,
+            help="Requisições medidas por cenário e modo (padrão: 20)",
+        )
+        parser.add_argument(
+            "--aquecimento",
+            type=int,
+            default=3,
+            help="Requisições descartadas antes das medidas (padrão: 3)",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=42, help="Semente dos dados (padrão: 42)"
+        )
+        parser.add_argument(
+            "--data", help="Dia medido e base dos dados (AAAA-MM-DD, padrão: hoje)"
+        )
+        parser.add_argument(
+            "--saida",
+            help="Arquivo JSON do resultado (padrão: benchmark-<camada>.json)",
+        )
+        parser.add_argument(
+            "--referencia", help="JSON de uma execução anterior para comparar"
+        )
+        parser.add_argument(
+            "--tolerancia",
+            type=float,
+            default=0.25,
+            help="Piora aceita no p95 em relação à referência (padrão: 0.25)",
+        )
+        parser.add_argument(
+            "--manter-banco",
+            action="store_true",
+            help="Mantém o banco de teste populado para a próxima execução",
+        )
+
+    def handle(self, *args, **options):
+        camada = options["camada"]
+        referencia_dados = self._ler_referencia(options["referencia"])
+        dia = self._ler_data(options["data"])
+
+        resultado = self._medir(camada, dia, options)
+
+        saida = Path(options["saida"] or f"benchmark-{camada}.json")
+        saida.write_text(json.dumps(resultado, indent=2, ensure_ascii=False))
+        self._relatar(resultado, saida)
+
+        if referencia_dados is not None:
+            regressoes = benchmark.comparar(
+                resultado, referencia_dados, options["tolerancia"]
+            )
+            if regressoes:
+                raise CommandError("Regressões:\n" + "\n".join(regressoes))
+            self.stdout.write(
+                self.style.SUCCESS("Sem regressões em relação à referência")
+            )
+
+    def _ler_referencia(self, caminho):
+        if not caminho:
+            return None
+        try:
+            return json.loads(Path(caminho).read_text())
+        except (OSError, ValueError) as erro:
+            raise CommandError(f"Referência inválida: {erro}")
+
+    def _ler_data(self, texto):
+        if not texto:
+            return date.today()
+        try:
+            return datetime.strptime(texto, "%Y-%m-%d").date()
+        except ValueError:
+            raise CommandError(f"Data inválida: {texto} (use AAAA-MM-DD)")
+
+    def _medir(self, camada, dia, options):
+        """Popula o banco de teste com a camada, se preciso, e mede os cenários."""
+        quantidade = benchmark.CAMADAS[camada]
+        manter = options["manter_banco"]
+        nome_original = connection.settings_dict["NAME"]
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=manter)
+        try:
+            if Agendamento.objects.count() != quantidade:
+                self.stdout.write(f"Gerando {quantidade} agendamentos...")
+                dados_sinteticos.limpar()
+                benchmark.popular(quantidade, dia, options["seed"])
+
+            return benchmark.executar(
+                camada, dia, options["repeticoes"], options["aquecimento"]
+            )
+        finally:
+            connection.creation.destroy_test_db(
+                nome_original, verbosity=0, keepdb=manter
+            )
+            teardown_test_environment()
+
+    def _relatar(self, resultado, saida):
+        for nome, modos in resultado["cenarios"].items():
+            self.stdout.write(
+                f"{nome:22} "
+                + " | ".join(
+                    f"{modo}: p50 {medida['ms']['p50']:.1f}ms "
+                    f"p95 {medida['ms']['p95']:.1f}ms {medida['queries']} queries"
+                    for modo, medida in modos.items()
+                )
+            )
+        self.stdout.write(self.style.SUCCESS(f"Resultado gravado em {saida}"))
@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agendamentos.lembretes import TAMANHO_LOTE, enviar_lembretes
+
+
+class Command(BaseCommand):
+    help = "Envia SMS de lembrete para os agendamentos confirmados de amanhã"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--data", help="Dia dos agendamentos (AAAA-MM-DD, padrão: amanhã)"
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=TAMANHO_LOTE,
+            help=f"Mensagens enviadas por lote (padrão: {TAMANHO_LOTE})",
+        )
+
+    def handle(self, *args, **options):
+        data = None
+        if options["data"]:
+            try:
+                data = datetime.strptime(options["data"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError(f"Data inválida: {options['data']} (use AAAA-MM-DD)")
+
+        totais = enviar_lembretes(data, options["lote"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Lembretes enviados: {totais['enviados']} | "
+                f"Falhas (ficam na fila): {totais['falhas']}"
+            )
+        )
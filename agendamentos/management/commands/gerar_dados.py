@@ -0,0 +1,140 @@
+import time
+from datetime import date, datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agendamentos import dados_sinteticos
+from agendamentos.models import Agendamento
+
+
+def _data(valor):
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Data inválida: {valor} (use AAAA-MM-DD)")
+
+
+def _distribuicao(valor):
+    """'concluido=85,cancelado=10' -> {'concluido': 85.0, 'cancelado': 10.0}"""
+    validos = {status for status, _ in Agendamento.STATUS_CHOICES}
+    pesos = {}
+    for item in valor.split(","):
+        status, _, peso = item.partition("=")
+        status = status.strip()
+        if status not in validos:
+            raise CommandError(
+                f"Status inválido: {status} (use {', '.join(sorted(validos))})"
+            )
+        try:
+            pesos[status] = float(peso)
+        except ValueError:
+            raise CommandError(f"Peso inválido para {status}: {peso}")
+        if pesos[status] < 0:
+            raise CommandError(f"Peso negativo para {status}: {peso}")
+    if sum(pesos.values()) <= 0:
+        raise CommandError("A soma dos pesos precisa ser maior que zero")
+    return pesos
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera clientes, serviços e agendamentos sintéticos em lote "
+        "(bulk_create no SQLite, COPY no PostgreSQL)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--agendamentos",
+            type=int,
+            default=10_000,
+            help="Quantidade de agendamentos (padrão: 10000)",
+        )
+        parser.add_argument(
+            "--clientes",
+            type=int,
+            help="Quantidade de clientes (padrão: 1 a cada 20 agendamentos)",
+        )
+        parser.add_argument(
+            "--inicio",
+            help=f"Primeiro dia (AAAA-MM-DD, padrão: {dados_sinteticos.DIAS} dias "
+            "antes do fim, ou mais se a quantidade não couber sem sobreposição)",
+        )
+        parser.add_argument(
+            "--fim",
+            help=f"Último dia (AAAA-MM-DD, padrão: daqui a "
+            f"{dados_sinteticos.DIAS_FUTUROS - 1} dias)",
+        )
+        parser.add_argument(
+            "--status",
+            help="Pesos dos status nos dias passados, ex.: "
+            "concluido=85,cancelado=10,confirmado=5 (padrão)",
+        )
+        parser.add_argument(
+            "--pagos",
+            type=float,
+            default=dados_sinteticos.TAXA_PAGOS,
+            help="Fração dos concluídos que está paga, de 0 a 1 "
+            f"(padrão: {dados_sinteticos.TAXA_PAGOS})",
+        )
+        parser.add_argument(
+            "--seed", type=int, default=42, help="Semente dos dados (padrão: 42)"
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=dados_sinteticos.TAMANHO_LOTE,
+            help=f"Linhas por INSERT ou COPY (padrão: {dados_sinteticos.TAMANHO_LOTE})",
+        )
+        parser.add_argument(
+            "--limpar",
+            action="store_true",
+            help="Apaga antes todos os agendamentos, clientes e o resumo diário",
+        )
+
+    def handle(self, *args, **options):
+        if options["agendamentos"] < 0 or (options["clientes"] or 0) < 0:
+            raise CommandError("As quantidades não podem ser negativas")
+        if options["lote"] < 1:
+            raise CommandError("O lote precisa ter pelo menos 1 linha")
+        if not 0 <= options["pagos"] <= 1:
+            raise CommandError("--pagos precisa estar entre 0 e 1")
+
+        hoje = date.today()
+        _, fim = dados_sinteticos.periodo(hoje)
+        if options["fim"]:
+            fim = _data(options["fim"])
+        dias = dados_sinteticos.dias_necessarios(options["agendamentos"])
+        inicio = fim - timedelta(days=dias - 1)
+        if options["inicio"]:
+            inicio = _data(options["inicio"])
+        if fim < inicio:
+            raise CommandError("--fim precisa ser depois de --inicio")
+        status = _distribuicao(options["status"]) if options["status"] else None
+
+        if options["limpar"]:
+            dados_sinteticos.limpar()
+
+        comeco = time.perf_counter()
+        try:
+            gerados = dados_sinteticos.gerar(
+                options["agendamentos"],
+                inicio,
+                fim,
+                hoje,
+                clientes=options["clientes"],
+                status=status,
+                taxa_pagos=options["pagos"],
+                seed=options["seed"],
+                lote=options["lote"],
+            )
+        except ValueError as erro:
+            raise CommandError(str(erro))
+        duracao = time.perf_counter() - comeco
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Gerados {gerados['agendamentos']} agendamento(s) de {inicio} a "
+                f"{fim}, {gerados['clientes']} cliente(s) e "
+                f"{gerados['servicos']} serviço(s) em {duracao:.1f}s"
+            )
+        )
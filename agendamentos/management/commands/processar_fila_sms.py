@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from agendamentos.fila_sms import TAMANHO_LOTE, processar_fila
+
+
+class Command(BaseCommand):
+    help = "Envia os SMS pendentes da fila (MensagemSMS), com novas tentativas"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--uma-vez",
+            action="store_true",
+            help="Esvazia a fila uma vez e termina, em vez de rodar em loop",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=5,
+            help="Segundos de espera quando a fila está vazia (padrão: 5)",
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=TAMANHO_LOTE,
+            help=f"Mensagens reservadas por rodada (padrão: {TAMANHO_LOTE})",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            while True:
+                totais = processar_fila(options["lote"])
+                processadas = sum(totais.values())
+                if processadas:
+                    self.stdout.write(
+                        f"Enviados: {totais['enviados']} | "
+                        f"Reagendados: {totais['reagendados']} | "
+                        f"Falhas: {totais['falhas']}"
+                    )
+                elif options["uma_vez"]:
+                    break
+                else:
+                    time.sleep(options["intervalo"])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS("Fila de SMS processada"))
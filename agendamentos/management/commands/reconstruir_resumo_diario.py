@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from agendamentos.relatorios import reconstruir_resumo
+
+
+def _data(valor):
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").date()
+    except ValueError:
+        raise CommandError(f"Data inválida: {valor} (use AAAA-MM-DD)")
+
+
+class Command(BaseCommand):
+    help = "Reconstrói o resumo diário (ResumoDiario) a partir dos agendamentos"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--inicio", help="Primeiro dia a reconstruir (AAAA-MM-DD, opcional)"
+        )
+        parser.add_argument(
+            "--fim", help="Último dia a reconstruir (AAAA-MM-DD, opcional)"
+        )
+
+    def handle(self, *args, **options):
+        filtros = {}
+        if options["inicio"]:
+            filtros["data__gte"] = _data(options["inicio"])
+        if options["fim"]:
+            filtros["data__lte"] = _data(options["fim"])
+
+        linhas = reconstruir_resumo(**filtros)
+        self.stdout.write(
+            self.style.SUCCESS(f"Resumo diário reconstruído: {linhas} linha(s)")
+        )
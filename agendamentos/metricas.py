@@ -0,0 +1,397 @@
+"""
+Métricas no formato texto do Prometheus, somadas entre processos.
+
+Cada processo (workers do gunicorn, ``processar_fila_sms``) acumula as
+séries em memória e as grava de tempos em tempos (``INTERVALO_GRAVACAO``) em
+``<METRICAS_DIR>/<pid>.json``. A view ``/metrics`` grava as do próprio
+processo, lê os arquivos de todos e soma as séries. Assim os contadores
+cobrem todos os workers sem coletor externo. Um processo novo que recebe o
+pid de um antigo continua a partir do arquivo dele, e a coleta incorpora às
+séries do processo atual os arquivos de processos que já terminaram (workers
+reciclados pelo gunicorn) e os apaga. Assim as somas nunca diminuem e o
+diretório não cresce a cada worker novo.
+
+Séries:
+
+- ``barbearia_requisicao_segundos`` - histograma da latência por rota
+  (``url_name``), medida pelo ``MetricasMiddleware``;
+- ``barbearia_requisicao_queries`` - histograma de queries por requisição;
+- ``barbearia_cache_consultas_total`` - acertos e faltas do cache de
+  consultas (``cache_consultas.estatisticas``), e a taxa de acerto derivada;
+- ``barbearia_sms_envios_total`` e ``barbearia_sms_segundos`` - envios à
+  SMSDev por resultado e sua latência.
+
+Tudo só é coletado com ``METRICAS`` ligado; desligado, o middleware sai da
+cadeia e ``registrar_sms`` retorna na hora.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import cache_consultas
+
+INTERVALO_GRAVACAO = 5
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_QUERIES = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+BUCKETS_SMS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# nome: (tipo, descrição, buckets)
+SERIES = {
+    "barbearia_requisicao_segundos": (
+        "histogram",
+        "Latência das requisições por rota",
+        BUCKETS_SEGUNDOS,
+    ),
+    "barbearia_requisicao_queries": (
+        "histogram",
+        "Queries ao banco por requisição",
+        BUCKETS_QUERIES,
+    ),
+    "barbearia_cache_consultas_total": (
+        "counter",
+        "Leituras do cache de consultas por resultado",
+        None,
+    ),
+    "barbearia_sms_envios_total": (
+        "counter",
+        "Envios de SMS à SMSDev por resultado",
+        None,
+    ),
+    "barbearia_sms_segundos": ("histogram", "Latência dos envios de SMS", BUCKETS_SMS),
+}
+TAXA_ACERTO_CACHE = "barbearia_cache_taxa_acerto"
+
+_lock = threading.Lock()
+# {(nome, ((rótulo, valor), ...)): número | [contagens..., soma]} do processo
+_series = {}
+# Séries do cache herdadas do arquivo de um processo antigo com o mesmo pid
+_base_cache = {}
+_pid = None
+_ultima_gravacao = 0.0
+
+
+def _diretorio():
+    return Path(settings.METRICAS_DIR)
+
+
+def _arquivo(pid):
+    return _diretorio() / f"{pid}.json"
+
+
+def _chave(nome, rotulos):
+    return nome, tuple(sorted((chave, str(valor)) for chave, valor in rotulos.items()))
+
+
+def _ler(arquivo):
+    """Séries gravadas em um arquivo, como ``{chave: valor}``"""
+    try:
+        conteudo = json.loads(arquivo.read_text())
+    except (OSError, ValueError):
+        return {}
+    return {
+        (nome, tuple(tuple(rotulo) for rotulo in rotulos)): valor
+        for nome, rotulos, valor in conteudo
+    }
+
+
+def _somar(destino, chave, valor):
+    anterior = destino.get(chave)
+    if anterior is None:
+        destino[chave] = list(valor) if isinstance(valor, list) else valor
+    elif isinstance(valor, list):
+        destino[chave] = [a + b for a, b in zip(anterior, valor)]
+    else:
+        destino[chave] = anterior + valor
+
+
+def _vivo(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Existe, mas é de outro usuário
+        return True
+    return True
+
+
+def _preparar():
+    """Recomeça as séries em um processo novo (inclusive depois de fork)"""
+    global _pid, _series, _base_cache, _ultima_gravacao
+    if _pid == os.getpid():
+        return
+    _pid = os.getpid()
+    anteriores = _ler(_arquivo(_pid))
+    _base_cache = {
+        chave: valor
+        for chave, valor in anteriores.items()
+        if chave[0] == "barbearia_cache_consultas_total"
+    }
+    _series = {
+        chave: valor for chave, valor in anteriores.items() if chave not in _base_cache
+    }
+    _ultima_gravacao = time.monotonic()
+    # O que ainda não foi gravado não se perde quando o processo termina
+    atexit.register(_gravar_ao_sair)
+
+
+def incrementar(nome, quantidade=1, **rotulos):
+    """Soma ``quantidade`` a um contador"""
+    with _lock:
+        _preparar()
+        chave = _chave(nome, rotulos)
+        _series[chave] = _series.get(chave, 0) + quantidade
+    _gravar_se_preciso()
+
+
+def observar(nome, valor, **rotulos):
+    """Registra ``valor`` em um histograma"""
+    buckets = SERIES[nome][2]
+    with _lock:
+        _preparar()
+        chave = _chave(nome, rotulos)
+        serie = _series.get(chave)
+        if serie is None:
+            # Uma contagem por bucket, mais +Inf, e a soma no fim
+            serie = _series[chave] = [0] * (len(buckets) + 1) + [0.0]
+        posicao = next(
+            (i for i, limite in enumerate(buckets) if valor <= limite), len(buckets)
+        )
+        serie[posicao] += 1
+        serie[-1] += valor
+    _gravar_se_preciso()
+
+
+def _series_cache():
+    series = dict(_base_cache)
+    for nome, contagem in cache_consultas.estatisticas().items():
+        for campo, resultado in (("acertos", "acerto"), ("faltas", "falta")):
+            chave = _chave(
+                "barbearia_cache_consultas_total",
+                {"consulta": nome, "resultado": resultado},
+            )
+            series[chave] = series.get(chave, 0) + contagem[campo]
+    return series
+
+
+def gravar():
+    """Grava as séries deste processo no seu arquivo"""
+    global _ultima_gravacao
+    with _lock:
+        _preparar()
+        series = {**_series, **_series_cache()}
+        _ultima_gravacao = time.monotonic()
+        conteudo = json.dumps(
+            [[nome, rotulos, valor] for (nome, rotulos), valor in series.items()]
+        )
+        diretorio = _diretorio()
+        diretorio.mkdir(parents=True, exist_ok=True)
+        # Troca atômica: quem lê nunca vê um arquivo pela metade
+        temporario = diretorio / f".{_pid}.tmp"
+        temporario.write_text(conteudo)
+        os.replace(temporario, _arquivo(_pid))
+
+
+def _gravar_ao_sair():
+    if _pid == os.getpid():
+        gravar()
+
+
+def zerar():
+    """Descarta as séries deste processo (sem apagar arquivos)"""
+    global _pid, _series, _base_cache
+    with _lock:
+        _pid, _series, _base_cache = None, {}, {}
+
+
+def _gravar_se_preciso():
+    if time.monotonic() - _ultima_gravacao >= INTERVALO_GRAVACAO:
+        gravar()
+
+
+def _reservar_encerrado(arquivo):
+    """Renomeia o arquivo de um processo que terminou; ``None`` se não for o caso"""
+    if not arquivo.stem.isdigit():
+        return None
+    pid = int(arquivo.stem)
+    if pid == _pid or _vivo(pid):
+        return None
+    reservado = arquivo.with_name(f".{pid}.{_pid}.incorporando")
+    try:
+        os.replace(arquivo, reservado)
+    except FileNotFoundError:
+        # Outro worker chegou antes
+        return None
+    return reservado
+
+
+def _incorporar_encerrados():
+    """
+    Soma às séries deste processo as de arquivos de processos que terminaram
+
+    Cada arquivo é renomeado antes de ser lido, então só um dos workers que
+    coletam ao mesmo tempo o incorpora.
+    """
+    if os.name != "posix":
+        # No Windows os.kill(pid, 0) encerraria o processo
+        return
+    incorporados = []
+    for arquivo in _diretorio().glob("*.json"):
+        reservado = _reservar_encerrado(arquivo)
+        if reservado is None:
+            continue
+        with _lock:
+            for chave, valor in _ler(reservado).items():
+                if chave[0] == "barbearia_cache_consultas_total":
+                    _somar(_base_cache, chave, valor)
+                else:
+                    _somar(_series, chave, valor)
+        incorporados.append(reservado)
+    if incorporados:
+        gravar()
+        for reservado in incorporados:
+            reservado.unlink(missing_ok=True)
+
+
+def coletar():
+    """
+    Soma as séries de todos os processos
+
+    Returns:
+        dict: {(nome, rótulos): valor}
+    """
+    gravar()
+    _incorporar_encerrados()
+    total = {}
+    for arquivo in sorted(_diretorio().glob("*.json")):
+        for chave, valor in _ler(arquivo).items():
+            _somar(total, chave, valor)
+    return total
+
+
+def _formatar_rotulos(rotulos):
+    if not rotulos:
+        return ""
+    pares = ",".join(
+        '{}="{}"'.format(
+            chave,
+            valor.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for chave, valor in rotulos
+    )
+    return f"{{{pares}}}"
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def exportar(series=None):
+    """Séries no formato texto do Prometheus"""
+    if series is None:
+        series = coletar()
+    linhas = []
+    for nome, (tipo, descricao, buckets) in SERIES.items():
+        linhas.append(f"# HELP {nome} {descricao}")
+        linhas.append(f"# TYPE {nome} {tipo}")
+        for (serie, rotulos), valor in sorted(series.items()):
+            if serie != nome:
+                continue
+            if tipo == "counter":
+                linhas.append(f"{nome}{_formatar_rotulos(rotulos)} {_numero(valor)}")
+                continue
+            acumulado = 0
+            for limite, contagem in zip((*buckets, "+Inf"), valor[:-1]):
+                acumulado += contagem
+                le = limite if limite == "+Inf" else _numero(float(limite))
+                linhas.append(
+                    f"{nome}_bucket{_formatar_rotulos((*rotulos, ('le', le)))} "
+                    f"{acumulado}"
+                )
+            linhas.append(f"{nome}_sum{_formatar_rotulos(rotulos)} {valor[-1]!r}")
+            linhas.append(f"{nome}_count{_formatar_rotulos(rotulos)} {acumulado}")
+
+    leituras = {"acerto": 0, "falta": 0}
+    for (serie, rotulos), valor in series.items():
+        if serie == "barbearia_cache_consultas_total":
+            leituras[dict(rotulos)["resultado"]] += valor
+    total_leituras = leituras["acerto"] + leituras["falta"]
+    linhas.append(
+        f"# HELP {TAXA_ACERTO_CACHE} Fração das leituras do cache que acertaram"
+    )
+    linhas.append(f"# TYPE {TAXA_ACERTO_CACHE} gauge")
+    taxa = leituras["acerto"] / total_leituras if total_leituras else 0.0
+    linhas.append(f"{TAXA_ACERTO_CACHE} {taxa!r}")
+    return "\n".join(linhas) + "\n"
+
+
+def registrar_sms(sucesso, duracao):
+    """Conta um envio à SMSDev e sua latência (em segundos)"""
+    if not settings.METRICAS:
+        return
+    resultado = "sucesso" if sucesso else "falha"
+    incrementar("barbearia_sms_envios_total", resultado=resultado)
+    observar("barbearia_sms_segundos", duracao)
+
+
+def _contar(queries):
+    """``execute_wrapper`` que anota em ``queries`` cada query executada"""
+
+    def contar(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    return contar
+
+
+class MetricasMiddleware:
+    """Latência e queries de cada requisição, por rota (em WSGI e em ASGI)"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+        queries = []
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(_contar(queries)):
+            response = self.get_response(request)
+        self._registrar(request, time.perf_counter() - inicio, len(queries))
+        return response
+
+    async def __acall__(self, request):
+        queries = []
+        inicio = time.perf_counter()
+        with connection.execute_wrapper(_contar(queries)):
+            response = await self.get_response(request)
+        self._registrar(request, time.perf_counter() - inicio, len(queries))
+        return response
+
+    def _registrar(self, request, duracao, queries):
+        resolver_match = getattr(request, "resolver_match", None)
+        # Caminhos sem rota (404) ficam juntos, para não criar uma série por URL
+        rota = resolver_match.url_name if resolver_match else None
+        rota = rota or "sem_rota"
+        observar("barbearia_requisicao_segundos", duracao, rota=rota)
+        observar("barbearia_requisicao_queries", queries, rota=rota)
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.7 on 2026-10-17 01:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def popular_resumo_diario(apps, schema_editor):
+    Agendamento = apps.get_model("agendamentos", "Agendamento")
+    ResumoDiario = apps.get_model("agendamentos", "ResumoDiario")
+
+    linhas = (
+        Agendamento.objects.order_by()
+        .values("data", "status", "status_pagamento", "servico_id")
+        .annotate(total_quantidade=Count("id"), total_valor=Sum("servico__preco"))
+    )
+    ResumoDiario.objects.bulk_create(
+        (
+            ResumoDiario(
+                quantidade=linha.pop("total_quantidade"),
+                valor_total=linha.pop("total_valor") or 0,
+                **linha,
+            )
+            for linha in linhas.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("agendamentos", "0006_agendamento_status_pagamento"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ResumoDiario",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("data", models.DateField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("confirmado", "Pendente"),
+                            ("a_caminho", "À caminho"),
+                            ("concluido", "Concluído"),
+                            ("cancelado", "Cancelado"),
+                        ],
+                        max_length=15,
+                    ),
+                ),
+                (
+                    "status_pagamento",
+                    models.CharField(
+                        choices=[("pendente", "Pendente"), ("pago", "Pago")],
+                        max_length=10,
+                    ),
+                ),
+                ("quantidade", models.IntegerField(default=0)),
+                (
+                    "valor_total",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "servico",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="resumos_diarios",
+                        to="agendamentos.servico",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["data"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("data", "status", "status_pagamento", "servico"),
+                        name="resumo_diario_unico",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(popular_resumo_diario, migrations.RunPython.noop),
+    ]
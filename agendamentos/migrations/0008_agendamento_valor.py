@@ -0,0 +1,60 @@
+from django.db import migrations, models, transaction
+from django.db.models import OuterRef, Subquery
+
+TAMANHO_LOTE = 5000
+
+
+def preencher_valor(apps, schema_editor):
+    """Copia o preço atual do serviço para os agendamentos existentes em lotes"""
+    Agendamento = apps.get_model("agendamentos", "Agendamento")
+    Servico = apps.get_model("agendamentos", "Servico")
+
+    preco_servico = Subquery(
+        Servico.objects.filter(pk=OuterRef("servico_id")).values("preco")[:1]
+    )
+
+    ids = Agendamento.objects.filter(valor__isnull=True).order_by("pk")
+    ultimo_id = 0
+    while True:
+        lote = list(
+            ids.filter(pk__gt=ultimo_id).values_list("pk", flat=True)[:TAMANHO_LOTE]
+        )
+        if not lote:
+            break
+        with transaction.atomic():
+            Agendamento.objects.filter(
+                pk__gte=lote[0], pk__lte=lote[-1], valor__isnull=True
+            ).update(valor=preco_servico)
+        ultimo_id = lote[-1]
+
+
+class Migration(migrations.Migration):
+    # Cada lote do preenchimento é confirmado separadamente
+    atomic = False
+
+    dependencies = [
+        ("agendamentos", "0007_resumodiario"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agendamento",
+            name="valor",
+            field=models.DecimalField(
+                decimal_places=2,
+                help_text="Preço do serviço no momento do agendamento",
+                max_digits=6,
+                null=True,
+            ),
+        ),
+        migrations.RunPython(preencher_valor, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="agendamento",
+            name="valor",
+            field=models.DecimalField(
+                decimal_places=2,
+                help_text="Preço do serviço no momento do agendamento",
+                max_digits=6,
+            ),
+        ),
+    ]
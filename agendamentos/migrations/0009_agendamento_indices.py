@@ -0,0 +1,62 @@
+from django.db import migrations, models
+
+
+class AddIndexConcorrente(migrations.AddIndex):
+    """
+    AddIndex que usa CREATE INDEX CONCURRENTLY no PostgreSQL
+
+    Equivale a ``django.contrib.postgres.operations.AddIndexConcurrently``,
+    mas também roda no SQLite usado em desenvolvimento e nos testes.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if schema_editor.connection.vendor == "postgresql":
+            schema_editor.add_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if schema_editor.connection.vendor == "postgresql":
+            schema_editor.remove_index(model, self.index, concurrently=True)
+        else:
+            schema_editor.remove_index(model, self.index)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    atomic = False
+
+    dependencies = [
+        ("agendamentos", "0008_agendamento_valor"),
+    ]
+
+    operations = [
+        AddIndexConcorrente(
+            model_name="agendamento",
+            index=models.Index(
+                fields=["data", "hora"], name="agendamento_data_hora_idx"
+            ),
+        ),
+        AddIndexConcorrente(
+            model_name="agendamento",
+            index=models.Index(
+                fields=["status_pagamento", "data", "hora"],
+                include=["valor"],
+                name="agendamento_pagamento_idx",
+            ),
+        ),
+        AddIndexConcorrente(
+            model_name="agendamento",
+            index=models.Index(
+                condition=models.Q(status_pagamento="pendente"),
+                fields=["data", "hora"],
+                name="agendamento_pendente_idx",
+            ),
+        ),
+    ]
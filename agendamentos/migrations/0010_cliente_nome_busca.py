@@ -0,0 +1,57 @@
+import unicodedata
+
+from django.db import migrations, models, transaction
+
+TAMANHO_LOTE = 2000
+
+
+def _normalizar(texto):
+    # Cópia de models.normalizar_nome: migrações não devem importar o modelo
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.lower().split())
+
+
+def preencher_nome_busca(apps, schema_editor):
+    """Normaliza o nome dos clientes existentes em lotes"""
+    Cliente = apps.get_model("agendamentos", "Cliente")
+
+    ultimo_id = 0
+    while True:
+        lote = list(
+            Cliente.objects.filter(pk__gt=ultimo_id)
+            .order_by("pk")
+            .only("pk", "nome")[:TAMANHO_LOTE]
+        )
+        if not lote:
+            break
+        for cliente in lote:
+            cliente.nome_busca = _normalizar(cliente.nome)
+        with transaction.atomic():
+            Cliente.objects.bulk_update(lote, ["nome_busca"])
+        ultimo_id = lote[-1].pk
+
+
+class Migration(migrations.Migration):
+    # Cada lote do preenchimento é confirmado separadamente
+    atomic = False
+
+    dependencies = [
+        ("agendamentos", "0009_agendamento_indices"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cliente",
+            name="nome_busca",
+            field=models.CharField(
+                db_index=True,
+                default="",
+                editable=False,
+                help_text="Nome sem acentos e em minúsculas, usado na busca",
+                max_length=100,
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(preencher_nome_busca, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:26
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("agendamentos", "0010_cliente_nome_busca"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MensagemSMS",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "tipo",
+                    models.CharField(
+                        choices=[("a_caminho", "Barbeiro a caminho")], max_length=15
+                    ),
+                ),
+                ("telefone", models.CharField(max_length=20)),
+                ("mensagem", models.TextField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pendente", "Pendente"),
+                            ("enviado", "Enviado"),
+                            ("falhou", "Falhou"),
+                        ],
+                        default="pendente",
+                        max_length=10,
+                    ),
+                ),
+                ("tentativas", models.IntegerField(default=0)),
+                (
+                    "proxima_tentativa",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("erro", models.TextField(blank=True, default="")),
+                ("id_externo", models.CharField(blank=True, default="", max_length=50)),
+                ("criado_em", models.DateTimeField(auto_now_add=True)),
+                ("enviado_em", models.DateTimeField(blank=True, null=True)),
+                (
+                    "agendamento",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="mensagens_sms",
+                        to="agendamentos.agendamento",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "mensagem SMS",
+                "verbose_name_plural": "mensagens SMS",
+                "ordering": ["-criado_em"],
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "pendente")),
+                        fields=["proxima_tentativa"],
+                        name="mensagem_sms_pendente_idx",
+                    )
+                ],
+            },
+        ),
+    ]
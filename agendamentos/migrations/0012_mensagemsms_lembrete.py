@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-17 02:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("agendamentos", "0011_mensagemsms"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="mensagemsms",
+            name="tipo",
+            field=models.CharField(
+                choices=[
+                    ("a_caminho", "Barbeiro a caminho"),
+                    ("lembrete", "Lembrete do dia seguinte"),
+                ],
+                max_length=15,
+            ),
+        ),
+    ]
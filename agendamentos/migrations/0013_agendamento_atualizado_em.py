@@ -0,0 +1,21 @@
+# Generated by Django 5.2.7 on 2026-10-17 03:40
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("agendamentos", "0012_mensagemsms_lembrete"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agendamento",
+            name="atualizado_em",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+    ]
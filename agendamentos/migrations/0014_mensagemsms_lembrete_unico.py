@@ -0,0 +1,22 @@
+# Generated by Django 5.2.7 on 2026-10-17 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("agendamentos", "0013_agendamento_atualizado_em"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="mensagemsms",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("status__in", ["pendente", "enviado"]), ("tipo", "lembrete")
+                ),
+                fields=("agendamento", "tipo"),
+                name="mensagem_sms_lembrete_unico",
+            ),
+        ),
+    ]
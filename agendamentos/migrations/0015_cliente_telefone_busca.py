@@ -0,0 +1,58 @@
+from django.db import migrations, models, transaction
+
+TAMANHO_LOTE = 2000
+
+
+def _normalizar(texto):
+    # Cópia de models.normalizar_telefone: migrações não devem importar o modelo
+    texto = (texto or "").strip()
+    digitos = "".join(c for c in texto if c.isdigit())
+    if digitos.startswith("55") and (texto.startswith("+") or len(digitos) > 11):
+        digitos = digitos[2:]
+    return digitos.lstrip("0")
+
+
+def preencher_telefone_busca(apps, schema_editor):
+    """Normaliza o telefone dos clientes existentes em lotes"""
+    Cliente = apps.get_model("agendamentos", "Cliente")
+
+    ultimo_id = 0
+    while True:
+        lote = list(
+            Cliente.objects.filter(pk__gt=ultimo_id)
+            .order_by("pk")
+            .only("pk", "telefone")[:TAMANHO_LOTE]
+        )
+        if not lote:
+            break
+        for cliente in lote:
+            cliente.telefone_busca = _normalizar(cliente.telefone)
+        with transaction.atomic():
+            Cliente.objects.bulk_update(lote, ["telefone_busca"])
+        ultimo_id = lote[-1].pk
+
+
+class Migration(migrations.Migration):
+    # Cada lote do preenchimento é confirmado separadamente
+    atomic = False
+
+    dependencies = [
+        ("agendamentos", "0014_mensagemsms_lembrete_unico"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="cliente",
+            name="telefone_busca",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                default="",
+                editable=False,
+                help_text="Só os dígitos do telefone, sem +55, usado na busca",
+                max_length=15,
+            ),
+            preserve_default=False,
+        ),
+        migrations.RunPython(preencher_telefone_busca, migrations.RunPython.noop),
+    ]
@@ -1,17 +1,76 @@
-from django.db import models
+import unicodedata
+
+from django.db import models, transaction
+from django.utils import timezone
+
+from . import cache_consultas
+
+
+def normalizar_nome(texto):
+    """Remove acentos, caixa e espaços repetidos para busca por prefixo"""
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    sem_acentos = "".join(c for c in decomposto if not unicodedata.combining(c))
+    return " ".join(sem_acentos.lower().split())
+
+
+def normalizar_telefone(texto):
+    """Só os dígitos do telefone, sem o código do país (+55) e o zero do DDD"""
+    texto = (texto or "").strip()
+    digitos = "".join(c for c in texto if c.isdigit())
+    if digitos.startswith("55") and (texto.startswith("+") or len(digitos) > 11):
+        digitos = digitos[2:]
+    return digitos.lstrip("0")
+
+
+class ClienteQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Preenche ``nome_busca`` e ``telefone_busca`` antes de inserir"""
+        objs = list(objs)
+        for obj in objs:
+            obj.nome_busca = normalizar_nome(obj.nome)
+            obj.telefone_busca = normalizar_telefone(obj.telefone)
+        return super().bulk_create(objs, *args, **kwargs)
 
 
 class Cliente(models.Model):
     nome = models.CharField(max_length=100)
+    nome_busca = models.CharField(
+        max_length=100,
+        editable=False,
+        db_index=True,
+        help_text="Nome sem acentos e em minúsculas, usado na busca",
+    )
     telefone = models.CharField(max_length=15, unique=True, blank=True, null=True)
+    telefone_busca = models.CharField(
+        max_length=15,
+        blank=True,
+        editable=False,
+        db_index=True,
+        help_text="Só os dígitos do telefone, sem +55, usado na busca",
+    )
     endereco = models.TextField(
         blank=True, null=True, help_text="Endereço completo do cliente"
     )
     observacoes = models.TextField(blank=True, null=True)
 
+    objects = ClienteQuerySet.as_manager()
+
     def __str__(self):
         return self.nome
 
+    def save(self, *args, **kwargs):
+        self.nome_busca = normalizar_nome(self.nome)
+        self.telefone_busca = normalizar_telefone(self.telefone)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            if "nome" in update_fields:
+                update_fields.add("nome_busca")
+            if "telefone" in update_fields:
+                update_fields.add("telefone_busca")
+            kwargs["update_fields"] = update_fields
+        super().save(*args, **kwargs)
+
 
 class Servico(models.Model):
     nome = models.CharField(max_length=100)
@@ -24,6 +83,38 @@ class Servico(models.Model):
         return self.nome
 
 
+class AgendamentoQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, atualizar_resumo=True, **kwargs):
+        """
+        Preenche ``valor`` com o preço atual do serviço antes de inserir
+
+        ``bulk_create`` não envia sinais, então o resumo diário das datas
+        inseridas é reconstruído aqui, na mesma transação, e o cache das
+        páginas é invalidado por inteiro. Cargas em vários lotes podem passar
+        ``atualizar_resumo=False`` e reconstruir o período uma vez no fim.
+        """
+        from .relatorios import reconstruir_resumo
+
+        objs = list(objs)
+        sem_valor = [obj for obj in objs if obj.valor is None]
+        if sem_valor:
+            precos = dict(
+                Servico.objects.filter(
+                    pk__in={obj.servico_id for obj in sem_valor}
+                ).values_list("pk", "preco")
+            )
+            for obj in sem_valor:
+                obj.valor = precos.get(obj.servico_id)
+        with transaction.atomic(savepoint=False):
+            criados = super().bulk_create(objs, *args, **kwargs)
+            if atualizar_resumo and objs:
+                # Também invalida o cache
+                reconstruir_resumo(data__in={obj.data for obj in objs})
+            else:
+                cache_consultas.invalidar(cache_consultas.GERAL)
+        return criados
+
+
 class Agendamento(models.Model):
     STATUS_CHOICES = [
         ("confirmado", "Pendente"),
@@ -57,10 +148,154 @@ class Agendamento(models.Model):
     previsao_chegada = models.IntegerField(
         blank=True, null=True, help_text="Previsão de chegada em minutos"
     )
+    valor = models.DecimalField(
+        max_digits=6,
+        decimal_places=2,
+        help_text="Preço do serviço no momento do agendamento",
+    )
     criado_em = models.DateTimeField(auto_now_add=True)
+    atualizado_em = models.DateTimeField(auto_now=True)
+
+    objects = AgendamentoQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.cliente.nome if self.cliente else 'Cliente avulso'} - {self.servico.nome} em {self.data}"
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Serviço com que o agendamento foi criado ou lido (None se adiado)
+        self._servico_original = self.__dict__.get("servico_id")
+
+    def save(self, *args, **kwargs):
+        # Congelar o preço do serviço para que relatórios antigos não mudem;
+        # trocar o serviço (admin, shell, formulário) registra o preço do novo
+        servico_id = self.__dict__.get("servico_id")
+        if servico_id and (self.valor is None or servico_id != self._servico_original):
+            self.valor = self.servico.preco
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "valor"}
+        super().save(*args, **kwargs)
+        self._servico_original = self.__dict__.get("servico_id")
+
     class Meta:
         ordering = ["-data", "-hora"]
+        # Criados de forma concorrente no PostgreSQL (ver migração 0009)
+        indexes = [
+            # Agenda do dia e do mês: filtro por data, ordenação por hora
+            models.Index(fields=["data", "hora"], name="agendamento_data_hora_idx"),
+            # Listas do financeiro; no PostgreSQL o valor fica no próprio índice
+            models.Index(
+                fields=["status_pagamento", "data", "hora"],
+                include=["valor"],
+                name="agendamento_pagamento_idx",
+            ),
+            # Cobranças em aberto são uma fração pequena da tabela
+            models.Index(
+                fields=["data", "hora"],
+                condition=models.Q(status_pagamento="pendente"),
+                name="agendamento_pendente_idx",
+            ),
+        ]
+
+
+class ResumoDiario(models.Model):
+    """
+    Totais diários pré-calculados dos agendamentos.
+
+    Cada linha guarda a quantidade e o valor somado dos agendamentos de um
+    dia para uma combinação de status, status de pagamento e serviço. É
+    mantida incrementalmente pelos sinais de Agendamento (ver signals.py) e
+    pode ser reconstruída com ``manage.py reconstruir_resumo_diario``.
+    """
+
+    data = models.DateField()
+    status = models.CharField(max_length=15, choices=Agendamento.STATUS_CHOICES)
+    status_pagamento = models.CharField(
+        max_length=10, choices=Agendamento.PAGAMENTO_CHOICES
+    )
+    servico = models.ForeignKey(
+        Servico, on_delete=models.CASCADE, related_name="resumos_diarios"
+    )
+    quantidade = models.IntegerField(default=0)
+    valor_total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    def __str__(self):
+        return (
+            f"{self.data} - {self.servico_id} ({self.status}/{self.status_pagamento})"
+        )
+
+    class Meta:
+        ordering = ["data"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["data", "status", "status_pagamento", "servico"],
+                name="resumo_diario_unico",
+            )
+        ]
+
+
+class MensagemSMS(models.Model):
+    """
+    Fila de saída de SMS.
+
+    As views apenas gravam a mensagem (após o commit da transação) e o
+    comando ``manage.py processar_fila_sms`` faz o envio, com novas
+    tentativas e intervalo crescente em caso de falha. Os lembretes do dia
+    seguinte (``manage.py enviar_lembretes``) também ficam registrados aqui,
+    o que evita reenviá-los.
+    """
+
+    STATUS_CHOICES = [
+        ("pendente", "Pendente"),
+        ("enviado", "Enviado"),
+        ("falhou", "Falhou"),
+    ]
+
+    TIPO_CHOICES = [
+        ("a_caminho", "Barbeiro a caminho"),
+        ("lembrete", "Lembrete do dia seguinte"),
+    ]
+
+    agendamento = models.ForeignKey(
+        Agendamento,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="mensagens_sms",
+    )
+    tipo = models.CharField(max_length=15, choices=TIPO_CHOICES)
+    telefone = models.CharField(max_length=20)
+    mensagem = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pendente")
+    tentativas = models.IntegerField(default=0)
+    proxima_tentativa = models.DateTimeField(default=timezone.now)
+    erro = models.TextField(blank=True, default="")
+    id_externo = models.CharField(max_length=50, blank=True, default="")
+    criado_em = models.DateTimeField(auto_now_add=True)
+    enviado_em = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} para {self.telefone} ({self.status})"
+
+    class Meta:
+        ordering = ["-criado_em"]
+        verbose_name = "mensagem SMS"
+        verbose_name_plural = "mensagens SMS"
+        indexes = [
+            # Busca do worker: pendentes cujo horário de tentativa já chegou
+            models.Index(
+                fields=["proxima_tentativa"],
+                condition=models.Q(status="pendente"),
+                name="mensagem_sms_pendente_idx",
+            ),
+        ]
+        constraints = [
+            # No máximo um lembrete na fila ou enviado por agendamento, mesmo
+            # com duas execuções de enviar_lembretes ao mesmo tempo
+            models.UniqueConstraint(
+                fields=["agendamento", "tipo"],
+                condition=models.Q(tipo="lembrete", status__in=["pendente", "enviado"]),
+                name="mensagem_sms_lembrete_unico",
+            ),
+        ]
@@ -0,0 +1,252 @@
+"""
+Agregações financeiras e manutenção do resumo diário.
+
+Os totais por período (dia, mês e ano) são lidos da tabela ``ResumoDiario``,
+que tem no máximo algumas linhas por dia, com agregações condicionais
+(``SUM(...) FILTER (WHERE ...)``) resolvidas em uma única query. O resumo é
+mantido incrementalmente pelos sinais de ``Agendamento`` e pode ser
+reconstruído a partir dos agendamentos com ``reconstruir_resumo``.
+"""
+
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, IntegerField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from . import cache_consultas
+from .models import Agendamento, ResumoDiario
+
+ZERO = Decimal("0.00")
+
+PERIODOS = ("dia", "mes", "ano")
+
+STATUS_PENDENTES = ("confirmado", "a_caminho")
+
+CAMPOS_RESUMO = ("data", "status", "status_pagamento", "servico_id")
+
+
+def intervalo_dia(data_referencia):
+    """Retorna o intervalo [inicio, fim) do dia de ``data_referencia``"""
+    return data_referencia, date.fromordinal(data_referencia.toordinal() + 1)
+
+
+def intervalo_mes(data_referencia):
+    """Retorna o intervalo [inicio, fim) do mês de ``data_referencia``"""
+    inicio = data_referencia.replace(day=1)
+    if inicio.month == 12:
+        fim = date(inicio.year + 1, 1, 1)
+    else:
+        fim = date(inicio.year, inicio.month + 1, 1)
+    return inicio, fim
+
+
+def intervalo_ano(data_referencia):
+    """Retorna o intervalo [inicio, fim) do ano de ``data_referencia``"""
+    return date(data_referencia.year, 1, 1), date(data_referencia.year + 1, 1, 1)
+
+
+# ===== LEITURA =====
+
+
+def _soma_quantidade(filtro):
+    return Coalesce(
+        Sum("quantidade", filter=filtro), Value(0), output_field=IntegerField()
+    )
+
+
+def _soma_valor(filtro):
+    return Coalesce(
+        Sum("valor_total", filter=filtro),
+        Value(ZERO),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+
+
+def _agregacoes(prefixo, filtro):
+    """Monta as agregações condicionais de um período"""
+    pago = filtro & Q(status_pagamento="pago")
+    pendente = filtro & Q(status_pagamento="pendente")
+    return {
+        f"{prefixo}__quantidade": _soma_quantidade(filtro),
+        f"{prefixo}__pagos": _soma_quantidade(pago),
+        f"{prefixo}__pendentes": _soma_quantidade(pendente),
+        f"{prefixo}__valor_total": _soma_valor(filtro),
+        f"{prefixo}__valor_pago": _soma_valor(pago),
+        f"{prefixo}__valor_pendente": _soma_valor(pendente),
+    }
+
+
+def _separar_periodos(resultado, periodos):
+    totais = {periodo: {} for periodo in periodos}
+    for chave, valor in resultado.items():
+        periodo, campo = chave.split("__", 1)
+        totais[periodo][campo] = valor
+    return totais
+
+
+def resumo_periodo(inicio, fim):
+    """
+    Calcula totais e contagens de um intervalo [inicio, fim) em uma query
+
+    Args:
+        inicio (date): Primeiro dia do período
+        fim (date): Dia seguinte ao último dia do período
+
+    Returns:
+        dict: {'quantidade', 'pagos', 'pendentes', 'valor_total',
+               'valor_pago', 'valor_pendente'}
+    """
+    resultado = ResumoDiario.objects.filter(data__gte=inicio, data__lt=fim).aggregate(
+        **_agregacoes("periodo", Q())
+    )
+    return _separar_periodos(resultado, ["periodo"])["periodo"]
+
+
+def resumo_financeiro(data_referencia):
+    """
+    Calcula os totais do dia, do mês e do ano de ``data_referencia``
+
+    Uma única query varre o resumo diário do ano inteiro (no máximo 366 dias)
+    e separa dia e mês com agregações condicionais.
+
+    Returns:
+        dict: {'dia': {...}, 'mes': {...}, 'ano': {...}} no mesmo formato de
+              ``resumo_periodo``
+    """
+    inicio_dia, fim_dia = intervalo_dia(data_referencia)
+    inicio_mes, fim_mes = intervalo_mes(data_referencia)
+    inicio_ano, fim_ano = intervalo_ano(data_referencia)
+
+    filtros = {
+        "dia": Q(data__gte=inicio_dia, data__lt=fim_dia),
+        "mes": Q(data__gte=inicio_mes, data__lt=fim_mes),
+        "ano": Q(),
+    }
+
+    agregacoes = {}
+    for periodo in PERIODOS:
+        agregacoes.update(_agregacoes(periodo, filtros[periodo]))
+
+    resultado = ResumoDiario.objects.filter(
+        data__gte=inicio_ano, data__lt=fim_ano
+    ).aggregate(**agregacoes)
+    return _separar_periodos(resultado, PERIODOS)
+
+
+def resumo_status(inicio, fim):
+    """
+    Conta os agendamentos de [inicio, fim) por status em uma query
+
+    Returns:
+        dict: {'total', 'concluidos', 'pendentes'}
+    """
+    return ResumoDiario.objects.filter(data__gte=inicio, data__lt=fim).aggregate(
+        total=_soma_quantidade(Q()),
+        concluidos=_soma_quantidade(Q(status="concluido")),
+        pendentes=_soma_quantidade(Q(status__in=STATUS_PENDENTES)),
+    )
+
+
+def contagens_por_dia(inicio, fim):
+    """
+    Conta os agendamentos de cada dia de [inicio, fim) por status em uma query
+
+    Returns:
+        dict: {date: {'total', 'concluidos', 'pendentes', 'cancelados'}},
+              só com os dias que têm agendamentos
+    """
+    linhas = (
+        ResumoDiario.objects.filter(data__gte=inicio, data__lt=fim)
+        .values("data")
+        .annotate(
+            total=_soma_quantidade(Q()),
+            concluidos=_soma_quantidade(Q(status="concluido")),
+            pendentes=_soma_quantidade(Q(status__in=STATUS_PENDENTES)),
+            cancelados=_soma_quantidade(Q(status="cancelado")),
+        )
+        .order_by("data")
+    )
+    return {linha.pop("data"): linha for linha in linhas if linha["total"]}
+
+
+def taxa_recebimento(totais):
+    """Percentual recebido em relação ao total do período"""
+    if totais["valor_total"] > 0:
+        return totais["valor_pago"] / totais["valor_total"] * 100
+    return 0
+
+
+# ===== MANUTENÇÃO DO RESUMO DIÁRIO =====
+
+
+def ajustar_resumo(chave, quantidade, valor):
+    """
+    Soma ``quantidade`` e ``valor`` na linha do resumo identificada por ``chave``
+
+    Args:
+        chave (dict): data, status, status_pagamento e servico_id
+        quantidade (int): +1 ao incluir um agendamento, -1 ao remover
+        valor (Decimal): Valor do agendamento com o mesmo sinal de quantidade
+    """
+    atualizadas = ResumoDiario.objects.filter(**chave).update(
+        quantidade=F("quantidade") + quantidade,
+        valor_total=F("valor_total") + valor,
+    )
+    if atualizadas or quantidade < 0:
+        return
+
+    try:
+        with transaction.atomic():
+            ResumoDiario.objects.create(
+                quantidade=quantidade, valor_total=valor, **chave
+            )
+    except IntegrityError:
+        # Outra requisição criou a linha ao mesmo tempo
+        ResumoDiario.objects.filter(**chave).update(
+            quantidade=F("quantidade") + quantidade,
+            valor_total=F("valor_total") + valor,
+        )
+
+
+def reconstruir_resumo(**filtros):
+    """
+    Recalcula o resumo diário a partir dos agendamentos
+
+    Os filtros (ex.: ``data__in=[...]``, ``servico_id=1``) limitam a
+    reconstrução; sem filtros a tabela inteira é refeita.
+
+    Returns:
+        int: Quantidade de linhas de resumo gravadas
+    """
+    linhas = (
+        Agendamento.objects.filter(**filtros)
+        .order_by()
+        .values(*CAMPOS_RESUMO)
+        .annotate(
+            total_quantidade=Count("id"),
+            total_valor=Coalesce(
+                Sum("valor"),
+                Value(ZERO),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ),
+        )
+    )
+
+    # Sem savepoint quando já está dentro da transação de quem chama
+    with transaction.atomic(savepoint=False):
+        ResumoDiario.objects.filter(**filtros).delete()
+        resumos = ResumoDiario.objects.bulk_create(
+            (
+                ResumoDiario(
+                    quantidade=linha.pop("total_quantidade"),
+                    valor_total=linha.pop("total_valor"),
+                    **linha,
+                )
+                for linha in linhas.iterator()
+            ),
+            batch_size=1000,
+        )
+    cache_consultas.invalidar(cache_consultas.GERAL)
+    return len(resumos)
@@ -0,0 +1,106 @@
+"""
+Sinais que mantêm o resumo diário (ResumoDiario) e o cache das páginas
+sincronizados.
+
+Cada criação, edição ou exclusão de Agendamento desfaz a contribuição antiga
+na linha de resumo correspondente e aplica a nova. Como o valor de cada
+agendamento é congelado em ``Agendamento.valor``, mudanças de preço em
+Servico não alteram o histórico.
+
+O cache (ver ``cache_consultas``) é invalidado pela data antiga e pela nova
+de cada agendamento alterado, pela data do agendamento de cada SMS gravado
+e, por inteiro, por qualquer alteração em Cliente ou Servico.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import cache_consultas
+from .models import Agendamento, Cliente, MensagemSMS, Servico
+from .relatorios import CAMPOS_RESUMO, ajustar_resumo
+
+
+def _chave(agendamento):
+    return {campo: getattr(agendamento, campo) for campo in CAMPOS_RESUMO}
+
+
+@receiver(pre_save, sender=Agendamento)
+def guardar_estado_anterior(sender, instance, raw=False, **kwargs):
+    """Guarda a chave de resumo e o valor que o agendamento tinha antes"""
+    instance._resumo_anterior = None
+    if raw or instance.pk is None:
+        return
+
+    instance._resumo_anterior = (
+        Agendamento.objects.filter(pk=instance.pk)
+        .values(*CAMPOS_RESUMO, "valor")
+        .first()
+    )
+
+
+@receiver(post_save, sender=Agendamento)
+def atualizar_resumo_ao_salvar(sender, instance, created, raw=False, **kwargs):
+    """Move a contribuição do agendamento para a linha de resumo atual"""
+    if raw:
+        return
+
+    anterior = getattr(instance, "_resumo_anterior", None)
+    atual = _chave(instance)
+    if anterior is not None:
+        valor_anterior = anterior.pop("valor")
+        if anterior == atual and valor_anterior == instance.valor:
+            return
+
+    with transaction.atomic():
+        if anterior is not None:
+            ajustar_resumo(anterior, -1, -valor_anterior)
+        ajustar_resumo(atual, 1, instance.valor)
+
+
+@receiver(post_delete, sender=Agendamento)
+def atualizar_resumo_ao_excluir(sender, instance, **kwargs):
+    """Remove a contribuição do agendamento excluído"""
+    ajustar_resumo(_chave(instance), -1, -instance.valor)
+
+
+@receiver(post_save, sender=Agendamento)
+def invalidar_cache_ao_salvar(sender, instance, **kwargs):
+    """Invalida a data do agendamento e, se ele mudou de dia, a anterior"""
+    datas = [instance.data]
+    anterior = getattr(instance, "_resumo_anterior", None)
+    if anterior is not None:
+        datas.append(anterior["data"])
+    cache_consultas.invalidar_datas(*datas)
+
+
+@receiver(post_delete, sender=Agendamento)
+def invalidar_cache_ao_excluir(sender, instance, **kwargs):
+    cache_consultas.invalidar_datas(instance.data)
+
+
+@receiver(post_save, sender=MensagemSMS)
+def invalidar_cache_sms(sender, instance, **kwargs):
+    """O painel mostra o status do último SMS de cada agendamento"""
+    if instance.agendamento_id is None:
+        return
+
+    if MensagemSMS.agendamento.is_cached(instance):
+        data = instance.agendamento.data
+    else:
+        data = (
+            Agendamento.objects.filter(pk=instance.agendamento_id)
+            .values_list("data", flat=True)
+            .first()
+        )
+    if data is not None:
+        cache_consultas.invalidar(cache_consultas.escopo_dia(data))
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+@receiver(post_save, sender=Servico)
+@receiver(post_delete, sender=Servico)
+def invalidar_cache_cadastros(sender, **kwargs):
+    """Nomes, telefones e endereços aparecem em todas as páginas"""
+    cache_consultas.invalidar(cache_consultas.GERAL)
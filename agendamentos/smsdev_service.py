@@ -1,12 +1,43 @@
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from django.conf import settings
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from . import metricas
 
 logger = logging.getLogger(__name__)
 
 
+class LimitadorTaxa:
+    """
+    Espaça chamadas para no máximo ``por_segundo`` por segundo
+
+    Compartilhado entre threads: cada chamada reserva o próximo horário livre
+    e dorme até ele. Com ``por_segundo`` 0 ou None não limita nada.
+    """
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo if por_segundo else 0
+        self._proximo = 0.0
+        self._lock = threading.Lock()
+
+    def aguardar(self):
+        if not self.intervalo:
+            return
+        with self._lock:
+            agora = time.monotonic()
+            horario = max(agora, self._proximo)
+            self._proximo = horario + self.intervalo
+        if horario > agora:
+            time.sleep(horario - agora)
+
+
 class SMSDevService:
     """Serviço para envio de SMS usando SMSDev (Brasileira)"""
 
@@ -16,9 +47,70 @@ class SMSDevService:
         self.token = getattr(settings, "SMSDEV_TOKEN", None)
         self.api_url = "https://api.smsdev.com.br/v1/send"
 
+        # Conexões keep-alive: evita DNS + TCP + TLS a cada mensagem
+        self.pool_tamanho = getattr(settings, "SMSDEV_POOL_TAMANHO", 10)
+        self.tentativas = getattr(settings, "SMSDEV_TENTATIVAS", 2)
+        self.timeout = (
+            getattr(settings, "SMSDEV_TIMEOUT_CONEXAO", 3.05),
+            getattr(settings, "SMSDEV_TIMEOUT_LEITURA", 10),
+        )
+        self.max_simultaneos = getattr(settings, "SMSDEV_MAX_SIMULTANEOS", 5)
+        self.limitador = LimitadorTaxa(
+            getattr(settings, "SMSDEV_MENSAGENS_POR_SEGUNDO", 0)
+        )
+        self._adapter = None
+        self._adapter_lock = threading.Lock()
+        self._local = threading.local()
+
         if not all([self.usuario, self.token]):
             logger.warning("SMSDev: Credenciais não configuradas")
 
+    def _criar_adapter(self):
+        """
+        Adapter HTTP com pool de conexões e política de novas tentativas
+
+        Só repete o POST quando a requisição com certeza não foi processada,
+        ou seja, quando a conexão nem chegou a ser aberta. Timeout de
+        leitura, conexão caída no meio e respostas de erro do gateway
+        (502/504) não são repetidos: a SMSDev pode já ter aceitado a
+        mensagem, e repetir mandaria o mesmo SMS duas vezes.
+        """
+        retry = Retry(
+            total=self.tentativas,
+            connect=self.tentativas,
+            read=0,
+            status=0,
+            other=0,
+            allowed_methods=frozenset({"POST"}),
+            backoff_factor=0.5,
+            raise_on_status=False,
+        )
+        return HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=self.pool_tamanho,
+            max_retries=retry,
+        )
+
+    @property
+    def session(self):
+        """
+        Sessão HTTP da thread atual
+
+        O pool de conexões (urllib3) é único e thread-safe; cada thread usa
+        sua própria ``requests.Session`` sobre ele, já que a Session em si
+        não garante segurança entre threads.
+        """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            with self._adapter_lock:
+                if self._adapter is None:
+                    self._adapter = self._criar_adapter()
+            session = requests.Session()
+            session.mount("https://", self._adapter)
+            session.mount("http://", self._adapter)
+            self._local.session = session
+        return session
+
     def enviar_sms(self, telefone, mensagem):
         """
         Envia SMS para um número de telefone
@@ -28,11 +120,18 @@ class SMSDevService:
             mensagem (str): Texto da mensagem
 
         Returns:
-            dict: {'sucesso': bool, 'erro': str, 'id': str}
+            dict: {'sucesso': bool, 'erro': str, 'id': str}; as falhas que
+                  nenhuma nova tentativa resolve (SMS desabilitado, sem
+                  credenciais ou telefone inválido) vêm com 'permanente': True
         """
         if not self.enabled:
             logger.info(f"SMS desabilitado - Mensagem que seria enviada: {mensagem}")
-            return {"sucesso": False, "erro": "SMS desabilitado", "id": None}
+            return {
+                "sucesso": False,
+                "erro": "SMS desabilitado",
+                "id": None,
+                "permanente": True,
+            }
 
         if not all([self.usuario, self.token]):
             logger.error("SMSDev: Credenciais não configuradas")
@@ -40,13 +139,28 @@ class SMSDevService:
                 "sucesso": False,
                 "erro": "Credenciais SMSDev não configuradas",
                 "id": None,
+                "permanente": True,
             }
 
         # Validar telefone
         telefone_limpo = self._limpar_telefone(telefone)
         if not telefone_limpo:
-            return {"sucesso": False, "erro": "Número de telefone inválido", "id": None}
+            return {
+                "sucesso": False,
+                "erro": "Número de telefone inválido",
+                "id": None,
+                "permanente": True,
+            }
 
+        # Respeitar o limite de taxa do provedor (a espera não conta na latência)
+        self.limitador.aguardar()
+        inicio = time.perf_counter()
+        resultado = self._postar(telefone_limpo, mensagem)
+        metricas.registrar_sms(resultado["sucesso"], time.perf_counter() - inicio)
+        return resultado
+
+    def _postar(self, telefone_limpo, mensagem):
+        """Faz a requisição à SMSDev e interpreta a resposta"""
         try:
             # Dados para envio
             dados = {
@@ -56,8 +170,7 @@ class SMSDevService:
                 "msg": mensagem,
             }
 
-            # Enviar SMS
-            response = requests.post(self.api_url, data=dados, timeout=30)
+            response = self.session.post(self.api_url, data=dados, timeout=self.timeout)
 
             if response.status_code == 200:
                 resultado = response.json()
@@ -94,6 +207,36 @@ class SMSDevService:
             logger.error(f"SMSDev: Erro inesperado - {e}")
             return {"sucesso": False, "erro": str(e), "id": None}
 
+    def enviar_lote(self, mensagens, max_simultaneos=None):
+        """
+        Envia várias mensagens em paralelo
+
+        No máximo ``max_simultaneos`` requisições ficam em andamento ao mesmo
+        tempo, e o limite de taxa do provedor (SMSDEV_MENSAGENS_POR_SEGUNDO)
+        vale para o lote inteiro.
+
+        Args:
+            mensagens (list): Pares (telefone, mensagem)
+            max_simultaneos (int): Envios simultâneos (padrão:
+                SMSDEV_MAX_SIMULTANEOS)
+
+        Returns:
+            list: Um dict por mensagem, na mesma ordem e no mesmo formato de
+                  ``enviar_sms``
+        """
+        mensagens = list(mensagens)
+        if not mensagens:
+            return []
+
+        max_simultaneos = max_simultaneos or self.max_simultaneos
+        with ThreadPoolExecutor(
+            max_workers=min(max_simultaneos, len(mensagens)),
+            thread_name_prefix="smsdev",
+        ) as executor:
+            return list(
+                executor.map(lambda item: self.enviar_sms(item[0], item[1]), mensagens)
+            )
+
     def _limpar_telefone(self, telefone):
         """
         Limpa e formata o número de telefone para SMSDev
@@ -143,13 +286,13 @@ class SMSDevService:
             previsao_minutos = agendamento.previsao_chegada
 
         # Montar mensagem personalizada
-        mensagem = self._montar_mensagem_barbeiro_a_caminho(
+        mensagem = self.montar_mensagem_barbeiro_a_caminho(
             agendamento, previsao_minutos
         )
 
         return self.enviar_sms(agendamento.cliente.telefone, mensagem)
 
-    def _montar_mensagem_barbeiro_a_caminho(self, agendamento, previsao_minutos):
+    def montar_mensagem_barbeiro_a_caminho(self, agendamento, previsao_minutos):
         """
         Monta a mensagem de "barbeiro a caminho"
 
@@ -170,6 +313,22 @@ class SMSDevService:
 
         return mensagem
 
+    def montar_mensagem_lembrete(self, agendamento):
+        """
+        Monta o lembrete do agendamento do dia seguinte
+
+        Args:
+            agendamento: Objeto Agendamento
+
+        Returns:
+            str: Mensagem formatada
+        """
+        nome_cliente = agendamento.cliente.nome.split()[0]  # Primeiro nome
+        data = agendamento.data.strftime("%d/%m")
+        hora = agendamento.hora.strftime("%H:%M")
+
+        return f"Olá, {nome_cliente}! Lembrete: seu horário de {agendamento.servico.nome} é amanhã ({data}) às {hora}. ⭐✂"
+
 
 # Instância global do serviço
 smsdev_service = SMSDevService()
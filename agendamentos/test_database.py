@@ -1,3 +1,4 @@
+import os
 import threading
 from datetime import date
 from datetime import time as dt_time
@@ -5,7 +6,7 @@ from datetime import timedelta
 from decimal import Decimal
 
 from django.db import IntegrityError, transaction
-from django.db.models import Avg, Count, Sum
+from django.db.models import Avg, Count, F, Max, Min, Sum
 from django.test import TestCase, TransactionTestCase
 
 import pytest
@@ -632,3 +633,445 @@ class BackupRestoreTest(TestCase):
         self.assertEqual(len(resultados), 5)
         erros = sum(1 for resultado in resultados if resultado[0] == "erro")
         self.assertEqual(erros, 0)  # Nenhum erro esperado em operações sequenciais
+
+
+@pytest.mark.database
+class ResumoDiarioTest(TestCase):
+    """Testa a manutenção incremental do resumo diário"""
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+
+        self.cliente = Cliente.objects.create(nome="João Silva", telefone="11999999999")
+        self.corte = Servico.objects.create(
+            nome="Corte", duracao=30, preco=Decimal("30.00")
+        )
+        self.barba = Servico.objects.create(
+            nome="Barba", duracao=15, preco=Decimal("15.00")
+        )
+        self.dia = date(2025, 5, 20)
+        User.objects.create_user(username="testuser", password="testpass123")
+
+    def _criar(self, **kwargs):
+        dados = {
+            "cliente": self.cliente,
+            "servico": self.corte,
+            "data": self.dia,
+            "hora": dt_time(10, 0),
+        }
+        dados.update(kwargs)
+        return Agendamento.objects.create(**dados)
+
+    def _resumo(self):
+        from agendamentos.models import ResumoDiario
+
+        return {
+            (r.data, r.status, r.status_pagamento, r.servico_id): (
+                r.quantidade,
+                r.valor_total,
+            )
+            for r in ResumoDiario.objects.filter(quantidade__gt=0)
+        }
+
+    def _resumo_reconstruido(self):
+        from agendamentos.relatorios import reconstruir_resumo
+
+        reconstruir_resumo()
+        return self._resumo()
+
+    def test_criacao_incrementa_resumo(self):
+        """Testa que criar agendamentos soma no resumo do dia"""
+        self._criar()
+        self._criar(hora=dt_time(11, 0))
+
+        chave = (self.dia, "confirmado", "pendente", self.corte.id)
+        self.assertEqual(self._resumo()[chave], (2, Decimal("60.00")))
+
+    def test_bulk_create_atualiza_resumo(self):
+        """Testa que a criação em lote entra no resumo, sem sinais"""
+        self._criar()
+        Agendamento.objects.bulk_create(
+            [
+                Agendamento(
+                    cliente=self.cliente,
+                    servico=servico,
+                    data=data,
+                    hora=dt_time(14, 0),
+                )
+                for servico, data in [
+                    (self.corte, self.dia),
+                    (self.barba, self.dia),
+                    (self.corte, self.dia + timedelta(days=1)),
+                ]
+            ]
+        )
+
+        resumo = self._resumo()
+        self.assertEqual(
+            resumo[(self.dia, "confirmado", "pendente", self.corte.id)],
+            (2, Decimal("60.00")),
+        )
+        self.assertEqual(len(resumo), 3)
+        self.assertEqual(resumo, self._resumo_reconstruido())
+
+    def test_edicao_move_contribuicao(self):
+        """Testa que editar data, serviço e status move a contribuição"""
+        agendamento = self._criar()
+        agendamento.servico = self.barba
+        agendamento.data = self.dia + timedelta(days=1)
+        agendamento.status = "concluido"
+        agendamento.save()
+
+        resumo = self._resumo()
+        self.assertEqual(len(resumo), 1)
+        # Trocar o serviço registra o preço do novo
+        self.assertEqual(
+            resumo[(agendamento.data, "concluido", "pendente", self.barba.id)],
+            (1, Decimal("15.00")),
+        )
+        self.assertEqual(resumo, self._resumo_reconstruido())
+
+    def test_exclusao_decrementa_resumo(self):
+        """Testa que excluir um agendamento remove sua contribuição"""
+        agendamento = self._criar()
+        self._criar(hora=dt_time(11, 0))
+        agendamento.delete()
+
+        chave = (self.dia, "confirmado", "pendente", self.corte.id)
+        self.assertEqual(self._resumo()[chave], (1, Decimal("30.00")))
+
+    def test_alterar_status_pagamento_atualiza_resumo(self):
+        """Testa o toggle de pagamento pela view"""
+        from django.urls import reverse
+
+        agendamento = self._criar()
+        self.client.login(username="testuser", password="testpass123")
+        self.client.post(reverse("alterar_status_pagamento", args=[agendamento.id]))
+
+        resumo = self._resumo()
+        self.assertEqual(
+            resumo[(self.dia, "confirmado", "pago", self.corte.id)],
+            (1, Decimal("30.00")),
+        )
+        self.assertNotIn((self.dia, "confirmado", "pendente", self.corte.id), resumo)
+
+    def test_mudanca_preco_servico_preserva_historico(self):
+        """Testa que alterar o preço do serviço não muda o histórico"""
+        self._criar()
+        self.corte.preco = Decimal("40.00")
+        self.corte.save()
+        self._criar(hora=dt_time(11, 0))
+
+        chave = (self.dia, "confirmado", "pendente", self.corte.id)
+        self.assertEqual(self._resumo()[chave], (2, Decimal("70.00")))
+        self.assertEqual(self._resumo(), self._resumo_reconstruido())
+
+    def test_troca_de_servico_igual_no_modelo_e_no_formulario(self):
+        """Testa que admin/shell e o formulário registram o mesmo preço"""
+        from agendamentos.forms import AgendamentoForm
+
+        pelo_modelo = self._criar()
+        pelo_formulario = self._criar(hora=dt_time(11, 0))
+        self.corte.preco = Decimal("40.00")
+        self.corte.save()
+
+        # Salvar sem trocar o serviço mantém o preço congelado
+        pelo_modelo.observacoes = "Sem máquina"
+        pelo_modelo.save()
+        pelo_modelo.refresh_from_db()
+        self.assertEqual(pelo_modelo.valor, Decimal("30.00"))
+
+        pelo_modelo.servico = self.barba
+        pelo_modelo.save(update_fields=["servico"])
+        form = AgendamentoForm(
+            instance=pelo_formulario,
+            data={
+                "cliente": self.cliente.id,
+                "servico": self.barba.id,
+                "data": self.dia.isoformat(),
+                "hora": "11:00",
+            },
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+
+        pelo_modelo.refresh_from_db()
+        pelo_formulario.refresh_from_db()
+        self.assertEqual(pelo_modelo.valor, Decimal("15.00"))
+        self.assertEqual(pelo_formulario.valor, Decimal("15.00"))
+        self.assertEqual(self._resumo(), self._resumo_reconstruido())
+
+    def test_comando_reconstruir_resumo(self):
+        """Testa o comando que reconstrói o resumo do zero"""
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        from agendamentos.models import ResumoDiario
+
+        self._criar()
+        self._criar(servico=self.barba, status_pagamento="pago")
+        esperado = self._resumo()
+        ResumoDiario.objects.all().delete()
+
+        saida = StringIO()
+        call_command("reconstruir_resumo_diario", stdout=saida)
+
+        self.assertEqual(self._resumo(), esperado)
+        self.assertIn("2 linha(s)", saida.getvalue())
+
+
+@pytest.mark.database
+class GerarDadosTest(TestCase):
+    """Testa o gerador de dados sintéticos (manage.py gerar_dados)"""
+
+    def _gerar(self, *args):
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        saida = StringIO()
+        call_command("gerar_dados", *args, stdout=saida)
+        return saida.getvalue()
+
+    def _resumo(self):
+        from agendamentos.models import ResumoDiario
+
+        return set(
+            ResumoDiario.objects.values_list(
+                "data", "status", "status_pagamento", "servico_id", "quantidade"
+            )
+        )
+
+    def test_comando_gera_quantidades_pedidas(self):
+        """Testa agendamentos, clientes, serviços e resumo diário gerados"""
+        from agendamentos.relatorios import reconstruir_resumo
+
+        saida = self._gerar(
+            "--agendamentos", "500", "--clientes", "40", "--lote", "120"
+        )
+
+        self.assertIn("Gerados 500 agendamento(s)", saida)
+        self.assertEqual(Agendamento.objects.count(), 500)
+        self.assertEqual(Cliente.objects.count(), 40)
+        self.assertEqual(Servico.objects.count(), 5)
+        # O valor congelado é o preço do serviço
+        self.assertFalse(
+            Agendamento.objects.exclude(valor=F("servico__preco")).exists()
+        )
+        # Resumo diário igual ao reconstruído do zero
+        resumo = self._resumo()
+        reconstruir_resumo()
+        self.assertEqual(resumo, self._resumo())
+
+    def test_distribuicao_de_status_e_pagamento(self):
+        """Testa período, pesos dos status e fração de pagos"""
+        self._gerar(
+            "--agendamentos",
+            "300",
+            "--inicio",
+            "2024-01-01",
+            "--fim",
+            "2024-01-31",
+            "--status",
+            "concluido=1",
+            "--pagos",
+            "0",
+        )
+
+        datas = Agendamento.objects.aggregate(primeira=Min("data"), ultima=Max("data"))
+        self.assertGreaterEqual(datas["primeira"], date(2024, 1, 1))
+        self.assertLessEqual(datas["ultima"], date(2024, 1, 31))
+        self.assertEqual(
+            set(Agendamento.objects.values_list("status", "status_pagamento")),
+            {("concluido", "pendente")},
+        )
+
+    def test_dias_futuros_so_confirmados(self):
+        """Testa que a partir de hoje nada está concluído ou pago"""
+        self._gerar("--agendamentos", "400")
+
+        futuros = Agendamento.objects.filter(data__gte=date.today())
+        self.assertTrue(futuros.exists())
+        self.assertEqual(
+            set(futuros.values_list("status", "status_pagamento")),
+            {("confirmado", "pendente")},
+        )
+        self.assertTrue(Agendamento.objects.filter(status_pagamento="pago").exists())
+
+    def test_agendamentos_do_dia_sem_sobreposicao(self):
+        """Testa que nenhum agendamento gerado invade o seguinte ou o fim do dia"""
+        from django.core.management.base import CommandError
+
+        from agendamentos import dados_sinteticos
+
+        self._gerar(
+            "--agendamentos", "570", "--inicio", "2024-01-01", "--fim", "2024-01-30"
+        )
+
+        por_dia = {}
+        for dia, hora, duracao in Agendamento.objects.values_list(
+            "data", "hora", "servico__duracao"
+        ):
+            por_dia.setdefault(dia, []).append((hora.hour * 60 + hora.minute, duracao))
+        # 30 dias cheios: 19 agendamentos em cada um
+        self.assertEqual({len(dia) for dia in por_dia.values()}, {19})
+        for dia, horarios in por_dia.items():
+            horarios.sort()
+            for (inicio, duracao), (seguinte, _) in zip(horarios, horarios[1:]):
+                self.assertLessEqual(inicio + duracao, seguinte, dia)
+            self.assertLessEqual(sum(horarios[-1]), 22 * 60, dia)
+
+        with self.assertRaises(CommandError):
+            self._gerar(
+                "--agendamentos", "20", "--inicio", "2024-02-01", "--fim", "2024-02-01"
+            )
+        self.assertEqual(Agendamento.objects.count(), 570)
+        self.assertEqual(dados_sinteticos.dias_necessarios(100), dados_sinteticos.DIAS)
+        self.assertEqual(dados_sinteticos.dias_necessarios(1_000_000), 52_632)
+
+    def test_mesma_seed_mesmos_dados(self):
+        """Testa a reprodutibilidade pela seed"""
+        campos = ("data", "hora", "status", "status_pagamento", "servico__nome")
+        self._gerar("--agendamentos", "200", "--seed", "3")
+        primeira = list(Agendamento.objects.order_by("id").values_list(*campos))
+
+        self._gerar("--agendamentos", "200", "--seed", "3", "--limpar")
+        segunda = list(Agendamento.objects.order_by("id").values_list(*campos))
+
+        self.assertEqual(primeira, segunda)
+        self._gerar("--agendamentos", "200", "--seed", "4", "--limpar")
+        terceira = list(Agendamento.objects.order_by("id").values_list(*campos))
+        self.assertNotEqual(primeira, terceira)
+
+    def test_limpar_e_telefones_unicos(self):
+        """Testa --limpar e que gerar de novo não repete telefones"""
+        self._gerar("--agendamentos", "100", "--clientes", "30")
+        self._gerar("--agendamentos", "100", "--clientes", "30")
+        self.assertEqual(Cliente.objects.count(), 60)
+        self.assertEqual(Agendamento.objects.count(), 200)
+
+        self._gerar("--agendamentos", "50", "--clientes", "10", "--limpar")
+        self.assertEqual(Cliente.objects.count(), 10)
+        self.assertEqual(Agendamento.objects.count(), 50)
+        self.assertEqual(sum(linha[-1] for linha in self._resumo()), 50)
+
+    def test_parametros_invalidos(self):
+        """Testa a validação das opções"""
+        from django.core.management.base import CommandError
+
+        for argumentos in (
+            ["--status", "pago=1"],
+            ["--status", "concluido=x"],
+            ["--status", "concluido=0"],
+            ["--pagos", "2"],
+            ["--inicio", "2024-02-01", "--fim", "2024-01-01"],
+            ["--fim", "31/01/2024"],
+        ):
+            with self.subTest(argumentos=argumentos):
+                with self.assertRaises(CommandError):
+                    self._gerar("--agendamentos", "10", *argumentos)
+        self.assertEqual(Agendamento.objects.count(), 0)
+
+
+@pytest.mark.database
+class IndicesConsultasTest(TestCase):
+    """Testa que as consultas mais usadas de Agendamento usam índices"""
+
+    # 10 por dia por padrão; para conferir os planos no volume de produção,
+    # rode com INDICES_TESTE_LINHAS=1000000
+    LINHAS = int(os.getenv("INDICES_TESTE_LINHAS", "20000"))
+    DIAS = 2000
+    INDICES = (
+        "agendamento_data_hora_idx",
+        "agendamento_pagamento_idx",
+        "agendamento_pendente_idx",
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        from django.db import connection
+
+        servico = Servico.objects.create(
+            nome="Corte", duracao=30, preco=Decimal("30.00")
+        )
+        cls.inicio = date(2020, 1, 1)
+
+        # Inserção direta no banco: sem sinais e sem objetos Python
+        tabela = Agendamento._meta.db_table
+        colunas = (
+            "servico_id, data, hora, status, status_pagamento, valor, criado_em, "
+            "atualizado_em"
+        )
+        if connection.vendor == "postgresql":
+            sql = f"""
+                INSERT INTO {tabela} ({colunas})
+                SELECT %s,
+                       DATE '2020-01-01' + (n %% {cls.DIAS}),
+                       MAKE_TIME(6 + (n / {cls.DIAS}) %% 15, 0, 0),
+                       'concluido',
+                       CASE WHEN n %% 10 = 0 THEN 'pendente' ELSE 'pago' END,
+                       30.00,
+                       NOW(),
+                       NOW()
+                FROM GENERATE_SERIES(1, %s) AS n
+            """
+        else:
+            sql = f"""
+                WITH RECURSIVE seq(n) AS (
+                    SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s
+                )
+                INSERT INTO {tabela} ({colunas})
+                SELECT %s,
+                       DATE('2020-01-01', '+' || (n %% {cls.DIAS}) || ' days'),
+                       PRINTF('%%02d:00:00', 6 + (n / {cls.DIAS}) %% 15),
+                       'concluido',
+                       CASE WHEN n %% 10 = 0 THEN 'pendente' ELSE 'pago' END,
+                       30.00,
+                       CURRENT_TIMESTAMP,
+                       CURRENT_TIMESTAMP
+                FROM seq
+            """
+        parametros = (
+            [servico.id, cls.LINHAS]
+            if connection.vendor == "postgresql"
+            else [cls.LINHAS, servico.id]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, parametros)
+            # Estatísticas atualizadas para o planejador escolher o plano real
+            cursor.execute(f"ANALYZE {tabela}")
+
+    def _assert_usa_indice(self, queryset):
+        plano = queryset.explain()
+        self.assertTrue(
+            any(indice in plano for indice in self.INDICES),
+            f"Consulta sem índice:\n{plano}",
+        )
+
+    def test_agenda_do_dia(self):
+        """Testa painel do barbeiro e financeiro diário (data + ordem por hora)"""
+        dia = self.inicio + timedelta(days=100)
+        self._assert_usa_indice(Agendamento.objects.filter(data=dia).order_by("hora"))
+
+    def test_agendamentos_do_mes(self):
+        """Testa a agenda mensal (intervalo de datas)"""
+        inicio = self.inicio + timedelta(days=100)
+        self._assert_usa_indice(
+            Agendamento.objects.filter(
+                data__gte=inicio, data__lte=inicio + timedelta(days=30)
+            ).order_by("data", "hora")
+        )
+
+    def test_listas_financeiro_por_pagamento(self):
+        """Testa as listas mensal e anual de pagos e pendentes"""
+        for dias in (30, 365):
+            for status_pagamento in ("pago", "pendente"):
+                with self.subTest(dias=dias, status_pagamento=status_pagamento):
+                    self._assert_usa_indice(
+                        Agendamento.objects.filter(
+                            data__gte=self.inicio,
+                            data__lte=self.inicio + timedelta(days=dias),
+                            status_pagamento=status_pagamento,
+                        ).order_by("-data", "hora")
+                    )
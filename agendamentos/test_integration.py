@@ -15,6 +15,7 @@ from django.urls import reverse
 
 import pytest
 
+from .fila_sms import processar_fila
 from .models import Agendamento, Cliente, Servico
 
 
@@ -438,10 +439,14 @@ class FluxoStatusAgendamentoTest(TestCase):
         self.assertEqual(response.status_code, 200)
 
         # POST com dados do formulário
-        response = self.client.post(
-            reverse("on_the_way_agendamento", args=[agendamento.pk]),
-            {"previsao_minutos": 15},
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("on_the_way_agendamento", args=[agendamento.pk]),
+                {"previsao_minutos": 15},
+            )
+
+        # O SMS é enviado pelo worker da fila
+        processar_fila()
 
         # Verificar se SMS foi enviado
         mock_enviar_sms.assert_called_once()
@@ -537,9 +542,9 @@ class FluxoRelatoriosTest(TestCase):
         self.assertIn("agendamentos", response.context)
         self.assertIn("total_agendamentos", response.context)
 
-        # Verificar cálculos
+        # Verificar cálculos (contagens por dia, apenas deste mês)
         agendamentos = response.context["agendamentos"]
-        self.assertEqual(len(agendamentos), 2)  # Apenas deste mês
+        self.assertEqual(sum(dia["total"] for dia in agendamentos), 2)
 
         total_agendamentos = response.context["total_agendamentos"]
         self.assertEqual(total_agendamentos, 2)
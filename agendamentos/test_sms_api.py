@@ -5,6 +5,7 @@ Este módulo contém testes para a integração com a API SMSDev,
 incluindo cenários de sucesso, erro e fallback.
 """
 
+import threading
 from datetime import date
 from datetime import time as dt_time
 from datetime import timedelta
@@ -12,13 +13,21 @@ from decimal import Decimal
 from unittest.mock import Mock, patch
 
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.db import IntegrityError, transaction
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
 import pytest
 
-from .models import Agendamento, Cliente, Servico
-from .smsdev_service import smsdev_service
+from .fila_sms import (
+    MAX_TENTATIVAS,
+    enfileirar_barbeiro_a_caminho,
+    espera_para,
+    processar_fila,
+)
+from .lembretes import agendamentos_para_lembrete, enviar_lembretes
+from .models import Agendamento, Cliente, MensagemSMS, Servico
+from .smsdev_service import SMSDevService, smsdev_service
 
 
 @pytest.mark.api
@@ -41,7 +50,7 @@ class SMSServiceTest(TestCase):
             status="confirmado",
         )
 
-    @patch("agendamentos.smsdev_service.requests.post")
+    @patch("agendamentos.smsdev_service.requests.Session.post")
     def test_sms_sucesso_envio(self, mock_post):
         """Testa envio de SMS com sucesso"""
         # Mock da resposta de sucesso
@@ -68,7 +77,7 @@ class SMSServiceTest(TestCase):
         self.assertIn("number", kwargs["data"])
         self.assertIn("msg", kwargs["data"])
 
-    @patch("agendamentos.smsdev_service.requests.post")
+    @patch("agendamentos.smsdev_service.requests.Session.post")
     def test_sms_erro_credenciais_invalidas(self, mock_post):
         """Testa erro de credenciais inválidas"""
         # Mock da resposta de erro
@@ -88,7 +97,7 @@ class SMSServiceTest(TestCase):
         self.assertFalse(resultado["sucesso"])
         self.assertIn("Credenciais", resultado["erro"])
 
-    @patch("agendamentos.smsdev_service.requests.post")
+    @patch("agendamentos.smsdev_service.requests.Session.post")
     def test_sms_erro_timeout(self, mock_post):
         """Testa timeout da API"""
         # Mock de timeout
@@ -101,7 +110,7 @@ class SMSServiceTest(TestCase):
         self.assertFalse(resultado["sucesso"])
         self.assertIn("Timeout", resultado["erro"])
 
-    @patch("agendamentos.smsdev_service.requests.post")
+    @patch("agendamentos.smsdev_service.requests.Session.post")
     def test_sms_erro_numero_invalido(self, mock_post):
         """Testa erro de número inválido"""
         # Mock da resposta de erro
@@ -121,7 +130,7 @@ class SMSServiceTest(TestCase):
         self.assertFalse(resultado["sucesso"])
         self.assertIn("inválido", resultado["erro"])
 
-    @patch("agendamentos.smsdev_service.requests.post")
+    @patch("agendamentos.smsdev_service.requests.Session.post")
     def test_sms_erro_conta_sem_credito(self, mock_post):
         """Testa erro de conta sem crédito"""
         # Mock da resposta de erro
@@ -153,6 +162,50 @@ class SMSServiceTest(TestCase):
             self.assertFalse(resultado["sucesso"])
             self.assertIn("Credenciais", resultado["erro"])
 
+    @override_settings(
+        SMSDEV_POOL_TAMANHO=4,
+        SMSDEV_TENTATIVAS=3,
+        SMSDEV_TIMEOUT_CONEXAO=2,
+        SMSDEV_TIMEOUT_LEITURA=7,
+    )
+    def test_sessao_http_configuravel(self):
+        """Testa pool, novas tentativas e timeouts da sessão HTTP"""
+        service = SMSDevService()
+        adapter = service.session.get_adapter(service.api_url)
+
+        self.assertEqual(service.timeout, (2, 7))
+        self.assertEqual(adapter._pool_maxsize, 4)
+        self.assertEqual(adapter.max_retries.connect, 3)
+        self.assertEqual(adapter.max_retries.read, 0)
+        self.assertEqual(adapter.max_retries.status, 0)
+        self.assertIn("POST", adapter.max_retries.allowed_methods)
+        # Erro do gateway pode vir depois de a SMSDev aceitar a mensagem
+        for status in (502, 503, 504):
+            self.assertFalse(adapter.max_retries.is_retry("POST", status))
+
+        # A sessão é reaproveitada na mesma thread e o pool entre threads
+        self.assertIs(service.session, service.session)
+        outras = []
+        thread = threading.Thread(target=lambda: outras.append(service.session))
+        thread.start()
+        thread.join()
+        self.assertIsNot(outras[0], service.session)
+        self.assertIs(outras[0].get_adapter(service.api_url), adapter)
+
+    @patch.multiple(smsdev_service, enabled=True, usuario="usuario", token="token")
+    @patch("agendamentos.smsdev_service.requests.Session.post")
+    def test_sms_usa_timeouts_separados(self, mock_post):
+        """Testa que o envio passa timeouts de conexão e leitura"""
+        mock_post.return_value = Mock(
+            status_code=200, json=Mock(return_value={"situacao": "OK"})
+        )
+
+        smsdev_service.enviar_sms(self.cliente.telefone, "Teste")
+
+        args, kwargs = mock_post.call_args
+        self.assertEqual(kwargs["timeout"], smsdev_service.timeout)
+        self.assertEqual(len(kwargs["timeout"]), 2)
+
     def test_sms_telefone_formatos_validos(self):
         """Testa diferentes formatos de telefone válidos"""
         formatos_validos = [
@@ -163,7 +216,7 @@ class SMSServiceTest(TestCase):
             "11-99999-9999",
         ]
 
-        with patch("agendamentos.smsdev_service.requests.post") as mock_post:
+        with patch("agendamentos.smsdev_service.requests.Session.post") as mock_post:
             mock_response = Mock()
             mock_response.status_code = 200
             mock_response.json.return_value = {"situacao": "OK"}
@@ -248,7 +301,7 @@ class SMSIntegrationTest(TestCase):
         # SMS não é enviado automaticamente na criação
         mock_enviar_sms.assert_not_called()
 
-    @patch("agendamentos.smsdev_service.smsdev_service.enviar_barbeiro_a_caminho")
+    @patch("agendamentos.smsdev_service.smsdev_service.enviar_sms")
     def test_sms_a_caminho_integracao(self, mock_enviar_sms):
         """Testa SMS quando cliente está à caminho"""
         # Mock do SMS
@@ -274,17 +327,25 @@ class SMSIntegrationTest(TestCase):
         self.assertEqual(response.status_code, 200)
 
         # POST com dados do formulário
-        response = self.client.post(
-            reverse("on_the_way_agendamento", args=[agendamento.pk]),
-            {"previsao_minutos": 15},
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("on_the_way_agendamento", args=[agendamento.pk]),
+                {"previsao_minutos": 15},
+            )
+
+        # A requisição só enfileira; o envio é feito pelo worker
+        mock_enviar_sms.assert_not_called()
+        mensagem = MensagemSMS.objects.get(agendamento=agendamento)
+        self.assertEqual(mensagem.status, "pendente")
+        self.assertIn("15 minutos", mensagem.mensagem)
+
+        processar_fila()
 
         # Verificar se SMS foi enviado
         mock_enviar_sms.assert_called_once()
         args, kwargs = mock_enviar_sms.call_args
-        self.assertEqual(args[0].cliente.telefone, "11988888888")
-        # args[1] é a previsao_minutos (int), não a mensagem
-        self.assertEqual(args[1], 15)
+        self.assertEqual(args[0], "11988888888")
+        self.assertIn("15 minutos", args[1])
 
     @patch("agendamentos.smsdev_service.smsdev_service.enviar_sms")
     def test_sms_fallback_sistema_continua(self, mock_enviar_sms):
@@ -315,7 +376,7 @@ class SMSIntegrationTest(TestCase):
     def test_rate_limiting_sms_simulado(self):
         """Testa simulação de rate limiting"""
         # Simular múltiplos envios em sequência
-        with patch("agendamentos.smsdev_service.requests.post") as mock_post:
+        with patch("agendamentos.smsdev_service.requests.Session.post") as mock_post:
             # Primeiro envio: sucesso
             mock_response1 = Mock()
             mock_response1.status_code = 200
@@ -342,6 +403,497 @@ class SMSIntegrationTest(TestCase):
             self.assertIn("Rate limit", resultado2["erro"])
 
 
+@pytest.mark.api
+class FilaSMSTest(TestCase):
+    """Testa a fila de saída de SMS e o worker"""
+
+    def setUp(self):
+        """Configuração inicial"""
+        self.user = User.objects.create_user(
+            username="testuser", password="testpass123"
+        )
+        self.client = Client()
+        self.client.login(username="testuser", password="testpass123")
+
+        self.cliente = Cliente.objects.create(
+            nome="Carlos Lima", telefone="11955555555"
+        )
+        self.servico = Servico.objects.create(
+            nome="Corte", duracao=30, preco=Decimal("30.00")
+        )
+        self.agendamento = Agendamento.objects.create(
+            cliente=self.cliente,
+            servico=self.servico,
+            data=date.today(),
+            hora=dt_time(9, 0),
+            status="confirmado",
+        )
+
+    def _enfileirar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            enfileirar_barbeiro_a_caminho(self.agendamento, 10)
+        return MensagemSMS.objects.get(agendamento=self.agendamento)
+
+    @patch("agendamentos.smsdev_service.smsdev_service.enviar_sms")
+    def test_view_nao_envia_sms_na_requisicao(self, mock_enviar_sms):
+        """Testa que marcar "à caminho" responde sem chamar a API de SMS"""
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post(
+                reverse("on_the_way_agendamento", args=[self.agendamento.pk]),
+                {"previsao_minutos": 20},
+            )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(callbacks), 1)
+        mock_enviar_sms.assert_not_called()
+        self.assertEqual(MensagemSMS.objects.filter(status="pendente").count(), 1)
+
+    def test_mensagem_so_entra_na_fila_apos_commit(self):
+        """Testa que nada é gravado se a transação for desfeita"""
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            enfileirar_barbeiro_a_caminho(self.agendamento, 10)
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(MensagemSMS.objects.exists())
+
+    def test_cliente_sem_telefone_nao_enfileira(self):
+        """Testa que cliente sem telefone não gera mensagem"""
+        self.cliente.telefone = None
+        self.cliente.save()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resultado = enfileirar_barbeiro_a_caminho(self.agendamento)
+
+        self.assertFalse(resultado["sucesso"])
+        self.assertFalse(MensagemSMS.objects.exists())
+
+    @patch("agendamentos.smsdev_service.smsdev_service.enviar_sms")
+    def test_worker_envia_e_registra_status(self, mock_enviar_sms):
+        """Testa envio bem-sucedido pelo worker"""
+        mock_enviar_sms.return_value = {"sucesso": True, "erro": None, "id": "987"}
+        mensagem = self._enfileirar()
+
+        totais = processar_fila()
+
+        self.assertEqual(totais, {"enviados": 1, "reagendados": 0, "falhas": 0})
+        mensagem.refresh_from_db()
+        self.assertEqual(mensagem.status, "enviado")
+        self.assertEqual(mensagem.id_externo, "987")
+        self.assertEqual(mensagem.tentativas, 1)
+        self.assertIsNotNone(mensagem.enviado_em)
+
+        # Nada mais a enviar
+        self.assertEqual(sum(processar_fila().values()), 0)
+
+    @patch("agendamentos.smsdev_service.smsdev_service.enviar_sms")
+    def test_worker_reagenda_com_espera_crescente(self, mock_enviar_sms):
+        """Testa novas tentativas com backoff até desistir"""
+        from django.utils import timezone
+
+        mock_enviar_sms.return_value = {
+            "sucesso": False,
+            "erro": "Erro HTTP 503",
+            "id": None,
+        }
+        mensagem = self._enfileirar()
+
+        for tentativa in range(1, MAX_TENTATIVAS + 1):
+            antes = timezone.now()
+            processar_fila()
+            mensagem.refresh_from_db()
+            self.assertEqual(mensagem.tentativas, tentativa)
+            self.assertEqual(mensagem.erro, "Erro HTTP 503")
+
+            if tentativa < MAX_TENTATIVAS:
+                self.assertEqual(mensagem.status, "pendente")
+                self.assertGreaterEqual(
+                    mensagem.proxima_tentativa, antes + espera_para(tentativa)
+                )
+                # Ainda não chegou a hora: o worker não tenta de novo
+                self.assertEqual(sum(processar_fila().values()), 0)
+                MensagemSMS.objects.filter(pk=mensagem.pk).update(
+                    proxima_tentativa=timezone.now()
+                )
+
+        self.assertEqual(mensagem.status, "falhou")
+        self.assertEqual(mock_enviar_sms.call_count, MAX_TENTATIVAS)
+
+    def test_erro_permanente_falha_na_primeira_tentativa(self):
+        """Testa que SMS desligado ou telefone inválido não entra no backoff"""
+        casos = [
+            ({"enabled": False}, "11955555555", "SMS desabilitado"),
+            (
+                {"enabled": True, "usuario": "u", "token": "t"},
+                "123",
+                "Número de telefone inválido",
+            ),
+        ]
+        for atributos, telefone, erro in casos:
+            with self.subTest(erro=erro), patch.multiple(
+                smsdev_service, **atributos
+            ), patch.object(smsdev_service, "_postar") as mock_postar:
+                mensagem = MensagemSMS.objects.create(
+                    telefone=telefone, mensagem="Oi", tipo="a_caminho"
+                )
+
+                totais = processar_fila()
+
+                self.assertEqual(totais, {"enviados": 0, "reagendados": 0, "falhas": 1})
+                mensagem.refresh_from_db()
+                self.assertEqual(mensagem.status, "falhou")
+                self.assertEqual(mensagem.tentativas, 1)
+                self.assertEqual(mensagem.erro, erro)
+                mock_postar.assert_not_called()
+
+    def test_espera_crescente_limitada(self):
+        """Testa a progressão do intervalo entre tentativas"""
+        self.assertEqual(espera_para(1).total_seconds(), 30)
+        self.assertEqual(espera_para(2).total_seconds(), 60)
+        self.assertEqual(espera_para(3).total_seconds(), 120)
+        self.assertEqual(espera_para(20).total_seconds(), 3600)
+
+    @patch("agendamentos.smsdev_service.smsdev_service.enviar_sms")
+    def test_comando_processar_fila_uma_vez(self, mock_enviar_sms):
+        """Testa o comando do worker em modo de execução única"""
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        mock_enviar_sms.return_value = {"sucesso": True, "erro": None, "id": "1"}
+        self._enfileirar()
+
+        saida = StringIO()
+        call_command("processar_fila_sms", "--uma-vez", stdout=saida)
+
+        self.assertIn("Enviados: 1", saida.getvalue())
+        self.assertTrue(MensagemSMS.objects.filter(status="enviado").exists())
+
+    def test_painel_mostra_status_do_sms(self):
+        """Testa que o painel exibe o status de entrega do SMS"""
+        mensagem = self._enfileirar()
+
+        response = self.client.get(reverse("painel_barbeiro"))
+        self.assertContains(response, "Na fila de envio")
+
+        mensagem.status = "falhou"
+        mensagem.save()
+        response = self.client.get(reverse("painel_barbeiro"))
+        self.assertContains(response, "sms-status-falhou")
+
+
+@pytest.mark.api
+@override_settings(SMS_ENABLED=True, SMSDEV_USUARIO="teste", SMSDEV_TOKEN="token")
+class EnvioLoteSMSTest(TestCase):
+    """Testa o envio de SMS em lote"""
+
+    def setUp(self):
+        """Configuração inicial"""
+        self.service = SMSDevService()
+        self.lock = threading.Lock()
+        self.em_andamento = 0
+        self.pico = 0
+
+    def _resposta_lenta(self, url, data=None, timeout=None):
+        """Simula a API contando quantas requisições estão em andamento"""
+        import time
+
+        with self.lock:
+            self.em_andamento += 1
+            self.pico = max(self.pico, self.em_andamento)
+        time.sleep(0.02)
+        with self.lock:
+            self.em_andamento -= 1
+
+        if data["number"].endswith("0"):
+            json = {"situacao": "ERRO", "descricao": "Número bloqueado"}
+        else:
+            json = {"situacao": "OK", "id": data["number"]}
+        return Mock(status_code=200, json=Mock(return_value=json))
+
+    @patch("agendamentos.smsdev_service.requests.Session.post")
+    def test_lote_retorna_resultados_na_ordem(self, mock_post):
+        """Testa um resultado por mensagem, na ordem e no formato de enviar_sms"""
+        mock_post.side_effect = self._resposta_lenta
+        mensagens = [(f"1199999999{i}", f"Mensagem {i}") for i in range(10)]
+        mensagens.append(("123", "Telefone inválido"))
+
+        resultados = self.service.enviar_lote(mensagens)
+
+        self.assertEqual(len(resultados), 11)
+        self.assertEqual(
+            resultados[0],
+            {"sucesso": False, "erro": "Número bloqueado", "id": None},
+        )
+        for i, resultado in enumerate(resultados[1:10], start=1):
+            self.assertTrue(resultado["sucesso"])
+            self.assertEqual(resultado["id"], f"1199999999{i}")
+        self.assertEqual(
+            resultados[10],
+            {
+                "sucesso": False,
+                "erro": "Número de telefone inválido",
+                "id": None,
+                "permanente": True,
+            },
+        )
+
+    @patch("agendamentos.smsdev_service.requests.Session.post")
+    def test_lote_respeita_limite_simultaneo(self, mock_post):
+        """Testa que o lote não passa do número máximo de envios simultâneos"""
+        mock_post.side_effect = self._resposta_lenta
+        mensagens = [(f"119999999{i:02d}", "Oi") for i in range(1, 31)]
+
+        resultados = self.service.enviar_lote(mensagens, max_simultaneos=3)
+
+        self.assertEqual(len(resultados), 30)
+        self.assertEqual(mock_post.call_count, 30)
+        self.assertLessEqual(self.pico, 3)
+        self.assertGreater(self.pico, 1)
+
+    @override_settings(SMSDEV_MENSAGENS_POR_SEGUNDO=50)
+    @patch("agendamentos.smsdev_service.requests.Session.post")
+    def test_lote_respeita_limite_de_taxa(self, mock_post):
+        """Testa o limite de mensagens por segundo do provedor"""
+        import time
+
+        service = SMSDevService()
+        horarios = []
+
+        def registrar(url, data=None, timeout=None):
+            horarios.append(time.monotonic())
+            return Mock(status_code=200, json=Mock(return_value={"situacao": "OK"}))
+
+        mock_post.side_effect = registrar
+
+        service.enviar_lote([("11999999999", "Oi")] * 20, max_simultaneos=10)
+
+        # 20 mensagens a 50/s: ao menos 19 intervalos de 20ms
+        horarios.sort()
+        self.assertGreaterEqual(horarios[-1] - horarios[0], 19 * 0.02 * 0.9)
+
+    def test_lote_vazio(self):
+        """Testa lote sem mensagens"""
+        self.assertEqual(self.service.enviar_lote([]), [])
+
+
+@pytest.mark.api
+class LembretesSMSTest(TestCase):
+    """Testa os lembretes por SMS dos agendamentos do dia seguinte"""
+
+    def setUp(self):
+        """Configuração inicial"""
+        self.amanha = date.today() + timedelta(days=1)
+        self.servico = Servico.objects.create(
+            nome="Corte", duracao=30, preco=Decimal("30.00")
+        )
+        self.ana = Cliente.objects.create(nome="Ana Souza", telefone="11911111111")
+        self.bruno = Cliente.objects.create(nome="Bruno Reis", telefone="11922222222")
+        self.sem_telefone = Cliente.objects.create(nome="Caio Nunes")
+
+        self.lembrete_ana = self._agendar(self.ana, dt_time(9, 0))
+        self.lembrete_bruno = self._agendar(self.bruno, dt_time(10, 30))
+        # Fora do lembrete: sem telefone, outro status e outro dia
+        self._agendar(self.sem_telefone, dt_time(11, 0))
+        self._agendar(self.ana, dt_time(12, 0), status="cancelado")
+        self._agendar(self.bruno, dt_time(9, 0), data=date.today())
+
+    def _agendar(self, cliente, hora, status="confirmado", data=None):
+        return Agendamento.objects.create(
+            cliente=cliente,
+            servico=self.servico,
+            data=data or self.amanha,
+            hora=hora,
+            status=status,
+        )
+
+    @patch("agendamentos.smsdev_service.smsdev_service.enviar_lote")
+    def test_envia_apenas_confirmados_de_amanha_com_telefone(self, mock_lote):
+        """Testa a seleção dos agendamentos e o texto do lembrete"""
+        mock_lote.side_effect = lambda mensagens: [
+            {"sucesso": True, "erro": None, "id": "1"} for _ in mensagens
+        ]
+
+        totais = enviar_lembretes()
+
+        self.assertEqual(totais, {"enviados": 2, "falhas": 0})
+        (mensagens,), _ = mock_lote.call_args
+        self.assertEqual(
+            [telefone for telefone, _ in mensagens],
+            [
+                "11911111111",
+                "11922222222",
+            ],
+        )
+        self.assertIn("Ana", mensagens[0][1])
+        self.assertIn("Corte", mensagens[0][1])
+        self.assertIn(self.amanha.strftime("%d/%m"), mensagens[0][1])
+        self.assertIn("09:00", mensagens[0][1])
+        self.assertEqual(
+            set(
+                MensagemSMS.objects.filter(
+                    tipo="lembrete", status="enviado"
+                ).values_list("agendamento", flat=True)
+            ),
+            {self.lembrete_ana.pk, self.lembrete_bruno.pk},
+        )
+
+    @patch("agendamentos.smsdev_service.smsdev_service.enviar_lote")
+    def test_nova_execucao_nao_reenvia(self, mock_lote):
+        """Testa que rodar de novo não reenvia lembretes já enviados"""
+        mock_lote.side_effect = lambda mensagens: [
+            {"sucesso": True, "erro": None, "id": "1"} for _ in mensagens
+        ]
+        enviar_lembretes()
+        mock_lote.reset_mock()
+
+        self.assertEqual(enviar_lembretes(), {"enviados": 0, "falhas": 0})
+        mock_lote.assert_not_called()
+
+    @patch("agendamentos.smsdev_service.smsdev_service.enviar_sms")
+    def test_falha_fica_na_fila_do_worker(self, mock_enviar_sms):
+        """Testa que lembretes com falha são repetidos pelo worker"""
+        from django.utils import timezone
+
+        mock_enviar_sms.return_value = {
+            "sucesso": False,
+            "erro": "Erro HTTP 503",
+            "id": None,
+        }
+
+        self.assertEqual(enviar_lembretes(), {"enviados": 0, "falhas": 2})
+        pendentes = MensagemSMS.objects.filter(tipo="lembrete", status="pendente")
+        self.assertEqual(pendentes.count(), 2)
+
+        # Uma nova execução não duplica o que já está na fila
+        self.assertEqual(enviar_lembretes(), {"enviados": 0, "falhas": 0})
+
+        mock_enviar_sms.return_value = {"sucesso": True, "erro": None, "id": "5"}
+        pendentes.update(proxima_tentativa=timezone.now())
+        self.assertEqual(processar_fila()["enviados"], 2)
+        self.assertFalse(
+            MensagemSMS.objects.filter(tipo="lembrete", status="pendente").exists()
+        )
+
+    def test_telefone_invalido_nao_volta_para_a_fila(self):
+        """Testa que um lembrete que nunca vai sair falha na primeira tentativa"""
+        from django.utils import timezone
+
+        Cliente.objects.filter(pk=self.ana.pk).update(telefone="123")
+
+        with patch.multiple(
+            smsdev_service, enabled=True, usuario="u", token="t"
+        ), patch.object(smsdev_service, "_postar") as mock_postar:
+            mock_postar.return_value = {"sucesso": True, "erro": None, "id": "7"}
+            self.assertEqual(enviar_lembretes(), {"enviados": 1, "falhas": 1})
+
+        mensagem = MensagemSMS.objects.get(agendamento=self.lembrete_ana)
+        self.assertEqual(mensagem.status, "falhou")
+        self.assertEqual(mensagem.tentativas, 1)
+        self.assertEqual(mensagem.erro, "Número de telefone inválido")
+        mock_postar.assert_called_once()
+        # O worker não tenta de novo, mesmo com o horário vencido
+        MensagemSMS.objects.update(proxima_tentativa=timezone.now())
+        self.assertEqual(sum(processar_fila().values()), 0)
+
+    @patch("agendamentos.smsdev_service.smsdev_service.enviar_lote")
+    def test_registra_antes_de_enviar(self, mock_lote):
+        """Testa que uma queda no envio não faz a próxima execução reenviar"""
+        from django.utils import timezone
+
+        mock_lote.side_effect = RuntimeError("Processo interrompido")
+
+        with self.assertRaises(RuntimeError):
+            enviar_lembretes()
+
+        # Os lembretes já estavam gravados e reservados antes do envio
+        pendentes = MensagemSMS.objects.filter(tipo="lembrete", status="pendente")
+        self.assertEqual(pendentes.count(), 2)
+        self.assertFalse(pendentes.filter(proxima_tentativa__lte=timezone.now()))
+
+        mock_lote.reset_mock(side_effect=True)
+        self.assertEqual(enviar_lembretes(), {"enviados": 0, "falhas": 0})
+        mock_lote.assert_not_called()
+
+    @patch("agendamentos.smsdev_service.smsdev_service.enviar_lote")
+    def test_execucoes_simultaneas_nao_duplicam(self, mock_lote):
+        """Testa uma execução que leu a agenda antes de a outra gravar"""
+        mock_lote.side_effect = lambda mensagens: [
+            {"sucesso": True, "erro": None, "id": "1"} for _ in mensagens
+        ]
+        lidos = [
+            agendamento.pk for agendamento in agendamentos_para_lembrete(self.amanha)
+        ]
+        self.assertEqual(enviar_lembretes(), {"enviados": 2, "falhas": 0})
+        mock_lote.reset_mock()
+
+        # A segunda execução ainda enxerga os agendamentos como sem lembrete
+        atrasada = Agendamento.objects.filter(pk__in=lidos).select_related(
+            "cliente", "servico"
+        )
+        with patch(
+            "agendamentos.lembretes.agendamentos_para_lembrete", return_value=atrasada
+        ):
+            self.assertEqual(enviar_lembretes(), {"enviados": 0, "falhas": 0})
+
+        mock_lote.assert_not_called()
+        self.assertEqual(MensagemSMS.objects.filter(tipo="lembrete").count(), 2)
+
+    def test_um_lembrete_ativo_por_agendamento(self):
+        """Testa a restrição única dos lembretes na fila ou enviados"""
+        campos = {
+            "agendamento": self.lembrete_ana,
+            "tipo": "lembrete",
+            "telefone": self.ana.telefone,
+            "mensagem": "Lembrete",
+        }
+        primeiro = MensagemSMS.objects.create(**campos)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MensagemSMS.objects.create(**campos)
+
+        # Depois de descartado, um novo lembrete pode entrar na fila
+        primeiro.status = "falhou"
+        primeiro.save()
+        MensagemSMS.objects.create(**campos)
+        # "Barbeiro a caminho" pode ser enviado mais de uma vez
+        MensagemSMS.objects.create(**{**campos, "tipo": "a_caminho"})
+        MensagemSMS.objects.create(**{**campos, "tipo": "a_caminho"})
+
+    @patch("agendamentos.smsdev_service.smsdev_service.enviar_lote")
+    def test_lotes_do_tamanho_pedido(self, mock_lote):
+        """Testa que as mensagens saem em lotes"""
+        mock_lote.side_effect = lambda mensagens: [
+            {"sucesso": True, "erro": None, "id": "1"} for _ in mensagens
+        ]
+        for i in range(3):
+            cliente = Cliente.objects.create(
+                nome=f"Cliente {i}", telefone=f"1193333333{i}"
+            )
+            self._agendar(cliente, dt_time(14, i))
+
+        enviar_lembretes(tamanho_lote=2)
+
+        tamanhos = [len(chamada.args[0]) for chamada in mock_lote.call_args_list]
+        self.assertEqual(tamanhos, [2, 2, 1])
+
+    @patch("agendamentos.smsdev_service.smsdev_service.enviar_lote")
+    def test_comando_enviar_lembretes(self, mock_lote):
+        """Testa o comando com data explícita"""
+        from io import StringIO
+
+        from django.core.management import call_command
+
+        mock_lote.side_effect = lambda mensagens: [
+            {"sucesso": True, "erro": None, "id": "1"} for _ in mensagens
+        ]
+
+        saida = StringIO()
+        call_command(
+            "enviar_lembretes", "--data", self.amanha.isoformat(), stdout=saida
+        )
+
+        self.assertIn("Lembretes enviados: 2", saida.getvalue())
+
+
 @pytest.mark.api
 class SMSValidationTest(TestCase):
     """Testa validações específicas do SMS"""
@@ -356,7 +908,7 @@ class SMSValidationTest(TestCase):
         """Testa SMS com mensagem muito longa"""
         mensagem_longa = "A" * 1000  # Mensagem muito longa
 
-        with patch("agendamentos.smsdev_service.requests.post") as mock_post:
+        with patch("agendamentos.smsdev_service.requests.Session.post") as mock_post:
             mock_response = Mock()
             mock_response.status_code = 200
             mock_response.json.return_value = {
@@ -386,7 +938,7 @@ class SMSValidationTest(TestCase):
             "Olá! Seu agendamento está confirmado para amanhã às 14:30. 🎉"
         )
 
-        with patch("agendamentos.smsdev_service.requests.post") as mock_post:
+        with patch("agendamentos.smsdev_service.requests.Session.post") as mock_post:
             mock_response = Mock()
             mock_response.status_code = 200
             mock_response.json.return_value = {"situacao": "OK"}
@@ -402,7 +954,7 @@ class SMSValidationTest(TestCase):
         """Testa encoding UTF-8 em mensagens"""
         mensagem_utf8 = "Olá João! Seu agendamento está confirmado para amanhã às 14:30. Ação especial!"
 
-        with patch("agendamentos.smsdev_service.requests.post") as mock_post:
+        with patch("agendamentos.smsdev_service.requests.Session.post") as mock_post:
             mock_response = Mock()
             mock_response.status_code = 200
             mock_response.json.return_value = {"situacao": "OK"}
@@ -426,7 +978,7 @@ class SMSMonitoringTest(TestCase):
         """Configuração inicial"""
         self.cliente = Cliente.objects.create(nome="Ana Silva", telefone="11966666666")
 
-    @patch("agendamentos.smsdev_service.requests.post")
+    @patch("agendamentos.smsdev_service.requests.Session.post")
     def test_log_sucesso_sms(self, mock_post):
         """Testa log de sucesso do SMS"""
         mock_response = Mock()
@@ -446,7 +998,7 @@ class SMSMonitoringTest(TestCase):
             mock_logger.info.assert_called()
             self.assertTrue(resultado["sucesso"])
 
-    @patch("agendamentos.smsdev_service.requests.post")
+    @patch("agendamentos.smsdev_service.requests.Session.post")
     def test_log_erro_sms(self, mock_post):
         """Testa log de erro do SMS"""
         mock_response = Mock()
@@ -474,7 +1026,7 @@ class SMSMonitoringTest(TestCase):
         # Simular múltiplos envios
         resultados = []
 
-        with patch("agendamentos.smsdev_service.requests.post") as mock_post:
+        with patch("agendamentos.smsdev_service.requests.Session.post") as mock_post:
             # Alternar entre sucesso e erro
             responses = [
                 Mock(status_code=200, json=lambda: {"situacao": "OK"}),
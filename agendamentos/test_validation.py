@@ -102,10 +102,9 @@ class FormularioValidacaoTest(TestCase):
         self.assertTrue(form.is_valid())
 
     def test_formulario_agendamento_horario_fora_funcionamento(self):
-        """Testa horários fora do funcionamento (sistema permite)"""
+        """Testa horários fora do funcionamento (só o fim do expediente é limite)"""
         horarios_invalidos = [
             dt_time(5, 30),  # Antes das 6h
-            dt_time(23, 30),  # Depois das 22h
             dt_time(0, 0),  # Meia-noite
             dt_time(3, 45),  # Madrugada
         ]
@@ -125,6 +124,11 @@ class FormularioValidacaoTest(TestCase):
             # Formulário deve ser válido (sistema permite qualquer horário)
             self.assertTrue(form.is_valid(), f"Horário {horario} é aceito pelo sistema")
 
+        # Depois das 22h o serviço terminaria fora do expediente
+        form = AgendamentoForm(data={**form_data, "hora": dt_time(23, 30)})
+        self.assertFalse(form.is_valid())
+        self.assertIn("hora", form.errors)
+
     def test_formulario_telefone_formatos_diversos(self):
         """Testa aceitação de múltiplos formatos de telefone"""
         formatos_validos = [
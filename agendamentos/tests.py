@@ -1,14 +1,39 @@
+import json
+import multiprocessing
+import os
+import tempfile
 from datetime import date, time
 from decimal import Decimal
 from unittest.mock import Mock, patch
 
 from django.contrib.auth.models import User
-from django.db import IntegrityError
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from .forms import AgendamentoForm, ClienteForm, PrevisaoChegadaForm, ServicoForm
-from .models import Agendamento, Cliente, Servico
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from . import (
+    cache_consultas,
+    consultas_lentas,
+    eventos,
+    instrumentacao,
+    metricas,
+    views,
+)
+from .forms import (
+    MENSAGEM_FIM_EXPEDIENTE,
+    AgendamentoForm,
+    ClienteForm,
+    PrevisaoChegadaForm,
+    ServicoForm,
+)
+from .models import Agendamento, Cliente, MensagemSMS, ResumoDiario, Servico
+from .relatorios import reconstruir_resumo
 from .smsdev_service import SMSDevService
 
 
@@ -53,6 +78,19 @@ class ClienteModelTest(TestCase):
         cliente = Cliente.objects.create(nome="Teste")
         self.assertIsNotNone(cliente.nome)
 
+    def test_nome_busca_sem_acentos(self):
+        """Testa que o nome de busca é gravado sem acentos e em minúsculas"""
+        cliente = Cliente.objects.create(nome="  JOÃO  Conceição ")
+        self.assertEqual(cliente.nome_busca, "joao conceicao")
+
+        cliente.nome = "Ângela"
+        cliente.save(update_fields=["nome"])
+        cliente.refresh_from_db()
+        self.assertEqual(cliente.nome_busca, "angela")
+
+        Cliente.objects.bulk_create([Cliente(nome="Éder")])
+        self.assertEqual(Cliente.objects.get(nome="Éder").nome_busca, "eder")
+
 
 class ServicoModelTest(TestCase):
     """Testes para o modelo Servico"""
@@ -209,6 +247,66 @@ class AgendamentoModelTest(TestCase):
         expected_str = "João Silva - Corte Masculino em 2024-01-15"
         self.assertEqual(str(agendamento), expected_str)
 
+    def test_agendamento_congela_preco_do_servico(self):
+        """Testa que o valor do agendamento não muda com o preço do serviço"""
+        agendamento = Agendamento.objects.create(
+            cliente=self.cliente,
+            servico=self.servico,
+            data=date(2024, 1, 15),
+            hora=time(14, 30),
+        )
+        self.assertEqual(agendamento.valor, Decimal("25.00"))
+
+        self.servico.preco = Decimal("35.00")
+        self.servico.save()
+        agendamento.refresh_from_db()
+
+        self.assertEqual(agendamento.valor, Decimal("25.00"))
+
+    def test_bulk_create_preenche_valor(self):
+        """Testa que bulk_create preenche o valor com o preço do serviço"""
+        Agendamento.objects.bulk_create(
+            [
+                Agendamento(
+                    servico=self.servico, data=date(2024, 1, 15), hora=time(9, 0)
+                ),
+                Agendamento(
+                    servico=self.servico,
+                    data=date(2024, 1, 15),
+                    hora=time(10, 0),
+                    valor=Decimal("20.00"),
+                ),
+            ]
+        )
+
+        valores = sorted(Agendamento.objects.values_list("valor", flat=True))
+        self.assertEqual(valores, [Decimal("20.00"), Decimal("25.00")])
+
+    def test_form_atualiza_valor_ao_trocar_servico(self):
+        """Testa que trocar o serviço na edição registra o novo preço"""
+        agendamento = Agendamento.objects.create(
+            cliente=self.cliente,
+            servico=self.servico,
+            data=date(2024, 1, 15),
+            hora=time(14, 30),
+        )
+        barba = Servico.objects.create(nome="Barba", duracao=15, preco=Decimal("15"))
+
+        form = AgendamentoForm(
+            data={
+                "cliente": self.cliente.id,
+                "servico": barba.id,
+                "data": "2024-01-15",
+                "hora": "14:30",
+            },
+            instance=agendamento,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        agendamento.refresh_from_db()
+
+        self.assertEqual(agendamento.valor, Decimal("15.00"))
+
 
 class ClienteFormTest(TestCase):
     """Testes para o formulário ClienteForm"""
@@ -349,6 +447,38 @@ class AgendamentoFormTest(TestCase):
         self.assertIn(self.servico, servicos_disponiveis)
         self.assertNotIn(servico_inativo, servicos_disponiveis)
 
+    def test_opcoes_de_hora_so_com_inicios_livres(self):
+        """Testa que o select de hora só oferece inícios em que o serviço cabe"""
+        dia = date(2024, 1, 15)
+        Agendamento.objects.create(
+            cliente=self.cliente, servico=self.servico, data=dia, hora=time(10, 0)
+        )
+
+        sem_data = str(AgendamentoForm()["hora"].as_widget())
+        self.assertIn('value="10:00"', sem_data)
+        self.assertIn('value="21:50"', sem_data)
+
+        form = AgendamentoForm(initial={"data": dia, "servico": self.servico.pk})
+        opcoes = str(form["hora"].as_widget())
+        self.assertIn('value="09:30"', opcoes)
+        self.assertNotIn('value="09:40"', opcoes)
+        self.assertNotIn('value="10:00"', opcoes)
+        self.assertIn('value="10:30"', opcoes)
+        self.assertIn('value="21:30"', opcoes)
+        self.assertNotIn('value="21:40"', opcoes)
+
+    def test_servico_que_termina_depois_do_expediente(self):
+        """Testa que o serviço precisa terminar até o fim do expediente"""
+        longo = Servico.objects.create(nome="Pacote", duracao=45, preco=Decimal("60"))
+        dados = {"cliente": self.cliente.id, "servico": longo.id, "data": "2024-01-15"}
+
+        form = AgendamentoForm(data={**dados, "hora": "21:50"})
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors["hora"], [MENSAGEM_FIM_EXPEDIENTE])
+
+        self.assertTrue(AgendamentoForm(data={**dados, "hora": "21:10"}).is_valid())
+        self.assertFalse(AgendamentoForm(data={**dados, "hora": "21:20"}).is_valid())
+
 
 class PrevisaoChegadaFormTest(TestCase):
     """Testes para o formulário PrevisaoChegadaForm"""
@@ -527,6 +657,87 @@ class ViewsTest(TestCase):
         self.assertEqual(servico_criado.duracao, 20)
         self.assertEqual(servico_criado.preco, Decimal("18.00"))
 
+    def test_autocomplete_clientes_requer_login(self):
+        """Testa que o autocomplete de clientes requer login"""
+        response = self.client.get(reverse("autocomplete_clientes"), {"q": "jo"})
+        self.assertEqual(response.status_code, 302)
+
+    def test_autocomplete_clientes_por_nome_sem_acento(self):
+        """Testa busca por prefixo do nome ignorando acentos e caixa"""
+        Cliente.objects.create(nome="Joana Prado", telefone="11777777777")
+        Cliente.objects.create(nome="Mário João", telefone="11666666666")
+        self.client.login(username="testuser", password="testpass123")
+
+        response = self.client.get(reverse("autocomplete_clientes"), {"q": "JOA"})
+
+        self.assertEqual(response.status_code, 200)
+        nomes = [cliente["nome"] for cliente in response.json()["clientes"]]
+        self.assertEqual(nomes, ["Joana Prado", "João Silva"])
+
+    def test_autocomplete_clientes_por_telefone(self):
+        """Testa busca pelo início do telefone"""
+        self.client.login(username="testuser", password="testpass123")
+
+        response = self.client.get(reverse("autocomplete_clientes"), {"q": "11999"})
+
+        self.assertEqual(
+            response.json()["clientes"],
+            [{"id": self.cliente.id, "nome": "João Silva", "telefone": "11999999999"}],
+        )
+
+    def test_autocomplete_clientes_por_telefone_formatado(self):
+        """Testa que telefones gravados com máscara ou +55 casam com os dígitos"""
+        com_mascara = Cliente.objects.create(nome="Ana", telefone="(21) 98888-7777")
+        com_pais = Cliente.objects.create(nome="Bia", telefone="+55 21 97777-6666")
+        self.client.login(username="testuser", password="testpass123")
+        url = reverse("autocomplete_clientes")
+
+        for termo in ("2198", "(21) 98", "+55 21 98"):
+            ids = [
+                c["id"] for c in self.client.get(url, {"q": termo}).json()["clientes"]
+            ]
+            self.assertEqual(ids, [com_mascara.id], termo)
+        ids = [c["id"] for c in self.client.get(url, {"q": "21"}).json()["clientes"]]
+        self.assertEqual(ids, [com_mascara.id, com_pais.id])
+
+        com_pais.telefone = "21 96666-5555"
+        com_pais.save(update_fields=["telefone"])
+        com_pais.refresh_from_db()
+        self.assertEqual(com_pais.telefone_busca, "21966665555")
+
+    def test_autocomplete_clientes_limite(self):
+        """Testa que o autocomplete retorna no máximo o limite pedido"""
+        Cliente.objects.bulk_create([Cliente(nome=f"Joca {i:02d}") for i in range(30)])
+        self.client.login(username="testuser", password="testpass123")
+        url = reverse("autocomplete_clientes")
+
+        self.assertEqual(len(self.client.get(url, {"q": "jo"}).json()["clientes"]), 10)
+        resposta = self.client.get(url, {"q": "jo", "limite": "3"}).json()
+        self.assertEqual(len(resposta["clientes"]), 3)
+        resposta = self.client.get(url, {"q": "", "limite": "x"}).json()
+        self.assertEqual(resposta["clientes"], [])
+
+    def test_agendar_nao_embute_lista_de_clientes(self):
+        """Testa que a tela de agendamento não renderiza todos os clientes"""
+        Cliente.objects.create(nome="Cliente Escondido", telefone="11555555555")
+        self.client.login(username="testuser", password="testpass123")
+
+        response = self.client.get(reverse("agendar"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, "Cliente Escondido")
+        self.assertContains(response, reverse("autocomplete_clientes"))
+
+    def test_editar_agendamento_mostra_cliente_selecionado(self):
+        """Testa que a edição já traz o nome do cliente no seletor"""
+        self.client.login(username="testuser", password="testpass123")
+
+        response = self.client.get(
+            reverse("editar_agendamento", args=[self.agendamento.pk])
+        )
+
+        self.assertContains(response, 'value="João Silva"')
+
 
 class SMSDevServiceTest(TestCase):
     """Testes para o serviço SMSDev"""
@@ -563,7 +774,7 @@ class SMSDevServiceTest(TestCase):
         telefone_limpo = self.sms_service._limpar_telefone("")
         self.assertIsNone(telefone_limpo)
 
-    @patch("agendamentos.smsdev_service.requests.post")
+    @patch("agendamentos.smsdev_service.requests.Session.post")
     def test_enviar_sms_sucesso(self, mock_post):
         """Testa envio de SMS com sucesso"""
         # Mock da resposta da API
@@ -590,7 +801,7 @@ class SMSDevServiceTest(TestCase):
         self.assertEqual(resultado["situacao"], "OK")
         mock_post.assert_called_once()
 
-    @patch("agendamentos.smsdev_service.requests.post")
+    @patch("agendamentos.smsdev_service.requests.Session.post")
     def test_enviar_sms_erro_api(self, mock_post):
         """Testa envio de SMS com erro da API"""
         # Mock da resposta de erro da API
@@ -647,7 +858,7 @@ class SMSDevServiceTest(TestCase):
         self.assertEqual(resultado["erro"], "Número de telefone inválido")
         self.assertIsNone(resultado["id"])
 
-    @patch("agendamentos.smsdev_service.requests.post")
+    @patch("agendamentos.smsdev_service.requests.Session.post")
     def test_enviar_sms_excecao_requests(self, mock_post):
         """Testa envio de SMS com exceção na requisição"""
         # Mock de exceção na requisição
@@ -664,3 +875,1724 @@ class SMSDevServiceTest(TestCase):
         self.assertFalse(resultado["sucesso"])
         self.assertIn("erro", resultado)
         self.assertIsNone(resultado["id"])
+
+
+class RelatoriosTest(TestCase):
+    """Testes para as agregações financeiras do módulo relatorios"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(nome="João Silva", telefone="11999999999")
+        self.corte = Servico.objects.create(
+            nome="Corte", duracao=30, preco=Decimal("25.00")
+        )
+        self.barba = Servico.objects.create(
+            nome="Barba", duracao=15, preco=Decimal("15.00")
+        )
+        self.dia = date(2025, 3, 15)
+
+        # Mesmo dia: um pago e um pendente
+        self._criar(self.dia, self.corte, "pago")
+        self._criar(self.dia, self.barba, "pendente")
+        # Mesmo mês, outro dia
+        self._criar(date(2025, 3, 2), self.corte, "pago")
+        # Mesmo ano, outro mês
+        self._criar(date(2025, 7, 10), self.barba, "pendente")
+        # Outro ano (não entra em nenhum período)
+        self._criar(date(2024, 3, 15), self.corte, "pago")
+
+    def _criar(self, data, servico, status_pagamento):
+        return Agendamento.objects.create(
+            cliente=self.cliente,
+            servico=servico,
+            data=data,
+            hora=time(10, 0),
+            status_pagamento=status_pagamento,
+        )
+
+    def test_resumo_financeiro_separa_periodos(self):
+        """Testa totais do dia, mês e ano calculados de uma vez"""
+        from .relatorios import resumo_financeiro
+
+        resumo = resumo_financeiro(self.dia)
+
+        self.assertEqual(resumo["dia"]["quantidade"], 2)
+        self.assertEqual(resumo["dia"]["valor_pago"], Decimal("25.00"))
+        self.assertEqual(resumo["dia"]["valor_pendente"], Decimal("15.00"))
+
+        self.assertEqual(resumo["mes"]["quantidade"], 3)
+        self.assertEqual(resumo["mes"]["pagos"], 2)
+        self.assertEqual(resumo["mes"]["valor_total"], Decimal("65.00"))
+
+        self.assertEqual(resumo["ano"]["quantidade"], 4)
+        self.assertEqual(resumo["ano"]["pendentes"], 2)
+        self.assertEqual(resumo["ano"]["valor_pendente"], Decimal("30.00"))
+
+    def test_resumo_financeiro_usa_uma_query(self):
+        """Testa que os três períodos são resolvidos em uma única query"""
+        from .relatorios import resumo_financeiro
+
+        with self.assertNumQueries(1):
+            resumo_financeiro(self.dia)
+
+    def test_resumo_periodo_vazio_retorna_zero(self):
+        """Testa período sem agendamentos"""
+        from .relatorios import resumo_periodo, taxa_recebimento
+
+        totais = resumo_periodo(date(2030, 1, 1), date(2030, 2, 1))
+
+        self.assertEqual(totais["quantidade"], 0)
+        self.assertEqual(totais["valor_total"], Decimal("0.00"))
+        self.assertEqual(taxa_recebimento(totais), 0)
+
+    def test_view_financeiro_usa_totais_agregados(self):
+        """Testa que a view financeiro expõe os totais agregados"""
+        User.objects.create_user(username="testuser", password="testpass123")
+        self.client.login(username="testuser", password="testpass123")
+
+        response = self.client.get(
+            reverse("financeiro"), {"data": self.dia.isoformat()}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["valor_total"], Decimal("40.00"))
+        self.assertEqual(response.context["recebido_mes"], Decimal("50.00"))
+        self.assertEqual(response.context["agendamentos_ano"], 4)
+
+
+class DisponibilidadeTest(TestCase):
+    """Testes para o cálculo de horários livres (disponibilidade.py)"""
+
+    def setUp(self):
+        User.objects.create_user(username="testuser", password="testpass123")
+        self.client.login(username="testuser", password="testpass123")
+        self.cliente = Cliente.objects.create(nome="João Silva", telefone="11999999999")
+        self.corte = Servico.objects.create(
+            nome="Corte", duracao=30, preco=Decimal("25.00")
+        )
+        self.combo = Servico.objects.create(
+            nome="Corte e Barba", duracao=50, preco=Decimal("40.00")
+        )
+        self.dia = date(2025, 3, 15)
+
+    def _criar(self, hora, servico=None, status="confirmado"):
+        return Agendamento.objects.create(
+            cliente=self.cliente,
+            servico=servico or self.corte,
+            data=self.dia,
+            hora=hora,
+            status=status,
+        )
+
+    def test_unir_intervalos(self):
+        """Testa união de intervalos sobrepostos e encostados"""
+        from .disponibilidade import unir_intervalos
+
+        self.assertEqual(
+            unir_intervalos([(600, 630), (540, 570), (570, 580), (620, 700), (5, 5)]),
+            [(540, 580), (600, 700)],
+        )
+
+    def test_intervalos_livres_dentro_do_expediente(self):
+        """Testa complemento dos intervalos ocupados dentro do expediente"""
+        from .disponibilidade import intervalos_livres
+
+        self.assertEqual(
+            intervalos_livres([(300, 400), (600, 660), (1300, 1500)]),
+            [(400, 600), (660, 1300)],
+        )
+        self.assertEqual(intervalos_livres([]), [(360, 1320)])
+
+    def test_inicios_respeitam_duracao_do_servico(self):
+        """Testa que só sobram inícios em que o serviço cabe inteiro"""
+        from .disponibilidade import horarios_disponiveis
+
+        self._criar(time(10, 0))  # ocupa 10:00-10:30
+        self._criar(time(11, 0), self.combo)  # ocupa 11:00-11:50
+
+        horarios = horarios_disponiveis(self.dia, 30)["horarios"]
+
+        self.assertIn(time(9, 30), horarios)
+        self.assertNotIn(time(9, 40), horarios)  # terminaria 10:10
+        self.assertNotIn(time(10, 20), horarios)
+        self.assertIn(time(10, 30), horarios)  # termina 11:00, encostado
+        self.assertNotIn(time(10, 40), horarios)
+        self.assertIn(time(11, 50), horarios)
+        self.assertIn(time(21, 30), horarios)
+        self.assertNotIn(time(21, 40), horarios)  # passaria das 22h
+
+        # Um serviço de 50 minutos não cabe entre 10:30 e 11:00
+        self.assertNotIn(time(10, 30), horarios_disponiveis(self.dia, 50)["horarios"])
+
+    def test_cancelados_nao_ocupam_agenda(self):
+        """Testa que agendamentos cancelados liberam o horário"""
+        from .disponibilidade import horarios_disponiveis
+
+        self._criar(time(10, 0), status="cancelado")
+
+        self.assertIn(time(10, 0), horarios_disponiveis(self.dia, 30)["horarios"])
+
+    def test_horarios_disponiveis_usa_uma_query(self):
+        """Testa que o dia inteiro é carregado em uma única query"""
+        from .disponibilidade import horarios_disponiveis
+
+        for hora in range(8, 18):
+            self._criar(time(hora, 0))
+
+        with self.assertNumQueries(1):
+            horarios_disponiveis(self.dia, 30)
+
+    def test_form_rejeita_horario_sobreposto(self):
+        """Testa que o formulário não aceita dois agendamentos sobrepostos"""
+        self._criar(time(10, 0), self.combo)  # ocupa 10:00-10:50
+
+        form = AgendamentoForm(
+            data={
+                "cliente": self.cliente.pk,
+                "servico": self.corte.pk,
+                "data": self.dia.isoformat(),
+                "hora": "10:30",
+            }
+        )
+
+        self.assertFalse(form.is_valid())
+        self.assertIn("hora", form.errors)
+
+    def test_form_edicao_ignora_o_proprio_agendamento(self):
+        """Testa que editar um agendamento não conflita com ele mesmo"""
+        agendamento = self._criar(time(10, 0))
+
+        form = AgendamentoForm(
+            data={
+                "cliente": self.cliente.pk,
+                "servico": self.combo.pk,
+                "data": self.dia.isoformat(),
+                "hora": "10:10",
+            },
+            instance=agendamento,
+        )
+
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIn("10:00", form.horarios_disponiveis())
+
+    def test_form_save_verifica_conflito_novamente(self):
+        """Testa que a gravação detecta um horário ocupado após a validação"""
+        from django.core.exceptions import ValidationError
+
+        form = AgendamentoForm(
+            data={
+                "cliente": self.cliente.pk,
+                "servico": self.corte.pk,
+                "data": self.dia.isoformat(),
+                "hora": "10:00",
+            }
+        )
+        self.assertTrue(form.is_valid())
+
+        # Outra requisição grava no mesmo período entre validar e salvar
+        self._criar(time(10, 10))
+
+        with self.assertRaises(ValidationError):
+            form.save()
+        self.assertEqual(Agendamento.objects.filter(data=self.dia).count(), 1)
+
+    def test_agendar_horario_ocupado_mostra_erro(self):
+        """Testa que a view não grava um agendamento sobreposto"""
+        self._criar(time(10, 0))
+
+        response = self.client.post(
+            reverse("agendar"),
+            {
+                "cliente": self.cliente.pk,
+                "servico": self.corte.pk,
+                "data": self.dia.isoformat(),
+                "hora": "10:20",
+            },
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("hora", response.context["form"].errors)
+        self.assertEqual(Agendamento.objects.filter(data=self.dia).count(), 1)
+
+    def test_proximos_horarios_pula_dias_lotados(self):
+        """Testa busca do próximo horário livre atravessando dias"""
+        from datetime import timedelta
+
+        from .disponibilidade import proximos_horarios
+
+        # Dia inteiro ocupado (6h às 22h) e o dia seguinte livre até 9h
+        for minutos in range(6 * 60, 22 * 60, 50):
+            self._criar(time(minutos // 60, minutos % 60), self.combo)
+        amanha = self.dia + timedelta(days=1)
+        Agendamento.objects.create(
+            cliente=self.cliente,
+            servico=self.combo,
+            data=amanha,
+            hora=time(6, 0),
+        )
+
+        with self.assertNumQueries(1):
+            horarios = proximos_horarios(45, self.dia, quantidade=3)
+
+        self.assertEqual(
+            horarios,
+            [(amanha, time(6, 50)), (amanha, time(7, 0)), (amanha, time(7, 10))],
+        )
+
+    def test_proximos_horarios_a_partir_de_agora(self):
+        """Testa que no primeiro dia os horários passados são ignorados"""
+        from .disponibilidade import proximos_horarios
+
+        horarios = proximos_horarios(
+            30, self.dia, quantidade=1, a_partir_de=time(14, 5)
+        )
+        self.assertEqual(horarios, [(self.dia, time(14, 10))])
+
+        horarios = proximos_horarios(
+            30, self.dia, quantidade=1, a_partir_de=time(23, 0)
+        )
+        self.assertEqual(horarios[0][0], date(2025, 3, 16))
+
+    def test_endpoint_proximos_horarios(self):
+        """Testa o JSON dos próximos horários livres de um serviço"""
+        self._criar(time(6, 0), self.combo)
+
+        response = self.client.get(
+            reverse("proximos_horarios_livres"),
+            {"servico": self.corte.pk, "data": self.dia.isoformat(), "quantidade": 2},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["horarios"],
+            [
+                {"data": "2025-03-15", "hora": "06:50"},
+                {"data": "2025-03-15", "hora": "07:00"},
+            ],
+        )
+        self.assertEqual(
+            self.client.get(reverse("proximos_horarios_livres")).status_code, 404
+        )
+
+    def test_endpoint_horarios_livres(self):
+        """Testa o JSON de horários livres de uma data"""
+        self._criar(time(6, 0), self.combo)  # ocupa 06:00-06:50
+
+        response = self.client.get(
+            reverse("horarios_livres"),
+            {"data": self.dia.isoformat(), "servico": self.corte.pk},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        self.assertEqual(dados["duracao"], 30)
+        self.assertEqual(dados["horarios"][0], "06:50")
+        self.assertEqual(dados["horarios"][-1], "21:30")
+        self.assertEqual(dados["livres"], [{"inicio": "06:50", "fim": "22:00"}])
+
+    def test_endpoint_horarios_livres_parametros_invalidos(self):
+        """Testa respostas de erro do endpoint de horários livres"""
+        url = reverse("horarios_livres")
+
+        self.assertEqual(self.client.get(url, {"data": "amanhã"}).status_code, 400)
+        self.assertEqual(
+            self.client.get(
+                url, {"data": self.dia.isoformat(), "servico": 9999}
+            ).status_code,
+            404,
+        )
+
+
+class AgendamentosDoDiaTest(TestCase):
+    """Testes para o JSON de agendamentos de um dia do calendário mensal"""
+
+    def setUp(self):
+        User.objects.create_user(username="testuser", password="testpass123")
+        self.client.login(username="testuser", password="testpass123")
+        self.cliente = Cliente.objects.create(nome="João Silva", telefone="11999999999")
+        self.servico = Servico.objects.create(
+            nome="Corte", duracao=30, preco=Decimal("25.00")
+        )
+        self.dia = date(2025, 3, 15)
+        self.agendamento = Agendamento.objects.create(
+            cliente=self.cliente, servico=self.servico, data=self.dia, hora=time(10, 0)
+        )
+        self.url = reverse("agendamentos_do_dia")
+
+    def _get(self, **headers):
+        return self.client.get(self.url, {"data": self.dia.isoformat()}, **headers)
+
+    def test_retorna_agendamentos_do_dia(self):
+        """Testa o conteúdo do JSON de um dia"""
+        response = self._get()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["agendamentos"],
+            [
+                {
+                    "id": self.agendamento.pk,
+                    "hora": "10:00",
+                    "cliente": "João Silva",
+                    "servico": "Corte",
+                    "status": "confirmado",
+                    "observacoes": "",
+                    "previsao_chegada": None,
+                }
+            ],
+        )
+        self.assertIn("ETag", response)
+        self.assertIn("no-cache", response["Cache-Control"])
+
+    def test_etag_igual_retorna_304(self):
+        """Testa que uma revisita sem mudanças recebe 304"""
+        etag = self._get()["ETag"]
+
+        response = self._get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_alteracao_e_exclusao_mudam_etag(self):
+        """Testa que editar ou excluir um agendamento invalida o cache"""
+        outro = Agendamento.objects.create(
+            cliente=self.cliente, servico=self.servico, data=self.dia, hora=time(11, 0)
+        )
+        etag = self._get()["ETag"]
+
+        outro.delete()
+        self.assertEqual(self._get(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+        # Duas edições seguidas, no mesmo segundo
+        for status in ("concluido", "cancelado"):
+            etag = self._get()["ETag"]
+            self.agendamento.status = status
+            self.agendamento.save()
+            response = self._get(HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["agendamentos"][0]["status"], status)
+
+    def test_cliente_e_servico_mudam_etag(self):
+        """Testa que renomear cliente ou serviço invalida o JSON do dia"""
+        for objeto in (self.cliente, self.servico):
+            with self.subTest(modelo=type(objeto).__name__):
+                etag = self._get()["ETag"]
+                objeto.nome = f"{objeto.nome} Novo"
+                objeto.save()
+
+                response = self._get(HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("Novo", str(response.json()["agendamentos"]))
+
+    def test_304_sem_consultar_agendamentos(self):
+        """Testa que a revalidação não lê os agendamentos do banco"""
+        etag = self._get()["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self._get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(
+            [
+                query
+                for query in queries.captured_queries
+                if "agendamentos_agendamento" in query["sql"]
+            ]
+        )
+
+    def test_data_invalida(self):
+        """Testa resposta para data inválida"""
+        response = self.client.get(self.url, {"data": "15/03/2025"})
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_calendario_mensal_mostra_contagens(self):
+        """Testa que o calendário mensal traz só as contagens por dia"""
+        response = self.client.get(
+            reverse("agendamentos_mensais"), {"mes": 3, "ano": 2025}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context["contagens_por_data"],
+            {
+                "2025-03-15": {
+                    "total": 1,
+                    "concluidos": 0,
+                    "pendentes": 1,
+                    "cancelados": 0,
+                }
+            },
+        )
+        self.assertNotContains(response, "João Silva")
+
+
+class CacheConsultasTest(TestCase):
+    """Testes para o cache das páginas e sua invalidação pelos sinais"""
+
+    def setUp(self):
+        User.objects.create_user(username="testuser", password="testpass123")
+        self.client.login(username="testuser", password="testpass123")
+        self.cliente = Cliente.objects.create(nome="João Silva", telefone="11999999999")
+        self.servico = Servico.objects.create(
+            nome="Corte", duracao=30, preco=Decimal("25.00")
+        )
+        self.dia = date(2025, 3, 15)
+        self.agendamento = Agendamento.objects.create(
+            cliente=self.cliente, servico=self.servico, data=self.dia, hora=time(10, 0)
+        )
+        cache_consultas.zerar_estatisticas()
+
+    def _painel(self, data=None):
+        data = data or self.dia
+        return self.client.get(reverse("painel_barbeiro"), {"data": data.isoformat()})
+
+    def _financeiro(self, **params):
+        return self.client.get(
+            reverse("financeiro"), {"data": self.dia.isoformat(), **params}
+        )
+
+    def test_segunda_leitura_vem_do_cache(self):
+        """Testa que a segunda requisição igual não recalcula a página"""
+        self._painel()
+        response = self._painel()
+
+        self.assertEqual(len(response.context["agendamentos"]), 1)
+        self.assertEqual(
+            cache_consultas.estatisticas()["painel"], {"acertos": 1, "faltas": 1}
+        )
+
+    def test_novo_agendamento_invalida_o_dia(self):
+        """Testa que criar um agendamento no dia aparece no painel seguinte"""
+        self._painel()
+        Agendamento.objects.create(
+            cliente=self.cliente, servico=self.servico, data=self.dia, hora=time(14, 0)
+        )
+
+        response = self._painel()
+
+        self.assertEqual(len(response.context["agendamentos"]), 2)
+        self.assertEqual(cache_consultas.estatisticas()["painel"]["acertos"], 0)
+
+    def test_outro_dia_nao_e_invalidado(self):
+        """Testa que a alteração de um dia não descarta o cache de outro"""
+        outro_dia = date(2025, 3, 20)
+        self._painel(outro_dia)
+        Agendamento.objects.create(
+            cliente=self.cliente, servico=self.servico, data=self.dia, hora=time(14, 0)
+        )
+
+        self._painel(outro_dia)
+
+        self.assertEqual(
+            cache_consultas.estatisticas()["painel"], {"acertos": 1, "faltas": 1}
+        )
+
+    def test_mudanca_de_data_invalida_os_dois_dias(self):
+        """Testa que mover o agendamento atualiza o dia antigo e o novo"""
+        novo_dia = date(2025, 3, 16)
+        self._painel()
+        self._painel(novo_dia)
+
+        self.agendamento.data = novo_dia
+        self.agendamento.save()
+
+        self.assertEqual(len(self._painel().context["agendamentos"]), 0)
+        self.assertEqual(len(self._painel(novo_dia).context["agendamentos"]), 1)
+
+    def test_exclusao_invalida_o_dia(self):
+        """Testa que excluir um agendamento atualiza painel e calendário"""
+        self._painel()
+        mensal = {"mes": 3, "ano": 2025}
+        self.client.get(reverse("agendamentos_mensais"), mensal)
+
+        self.agendamento.delete()
+
+        self.assertEqual(len(self._painel().context["agendamentos"]), 0)
+        response = self.client.get(reverse("agendamentos_mensais"), mensal)
+        self.assertEqual(response.context["total_agendamentos"], 0)
+
+    def test_edicao_de_cliente_e_servico_invalida_tudo(self):
+        """Testa que nomes alterados aparecem nas páginas em cache"""
+        self._painel()
+        self._financeiro()
+
+        self.cliente.nome = "João Souza"
+        self.cliente.save()
+        self.assertContains(self._painel(), "João Souza")
+
+        self.servico.nome = "Corte Degradê"
+        self.servico.save()
+        self.assertContains(self._financeiro(), "Corte Degradê")
+
+    def test_sms_atualiza_status_no_painel(self):
+        """Testa que o status do SMS gravado aparece no painel em cache"""
+        self._painel()
+        mensagem = MensagemSMS.objects.create(
+            agendamento=self.agendamento,
+            tipo="a_caminho",
+            telefone="11999999999",
+            mensagem="A caminho",
+        )
+        self.assertEqual(
+            self._painel().context["agendamentos"][0]["status_sms"], "pendente"
+        )
+
+        # Mensagem lida do banco, sem o agendamento carregado (como no worker)
+        mensagem = MensagemSMS.objects.get(pk=mensagem.pk)
+        mensagem.status = "enviado"
+        mensagem.save()
+        self.assertEqual(
+            self._painel().context["agendamentos"][0]["status_sms"], "enviado"
+        )
+
+    def test_financeiro_por_filtro_e_pagamento(self):
+        """Testa que cada filtro tem seu valor e o pagamento invalida o ano"""
+        self.assertEqual(
+            len(self._financeiro(filtro="pago").context["agendamentos"]), 0
+        )
+        self.assertEqual(
+            len(self._financeiro(filtro="pendente").context["agendamentos"]), 1
+        )
+
+        self.client.post(
+            reverse("alterar_status_pagamento", args=[self.agendamento.pk])
+        )
+
+        response = self._financeiro(filtro="pago")
+        self.assertEqual(len(response.context["agendamentos"]), 1)
+        self.assertEqual(response.context["valor_recebido"], Decimal("25.00"))
+        self.assertEqual(len(response.context["cortes_pagos_ano"]), 1)
+
+    def test_bulk_create_invalida_tudo(self):
+        """Testa que inserções em massa (sem sinais) invalidam o cache"""
+        self._painel()
+        Agendamento.objects.bulk_create(
+            [
+                Agendamento(
+                    cliente=self.cliente,
+                    servico=self.servico,
+                    data=self.dia,
+                    hora=time(15, 0),
+                )
+            ]
+        )
+
+        self.assertEqual(len(self._painel().context["agendamentos"]), 2)
+
+    def test_valor_calculado_durante_invalidacao_nao_e_aproveitado(self):
+        """Testa que um valor calculado antes da troca de versão é descartado"""
+        escopos = [cache_consultas.escopo_dia(self.dia)]
+
+        def calcular_e_invalidar():
+            # Outra requisição altera o dia enquanto este valor é calculado
+            cache_consultas.invalidar_datas(self.dia)
+            return "antigo"
+
+        cache_consultas.obter("teste", [self.dia], escopos, calcular_e_invalidar)
+        valor = cache_consultas.obter("teste", [self.dia], escopos, lambda: "novo")
+
+        self.assertEqual(valor, "novo")
+
+    def test_versao_descartada_invalida_o_valor(self):
+        """Testa que um valor não é aproveitado se a versão sumiu do cache"""
+        escopos = [cache_consultas.escopo_dia(self.dia)]
+        cache_consultas.obter("teste", [self.dia], escopos, lambda: "antigo")
+
+        cache.delete(cache_consultas._chave_versao(escopos[0]))
+        valor = cache_consultas.obter("teste", [self.dia], escopos, lambda: "novo")
+
+        self.assertEqual(valor, "novo")
+
+    def test_invalidar_data_em_uma_query(self):
+        """Testa que dia, mês e ano trocam de versão com uma única gravação"""
+        escopos = cache_consultas.escopos_da_data(self.dia)
+        cache_consultas.obter("teste", [self.dia], escopos, lambda: "antigo")
+        versoes = cache_consultas.versoes(escopos)
+
+        with CaptureQueriesContext(connection) as queries:
+            cache_consultas.invalidar_datas(self.dia)
+
+        self.assertEqual(len(queries), 1)
+        novas = cache_consultas.versoes(escopos)
+        # As três versões mudam; a de GERAL, não
+        self.assertTrue(all(a != b for a, b in zip(versoes[:3], novas[:3])))
+        self.assertEqual(versoes[3], novas[3])
+        valor = cache_consultas.obter("teste", [self.dia], escopos, lambda: "novo")
+        self.assertEqual(valor, "novo")
+        self.assertEqual(cache.get(cache_consultas._chave_versao(escopos[0])), novas[0])
+
+    def test_projetar_aninha_relacoes(self):
+        """Testa a projeção em dicionários com cliente e serviço aninhados"""
+        linhas = cache_consultas.projetar(
+            Agendamento.objects.all(), "id", "cliente__nome", "servico__nome"
+        )
+
+        self.assertEqual(
+            linhas,
+            [
+                {
+                    "id": self.agendamento.pk,
+                    "cliente": {"nome": "João Silva"},
+                    "servico": {"nome": "Corte"},
+                }
+            ],
+        )
+
+
+class PaginasCondicionaisTest(TestCase):
+    """Testes para ETag e 304 no painel e no financeiro"""
+
+    def setUp(self):
+        User.objects.create_user(username="testuser", password="testpass123")
+        self.client.login(username="testuser", password="testpass123")
+        self.cliente = Cliente.objects.create(nome="João Silva", telefone="11999999999")
+        self.servico = Servico.objects.create(
+            nome="Corte", duracao=30, preco=Decimal("25.00")
+        )
+        self.dia = date(2025, 3, 15)
+        self.agendamento = Agendamento.objects.create(
+            cliente=self.cliente, servico=self.servico, data=self.dia, hora=time(10, 0)
+        )
+        self.paginas = [
+            (reverse("painel_barbeiro"), {"data": self.dia.isoformat()}),
+            (reverse("financeiro"), {"data": self.dia.isoformat()}),
+        ]
+        # A primeira visita recebe o cookie CSRF, que faz parte do ETag
+        self.client.get(reverse("painel_barbeiro"))
+
+    def test_etag_igual_retorna_304(self):
+        """Testa que uma revisita sem mudanças recebe 304 sem corpo"""
+        for url, params in self.paginas:
+            with self.subTest(url=url):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn("no-cache", response["Cache-Control"])
+                self.assertIn("private", response["Cache-Control"])
+
+                revisita = self.client.get(
+                    url, params, HTTP_IF_NONE_MATCH=response["ETag"]
+                )
+
+                self.assertEqual(revisita.status_code, 304)
+                self.assertEqual(revisita.content, b"")
+
+    def test_alteracao_muda_etag(self):
+        """Testa que alterar um agendamento do período gera nova página"""
+        etags = [self.client.get(url, params)["ETag"] for url, params in self.paginas]
+
+        self.agendamento.status_pagamento = "pago"
+        self.agendamento.save()
+
+        for (url, params), etag in zip(self.paginas, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response["ETag"], etag)
+
+    def test_outro_dia_do_ano_muda_so_o_financeiro(self):
+        """Testa que o painel de um dia não muda com agendamentos de outro"""
+        painel, financeiro = [
+            self.client.get(url, params)["ETag"] for url, params in self.paginas
+        ]
+
+        Agendamento.objects.create(
+            cliente=self.cliente,
+            servico=self.servico,
+            data=date(2025, 6, 1),
+            hora=time(10, 0),
+        )
+
+        url, params = self.paginas[0]
+        self.assertEqual(
+            self.client.get(url, params, HTTP_IF_NONE_MATCH=painel).status_code, 304
+        )
+        url, params = self.paginas[1]
+        self.assertEqual(
+            self.client.get(url, params, HTTP_IF_NONE_MATCH=financeiro).status_code,
+            200,
+        )
+
+    def test_filtro_e_usuario_mudam_etag(self):
+        """Testa que filtro e usuário fazem parte do ETag"""
+        url, params = self.paginas[1]
+        etag = self.client.get(url, params)["ETag"]
+
+        self.assertNotEqual(
+            self.client.get(url, {**params, "filtro": "pago"})["ETag"], etag
+        )
+
+        User.objects.create_user(username="outro", password="testpass123")
+        self.client.login(username="outro", password="testpass123")
+        self.assertEqual(
+            self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+
+    def test_mensagem_pendente_nao_responde_304(self):
+        """Testa que uma mensagem de sucesso pendente força a renderização"""
+        url, params = self.paginas[1]
+        etag = self.client.get(url, params)["ETag"]
+
+        # Alterar o pagamento redireciona com mensagem; desfazer volta ao
+        # mesmo estado, mas a mensagem precisa aparecer
+        pagamento = reverse("alterar_status_pagamento", args=[self.agendamento.pk])
+        self.client.post(pagamento)
+        self.client.post(pagamento)
+
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+        self.assertContains(response, "PENDENTE")
+
+
+def _ler_eventos(conteudo):
+    """Converte o texto de um fluxo SSE em [(evento, dados), ...]"""
+    lidos = []
+    for bloco in conteudo.split("\n\n"):
+        campos = dict(
+            linha.split(": ", 1) for linha in bloco.splitlines() if ": " in linha
+        )
+        if "event" in campos:
+            lidos.append((campos["event"], json.loads(campos["data"])))
+    return lidos
+
+
+@override_settings(PAINEL_AO_VIVO=True)
+class EventosPainelTest(TestCase):
+    """Testes para a atualização ao vivo do painel (SSE)"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpass123"
+        )
+        self.client.login(username="testuser", password="testpass123")
+        self.cliente = Cliente.objects.create(nome="João Silva", telefone="11999999999")
+        self.servico = Servico.objects.create(
+            nome="Corte", duracao=30, preco=Decimal("25.00")
+        )
+        self.dia = date(2025, 3, 15)
+        self.agendamento = Agendamento.objects.create(
+            cliente=self.cliente, servico=self.servico, data=self.dia, hora=time(10, 0)
+        )
+        self.url = reverse("eventos_painel")
+
+    def _versao_atual(self):
+        return eventos.identificador(
+            cache_consultas.versoes([cache_consultas.escopo_dia(self.dia)])
+        )
+
+    def _fluxo(self, **params):
+        response = self.client.get(self.url, {"data": self.dia.isoformat(), **params})
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        return b"".join(response).decode()
+
+    def test_exige_login(self):
+        """Testa que o fluxo exige login"""
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+
+    def test_desligado_o_fluxo_nao_existe(self):
+        """Testa PAINEL_AO_VIVO desligado: sem fluxo e sem EventSource no painel"""
+        with override_settings(PAINEL_AO_VIVO=False):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, 404)
+            response = self.client.get(
+                reverse("painel_barbeiro"), {"data": self.dia.isoformat()}
+            )
+        self.assertNotContains(response, "data-eventos=")
+        self.assertContains(response, f'data-id="{self.agendamento.pk}"')
+
+    def test_painel_embute_versao_do_fluxo(self):
+        """Testa que o painel aponta para o fluxo com a versão que exibe"""
+        response = self.client.get(
+            reverse("painel_barbeiro"), {"data": self.dia.isoformat()}
+        )
+        self.assertContains(response, f"versao={self._versao_atual()}")
+        self.assertContains(response, f'data-id="{self.agendamento.pk}"')
+
+    def test_versao_desatualizada_recebe_dia_completo(self):
+        """Testa que um navegador sem a versão atual recebe todos os cards"""
+        conteudo = self._fluxo(versao="antiga")
+
+        self.assertTrue(conteudo.startswith(f"retry: {eventos.RECONEXAO_MS}"))
+        self.assertIn(f"id: {self._versao_atual()}", conteudo)
+        [(evento, dados)] = _ler_eventos(conteudo)
+        self.assertEqual(evento, "completo")
+        [card] = dados["alterados"]
+        self.assertEqual(card["id"], self.agendamento.pk)
+        self.assertEqual(card["hora"], "10:00")
+        self.assertIn("João Silva", card["html"])
+
+    def test_last_event_id_tem_precedencia(self):
+        """Testa que a reconexão usa o último id recebido, não o da página"""
+        conteudo = self._fluxo(versao="antiga", HTTP_LAST_EVENT_ID="")
+        self.assertEqual(_ler_eventos(conteudo)[0][0], "completo")
+
+        response = self.client.get(
+            self.url,
+            {"data": self.dia.isoformat(), "versao": "antiga"},
+            HTTP_LAST_EVENT_ID=self._versao_atual(),
+        )
+        self.assertEqual(_ler_eventos(b"".join(response).decode()), [])
+
+    def test_versao_atual_nao_envia_nada(self):
+        """Testa que sem mudanças o fluxo só envia o intervalo de reconexão"""
+        conteudo = self._fluxo(versao=self._versao_atual())
+        self.assertEqual(conteudo, f"retry: {eventos.RECONEXAO_MS}\n\n")
+
+    def test_diferencas(self):
+        """Testa a comparação de dois estados de um dia"""
+        anteriores = {1: {"id": 1, "status": "confirmado"}, 2: {"id": 2}}
+        atuais = {1: {"id": 1, "status": "concluido"}, 3: {"id": 3}}
+
+        alterados, removidos = eventos.diferencas(anteriores, atuais)
+
+        self.assertEqual(alterados, [atuais[1], atuais[3]])
+        self.assertEqual(removidos, [2])
+
+    @patch("agendamentos.eventos.INTERVALO_CONSULTA", 0.01)
+    async def test_conexao_aberta_envia_so_o_que_mudou(self):
+        """Testa que sob ASGI cada mudança chega como um delta pequeno"""
+        await self.async_client.aforce_login(self.user)
+        versao = await sync_to_async(self._versao_atual)()
+        response = await self.async_client.get(
+            self.url, {"data": self.dia.isoformat(), "versao": versao}
+        )
+        conteudo = aiter(response.streaming_content)
+
+        async def proximo_evento():
+            while True:
+                lidos = _ler_eventos((await anext(conteudo)).decode())
+                if lidos:
+                    return lidos[0]
+
+        try:
+            self.assertEqual(
+                await anext(conteudo),
+                f"retry: {eventos.RECONEXAO_MS}\n\n".encode(),
+            )
+
+            novo = await Agendamento.objects.acreate(
+                cliente=self.cliente,
+                servico=self.servico,
+                data=self.dia,
+                hora=time(9, 0),
+            )
+            evento, dados = await proximo_evento()
+            self.assertEqual(evento, "delta")
+            self.assertEqual([card["id"] for card in dados["alterados"]], [novo.pk])
+            self.assertEqual(dados["removidos"], [])
+
+            await Agendamento.objects.filter(pk=self.agendamento.pk).aupdate(
+                status="concluido"
+            )
+            # update() não dispara sinais; a invalidação é explícita
+            await sync_to_async(cache_consultas.invalidar_datas)(self.dia)
+            evento, dados = await proximo_evento()
+            [card] = dados["alterados"]
+            self.assertEqual(card["id"], self.agendamento.pk)
+            self.assertEqual(card["status"], "concluido")
+
+            pk_novo = novo.pk
+            await novo.adelete()
+            evento, dados = await proximo_evento()
+            self.assertEqual(dados, {"alterados": [], "removidos": [pk_novo]})
+        finally:
+            await conteudo.aclose()
+
+
+class AcoesRapidasTest(TestCase):
+    """Testes para as ações de status em modo XHR (UPDATE condicional)"""
+
+    def setUp(self):
+        User.objects.create_user(username="testuser", password="testpass123")
+        self.client.login(username="testuser", password="testpass123")
+        self.cliente = Cliente.objects.create(nome="João Silva", telefone="11999999999")
+        self.servico = Servico.objects.create(
+            nome="Corte", duracao=30, preco=Decimal("25.00")
+        )
+        self.dia = date(2025, 3, 15)
+        self.agendamento = Agendamento.objects.create(
+            cliente=self.cliente, servico=self.servico, data=self.dia, hora=time(10, 0)
+        )
+        self.json = {"HTTP_ACCEPT": "application/json"}
+        self.xhr = {"HTTP_X_REQUESTED_WITH": "XMLHttpRequest"}
+
+    def _resumo(self):
+        return sorted(
+            ResumoDiario.objects.filter(quantidade__gt=0).values_list(
+                "data", "status", "status_pagamento", "quantidade", "valor_total"
+            )
+        )
+
+    def assertResumoConsistente(self):
+        resumo = self._resumo()
+        reconstruir_resumo()
+        self.assertEqual(resumo, self._resumo())
+
+    def test_concluir_em_json(self):
+        """Testa que concluir responde JSON e mantém o resumo consistente"""
+        atualizado_em = self.agendamento.atualizado_em
+        url = reverse("concluir_agendamento", args=[self.agendamento.pk])
+
+        response = self.client.post(url, {"de": "confirmado"}, **self.json)
+
+        self.assertEqual(response.status_code, 200)
+        dados = response.json()
+        self.assertEqual(dados["status"], "concluido")
+        self.assertTrue(dados["alterado"])
+        self.agendamento.refresh_from_db()
+        self.assertEqual(self.agendamento.status, "concluido")
+        self.assertGreater(self.agendamento.atualizado_em, atualizado_em)
+        self.assertResumoConsistente()
+
+    def test_card_do_painel_em_xhr(self):
+        """Testa que o XHR do painel recebe só o card alterado"""
+        url = reverse("concluir_agendamento", args=[self.agendamento.pk])
+
+        response = self.client.post(url, {"de": "confirmado"}, **self.xhr)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'data-id="{self.agendamento.pk}"')
+        self.assertContains(response, "CONCLUÍDO")
+        self.assertNotContains(response, "<html")
+
+    def test_card_sai_do_update(self):
+        """Testa que o card do XHR vem do RETURNING, igual ao do painel"""
+        self.cliente.endereco = "Rua A, 10"
+        self.cliente.save()
+        MensagemSMS.objects.create(
+            agendamento=self.agendamento,
+            telefone=self.cliente.telefone,
+            mensagem="Lembrete",
+            tipo="lembrete",
+            status="enviado",
+        )
+        url = reverse("concluir_agendamento", args=[self.agendamento.pk])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {"de": "confirmado"}, **self.xhr)
+
+        tabela = Agendamento._meta.db_table
+        consultas_agendamento = [
+            query["sql"]
+            for query in queries.captured_queries
+            if f'"{tabela}"' in query["sql"].split("RETURNING")[0]
+        ]
+        self.assertEqual(len(consultas_agendamento), 1)
+        self.assertTrue(consultas_agendamento[0].startswith("UPDATE"))
+        [card] = views._cards_painel(Agendamento.objects.filter(pk=self.agendamento.pk))
+        self.assertEqual(
+            response.content.decode(),
+            render_to_string(
+                "agendamentos/card_agendamento.html",
+                {"agendamento": card},
+                response.wsgi_request,
+            ),
+        )
+
+    def test_de_igual_ao_pedido_nao_grava(self):
+        """Testa que "de" igual ao valor pedido não faz UPDATE nem invalida"""
+        self.agendamento.status = "concluido"
+        self.agendamento.save()
+        atualizado_em = self.agendamento.atualizado_em
+        escopos = [cache_consultas.escopo_dia(self.dia)]
+        versoes = cache_consultas.versoes(escopos)
+        url = reverse("concluir_agendamento", args=[self.agendamento.pk])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {"de": "concluido"}, **self.json)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()["alterado"])
+        # Sessão, usuário e a leitura do estado atual
+        self.assertEqual(len(queries), 3)
+        self.agendamento.refresh_from_db()
+        self.assertEqual(self.agendamento.atualizado_em, atualizado_em)
+        self.assertEqual(cache_consultas.versoes(escopos), versoes)
+
+    def test_estado_diferente_do_exibido_responde_409(self):
+        """Testa que um agendamento alterado em outra tela não é sobrescrito"""
+        self.agendamento.status = "cancelado"
+        self.agendamento.save()
+        url = reverse("concluir_agendamento", args=[self.agendamento.pk])
+
+        response = self.client.post(url, {"de": "confirmado"}, **self.json)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["status"], "cancelado")
+        self.assertFalse(response.json()["alterado"])
+        self.agendamento.refresh_from_db()
+        self.assertEqual(self.agendamento.status, "cancelado")
+
+    def test_toque_repetido_nao_altera_de_novo(self):
+        """Testa que repetir a ação responde 200 sem gravar"""
+        url = reverse("concluir_agendamento", args=[self.agendamento.pk])
+        self.client.post(url, {"de": "confirmado"}, **self.json)
+
+        response = self.client.post(url, {"de": "confirmado"}, **self.json)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()["alterado"])
+        self.assertResumoConsistente()
+
+    def test_agendamento_inexistente(self):
+        """Testa que um id inexistente responde 404 em JSON"""
+        url = reverse("concluir_agendamento", args=[9999])
+        response = self.client.post(url, {"de": "confirmado"}, **self.json)
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("erro", response.json())
+
+    def test_valor_anterior_invalido(self):
+        """Testa que um valor anterior desconhecido é recusado"""
+        url = reverse("confirmar_agendamento", args=[self.agendamento.pk])
+        response = self.client.post(url, {"de": "qualquer"}, **self.json)
+        self.assertEqual(response.status_code, 400)
+
+    def test_valor_anterior_obrigatorio(self):
+        """Testa que sem o valor exibido ("de") nada é gravado"""
+        url = reverse("concluir_agendamento", args=[self.agendamento.pk])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, **self.json)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("erro", response.json())
+        self.assertFalse(
+            [q for q in queries.captured_queries if q["sql"].startswith("UPDATE")]
+        )
+        self.agendamento.refresh_from_db()
+        self.assertEqual(self.agendamento.status, "confirmado")
+
+    def test_pagamento_em_json(self):
+        """Testa a troca de pagamento por XHR e a invalidação do cache"""
+        financeiro = {"data": self.dia.isoformat()}
+        self.client.get(reverse("financeiro"), financeiro)
+        url = reverse("alterar_status_pagamento", args=[self.agendamento.pk])
+
+        response = self.client.post(url, {"de": "pendente"}, **self.json)
+
+        self.assertEqual(response.json()["status_pagamento"], "pago")
+        self.assertResumoConsistente()
+        pagina = self.client.get(reverse("financeiro"), financeiro)
+        self.assertEqual(pagina.context["valor_recebido"], Decimal("25.00"))
+
+        response = self.client.post(url, {"para": "pendente"}, **self.json)
+        self.assertEqual(response.json()["status_pagamento"], "pendente")
+        self.assertResumoConsistente()
+
+    def test_pagamento_sem_destino(self):
+        """Testa que o XHR de pagamento precisa de "para" ou "de" """
+        url = reverse("alterar_status_pagamento", args=[self.agendamento.pk])
+        response = self.client.post(url, **self.json)
+        self.assertEqual(response.status_code, 400)
+
+    def test_a_caminho_enfileira_sms(self):
+        """Testa que "a caminho" por XHR grava a previsão e enfileira o SMS"""
+        url = reverse("on_the_way_agendamento", args=[self.agendamento.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                url, {"de": "confirmado", "previsao_minutos": 15}, **self.json
+            )
+
+        dados = response.json()
+        self.assertEqual(dados["status"], "a_caminho")
+        self.assertEqual(dados["previsao_chegada"], 15)
+        self.assertTrue(dados["sms"]["sucesso"])
+        self.assertTrue(
+            MensagemSMS.objects.filter(
+                agendamento=self.agendamento, tipo="a_caminho"
+            ).exists()
+        )
+        self.assertResumoConsistente()
+
+    def test_a_caminho_sem_previsao(self):
+        """Testa que "a caminho" por XHR valida a previsão"""
+        url = reverse("on_the_way_agendamento", args=[self.agendamento.pk])
+        response = self.client.post(url, **self.json)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("previsao_minutos", response.json()["erro"])
+
+    def test_formulario_comum_continua_redirecionando(self):
+        """Testa que sem XHR a ação continua com redirect e mensagem"""
+        url = reverse("concluir_agendamento", args=[self.agendamento.pk])
+        response = self.client.post(url)
+        self.assertRedirects(response, reverse("painel_barbeiro"))
+
+
+class AlteracaoEmLoteTest(TestCase):
+    """Testes para a alteração de status e pagamento em lote"""
+
+    def setUp(self):
+        User.objects.create_user(username="testuser", password="testpass123")
+        self.client.login(username="testuser", password="testpass123")
+        self.cliente = Cliente.objects.create(nome="João Silva", telefone="11999999999")
+        self.servico = Servico.objects.create(
+            nome="Corte", duracao=30, preco=Decimal("25.00")
+        )
+        self.dia = date(2025, 3, 15)
+        self.agendamentos = [
+            Agendamento.objects.create(
+                cliente=self.cliente,
+                servico=self.servico,
+                data=self.dia,
+                hora=time(9 + i, 0),
+                status=status,
+                status_pagamento=pagamento,
+            )
+            for i, (status, pagamento) in enumerate(
+                [
+                    ("confirmado", "pendente"),
+                    ("a_caminho", "pendente"),
+                    ("concluido", "pago"),
+                ]
+            )
+        ]
+        self.outro_dia = Agendamento.objects.create(
+            cliente=self.cliente,
+            servico=self.servico,
+            data=date(2025, 4, 2),
+            hora=time(10, 0),
+        )
+        self.url = reverse("alterar_em_lote")
+        self.ids = [agendamento.pk for agendamento in self.agendamentos]
+
+    def _resumo(self):
+        return sorted(
+            ResumoDiario.objects.filter(quantidade__gt=0).values_list(
+                "data", "status", "status_pagamento", "quantidade", "valor_total"
+            )
+        )
+
+    def assertResumoConsistente(self):
+        resumo = self._resumo()
+        reconstruir_resumo()
+        self.assertEqual(resumo, self._resumo())
+
+    def test_pagamento_em_lote(self):
+        """Testa que só as linhas que mudaram são contadas"""
+        response = self.client.post(
+            self.url,
+            {"campo": "status_pagamento", "valor": "pago", "ids": self.ids},
+            HTTP_ACCEPT="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["alterados"], 2)
+        self.assertEqual(sorted(response.json()["ids"]), self.ids[:2])
+        self.assertEqual(Agendamento.objects.filter(status_pagamento="pago").count(), 3)
+        self.assertResumoConsistente()
+
+    def test_status_em_lote_de_varios_dias(self):
+        """Testa status vindos de estados diferentes e de datas diferentes"""
+        painel = {"data": self.outro_dia.data.isoformat()}
+        self.client.get(reverse("painel_barbeiro"), painel)
+
+        response = self.client.post(
+            self.url,
+            {
+                "campo": "status",
+                "valor": "concluido",
+                "ids": [*self.ids, self.outro_dia.pk],
+            },
+            HTTP_ACCEPT="application/json",
+        )
+
+        self.assertEqual(response.json()["alterados"], 3)
+        self.assertEqual(Agendamento.objects.exclude(status="concluido").count(), 0)
+        self.assertResumoConsistente()
+        # O cache do outro dia também foi invalidado
+        pagina = self.client.get(reverse("painel_barbeiro"), painel)
+        self.assertEqual(pagina.context["agendamentos"][0]["status"], "concluido")
+
+    def test_formulario_volta_com_mensagem(self):
+        """Testa o envio pelo formulário da página"""
+        origem = reverse("financeiro") + f"?data={self.dia.isoformat()}"
+        response = self.client.post(
+            self.url,
+            {"campo": "status_pagamento", "valor": "pago", "ids": self.ids},
+            HTTP_REFERER=origem,
+            follow=True,
+        )
+
+        self.assertRedirects(response, origem)
+        self.assertContains(response, "2 agendamento(s) alterado(s)")
+
+    def test_ids_repetidos_contam_uma_vez(self):
+        """Testa que a mesma linha marcada na tabela e no card vale uma vez"""
+        response = self.client.post(
+            self.url,
+            {"campo": "status", "valor": "cancelado", "ids": [self.ids[0]] * 2},
+            HTTP_ACCEPT="application/json",
+        )
+        self.assertEqual(response.json()["alterados"], 1)
+        self.assertResumoConsistente()
+
+    def test_alteracoes_invalidas(self):
+        """Testa os pedidos recusados"""
+        invalidos = [
+            {"campo": "status", "valor": "a_caminho", "ids": self.ids},
+            {"campo": "valor", "valor": "0", "ids": self.ids},
+            {"campo": "status", "valor": "concluido"},
+            {"campo": "status", "valor": "concluido", "ids": ["abc"]},
+        ]
+        for dados in invalidos:
+            with self.subTest(dados=dados):
+                response = self.client.post(
+                    self.url, dados, HTTP_ACCEPT="application/json"
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("erro", response.json())
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    @patch("agendamentos.views.LIMITE_LOTE", 2)
+    def test_limite_de_ids(self):
+        """Testa que lotes acima do limite são recusados"""
+        response = self.client.post(
+            self.url,
+            {"campo": "status", "valor": "concluido", "ids": self.ids},
+            HTTP_ACCEPT="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Agendamento.objects.filter(status="concluido").count(), 1)
+
+
+@override_settings(INSTRUMENTACAO=True)
+class InstrumentacaoTest(TestCase):
+    """Testes para o header Server-Timing e o log por requisição"""
+
+    def setUp(self):
+        User.objects.create_user(username="testuser", password="testpass123")
+        self.client.login(username="testuser", password="testpass123")
+        cliente = Cliente.objects.create(nome="João Silva", telefone="11999999999")
+        servico = Servico.objects.create(
+            nome="Corte", duracao=30, preco=Decimal("25.00")
+        )
+        self.dia = date(2025, 3, 15)
+        Agendamento.objects.create(
+            cliente=cliente, servico=servico, data=self.dia, hora=time(9, 0)
+        )
+
+    def _metricas(self, response):
+        metricas = {}
+        for metrica in response["Server-Timing"].split(", "):
+            nome, *atributos = metrica.split(";")
+            metricas[nome] = dict(atributo.split("=", 1) for atributo in atributos)
+        return metricas
+
+    def test_server_timing_e_log(self):
+        """Testa queries, SQL, template, view e total do painel"""
+        with self.assertLogs("agendamentos.instrumentacao", "INFO") as logs:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    reverse("painel_barbeiro"), {"data": self.dia.isoformat()}
+                )
+
+        metricas = self._metricas(response)
+        self.assertEqual(
+            {"db", "template", "view", "total", "q1", "q2", "q3"}, set(metricas)
+        )
+        self.assertEqual(metricas["db"]["desc"], f'"{len(queries)} queries"')
+        self.assertGreater(float(metricas["template"]["dur"]), 0)
+        self.assertLessEqual(
+            float(metricas["view"]["dur"]), float(metricas["total"]["dur"])
+        )
+        # As queries detalhadas trazem só tipo e tabela, sem parâmetros
+        self.assertRegex(metricas["q1"]["desc"], r'^"[A-Z]+( \w+)?"$')
+
+        registro = json.loads(logs.records[0].getMessage())
+        self.assertEqual(registro["rota"], "painel_barbeiro")
+        self.assertEqual(registro["status"], 200)
+        self.assertEqual(registro["queries"], len(queries))
+        self.assertEqual(
+            set(registro),
+            {
+                "metodo",
+                "caminho",
+                "rota",
+                "status",
+                "queries",
+                "sql_ms",
+                "template_ms",
+                "view_ms",
+                "total_ms",
+            },
+        )
+
+    def test_redirecionamento_sem_template(self):
+        """Testa uma requisição que não renderiza template"""
+        self.client.logout()
+        with self.assertLogs("agendamentos.instrumentacao", "INFO"):
+            response = self.client.get(reverse("painel_barbeiro"))
+
+        self.assertEqual(response.status_code, 302)
+        metricas = self._metricas(response)
+        self.assertEqual(metricas["template"]["dur"], "0.0")
+        self.assertIn("total", metricas)
+
+    async def test_asgi_sem_adaptador_sincrono(self):
+        """Testa que sob ASGI o middleware é assíncrono e ainda mede tudo"""
+
+        async def view(request):
+            return HttpResponse()
+
+        self.assertTrue(
+            iscoroutinefunction(instrumentacao.InstrumentacaoMiddleware(view))
+        )
+
+        with self.assertLogs("agendamentos.instrumentacao", "INFO") as logs:
+            response = await self.async_client.get(reverse("login"))
+
+        self.assertEqual(response.status_code, 200)
+        metricas = self._metricas(response)
+        self.assertGreater(float(metricas["template"]["dur"]), 0)
+        self.assertIn("view", metricas)
+        self.assertEqual(json.loads(logs.records[0].getMessage())["rota"], "login")
+
+    def test_fora_de_requisicao_nao_mede(self):
+        """Testa que queries fora de requisições não são registradas"""
+        self.assertIsNone(instrumentacao.medicao_atual())
+        Cliente.objects.count()
+        self.assertIsNone(instrumentacao.medicao_atual())
+
+    @override_settings(INSTRUMENTACAO=False)
+    def test_desligada_nao_adiciona_header(self):
+        """Testa que, desligada, a instrumentação sai da cadeia de middlewares"""
+        response = Client().get(reverse("login"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def test_descrever_sql(self):
+        """Testa o resumo de uma query para o header"""
+        casos = {
+            'SELECT "a"."id" FROM "agendamentos_agendamento" WHERE x = %s': (
+                "SELECT agendamentos_agendamento"
+            ),
+            'UPDATE "agendamentos_resumodiario" SET quantidade = 1': (
+                "UPDATE agendamentos_resumodiario"
+            ),
+            'INSERT INTO "cache_barbearia" (cache_key) VALUES (%s)': (
+                "INSERT cache_barbearia"
+            ),
+            'SAVEPOINT "s1"': "SAVEPOINT",
+            "": "",
+        }
+        for sql, esperado in casos.items():
+            with self.subTest(sql=sql):
+                self.assertEqual(instrumentacao.descrever_sql(sql), esperado)
+
+
+class ConsultasLentasTest(TestCase):
+    """Testes para o log de queries lentas"""
+
+    def setUp(self):
+        User.objects.create_user(username="testuser", password="testpass123")
+        self.client.login(username="testuser", password="testpass123")
+        cliente = Cliente.objects.create(nome="João Silva", telefone="11999999999")
+        servico = Servico.objects.create(
+            nome="Corte", duracao=30, preco=Decimal("25.00")
+        )
+        self.dia = date(2025, 3, 15)
+        Agendamento.objects.create(
+            cliente=cliente, servico=servico, data=self.dia, hora=time(9, 0)
+        )
+
+    def _registros(self, logs):
+        return [json.loads(registro.getMessage()) for registro in logs.records]
+
+    @override_settings(CONSULTAS_LENTAS_MS=0.000001)
+    def test_registra_view_origem_e_forma(self):
+        """Testa a linha de log de uma query acima do limite"""
+        with self.assertLogs("agendamentos.consultas_lentas", "WARNING") as logs:
+            with connection.execute_wrapper(consultas_lentas.registrar):
+                response = self.client.get(
+                    reverse("financeiro"), {"data": self.dia.isoformat()}
+                )
+        self.assertEqual(response.status_code, 200)
+
+        registros = self._registros(logs)
+        da_view = [r for r in registros if r["view"] == "agendamentos.views.financeiro"]
+        self.assertTrue(da_view)
+        for registro in da_view:
+            self.assertTrue(registro["origem"].startswith("agendamentos/"))
+            self.assertEqual(
+                registro["forma"], consultas_lentas.identificar(registro["sql"])
+            )
+            self.assertNotIn("plano", registro)
+        # Parâmetros (datas, nomes, telefones) não vão para o log
+        mensagens = "".join(registro.getMessage() for registro in logs.records)
+        self.assertNotIn(self.dia.isoformat(), mensagens)
+        self.assertNotIn("11999999999", mensagens)
+
+    @override_settings(CONSULTAS_LENTAS_MS=60_000)
+    def test_queries_rapidas_nao_sao_registradas(self):
+        """Testa que nada abaixo do limite vai para o log"""
+        with self.assertNoLogs("agendamentos.consultas_lentas", "WARNING"):
+            with connection.execute_wrapper(consultas_lentas.registrar):
+                self.client.get(reverse("financeiro"))
+
+    def test_normalizar_forma(self):
+        """Testa que queries iguais com listas de tamanhos diferentes têm a
+        mesma forma"""
+        uma = consultas_lentas.normalizar(
+            'SELECT *  FROM "t"\n WHERE "id" IN (%s, %s, %s) AND x = %s'
+        )
+        outra = consultas_lentas.normalizar(
+            'SELECT * FROM "t" WHERE "id" IN (%s) AND x = %s'
+        )
+        self.assertEqual(uma, 'SELECT * FROM "t" WHERE "id" IN (%s...) AND x = %s')
+        self.assertNotEqual(uma, outra)
+        self.assertEqual(
+            consultas_lentas.normalizar('SELECT * FROM "t" WHERE "id" IN (%s,%s)'),
+            'SELECT * FROM "t" WHERE "id" IN (%s...)',
+        )
+
+    def test_instalar_pelo_sinal_de_conexao(self):
+        """Testa que o wrapper só é instalado com limite e uma vez só"""
+        wrappers_originais = list(connection.execute_wrappers)
+        self.addCleanup(setattr, connection, "execute_wrappers", wrappers_originais)
+        with override_settings(CONSULTAS_LENTAS_MS=0):
+            consultas_lentas.instalar(sender=None, connection=connection)
+        self.assertNotIn(consultas_lentas.registrar, connection.execute_wrappers)
+
+        with override_settings(CONSULTAS_LENTAS_MS=100):
+            consultas_lentas.instalar(sender=None, connection=connection)
+            consultas_lentas.instalar(sender=None, connection=connection)
+        self.assertEqual(
+            connection.execute_wrappers.count(consultas_lentas.registrar), 1
+        )
+
+    def test_explain_so_no_postgresql(self):
+        """Testa que fora do PostgreSQL não há plano"""
+        self.assertIsNone(consultas_lentas.explicar(connection, "SELECT 1", None))
+
+
+def _observar_em_outro_processo():
+    metricas.observar("barbearia_requisicao_segundos", 0.2, rota="financeiro")
+    metricas.incrementar("barbearia_sms_envios_total", resultado="falha")
+    metricas.gravar()
+
+
+class MetricasTest(TestCase):
+    """Testes para o endpoint /metrics no formato do Prometheus"""
+
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        configuracao = override_settings(
+            METRICAS=True, METRICAS_DIR=diretorio.name, METRICAS_TOKEN="segredo"
+        )
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        self.diretorio = diretorio.name
+        metricas.zerar()
+        self.addCleanup(metricas.zerar)
+        cache_consultas.zerar_estatisticas()
+
+        self.staff = User.objects.create_user(
+            username="admin", password="testpass123", is_staff=True
+        )
+        User.objects.create_user(username="testuser", password="testpass123")
+        self.client = Client()
+        self.url = reverse("metricas")
+
+    def _coletar(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="Bearer segredo")
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def _valor(self, texto, serie):
+        for linha in texto.splitlines():
+            if linha.startswith(serie + " "):
+                return float(linha.rsplit(" ", 1)[1])
+        self.fail(f"{serie} não encontrada em:\n{texto}")
+
+    def test_acesso_por_token_ou_staff(self):
+        """Testa que só o coletor (token) e usuários staff veem as métricas"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("Bearer", response["WWW-Authenticate"])
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="Bearer errado")
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client.get(self.url, HTTP_AUTHORIZATION="Bearer segredo")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], metricas.CONTENT_TYPE)
+
+        self.client.login(username="testuser", password="testpass123")
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.client.login(username="admin", password="testpass123")
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_sem_token_configurado_so_staff(self):
+        """Testa que o token vazio não libera o acesso"""
+        with override_settings(METRICAS_TOKEN=""):
+            response = self.client.get(self.url, HTTP_AUTHORIZATION="Bearer ")
+        self.assertEqual(response.status_code, 401)
+
+    def test_desligadas_a_pagina_nao_existe(self):
+        """Testa METRICAS desligado"""
+        with override_settings(METRICAS=False):
+            response = Client().get(self.url, HTTP_AUTHORIZATION="Bearer segredo")
+        self.assertEqual(response.status_code, 404)
+
+    def test_latencia_queries_e_cache_por_rota(self):
+        """Testa os histogramas das requisições e a taxa de acerto do cache"""
+        self.client.login(username="testuser", password="testpass123")
+        dia = {"data": "2025-03-15"}
+        self.client.get(reverse("painel_barbeiro"), dia)
+        self.client.get(reverse("painel_barbeiro"), dia)
+        self.client.logout()
+
+        texto = self._coletar()
+        self.assertIn("# TYPE barbearia_requisicao_segundos histogram", texto)
+        self.assertEqual(
+            self._valor(
+                texto, 'barbearia_requisicao_segundos_count{rota="painel_barbeiro"}'
+            ),
+            2,
+        )
+        self.assertEqual(
+            self._valor(
+                texto,
+                'barbearia_requisicao_segundos_bucket{rota="painel_barbeiro",le="+Inf"}',
+            ),
+            2,
+        )
+        self.assertGreater(
+            self._valor(
+                texto, 'barbearia_requisicao_queries_sum{rota="painel_barbeiro"}'
+            ),
+            0,
+        )
+        self.assertEqual(
+            self._valor(
+                texto,
+                'barbearia_cache_consultas_total{consulta="painel",resultado="acerto"}',
+            ),
+            1,
+        )
+        self.assertEqual(self._valor(texto, "barbearia_cache_taxa_acerto"), 0.5)
+
+    async def test_requisicoes_asgi(self):
+        """Testa que sob ASGI o middleware é assíncrono e conta a requisição"""
+
+        async def view(request):
+            return HttpResponse()
+
+        self.assertTrue(iscoroutinefunction(metricas.MetricasMiddleware(view)))
+
+        response = await self.async_client.get(reverse("login"))
+        self.assertEqual(response.status_code, 200)
+
+        texto = await sync_to_async(metricas.exportar)()
+        self.assertEqual(
+            self._valor(texto, 'barbearia_requisicao_segundos_count{rota="login"}'), 1
+        )
+
+    @patch("agendamentos.smsdev_service.requests.Session.post")
+    def test_envios_de_sms(self, mock_post):
+        """Testa contagem e latência dos envios à SMSDev"""
+        ok, erro = Mock(status_code=200), Mock(status_code=500)
+        ok.json.return_value = {"situacao": "OK", "id": "1"}
+        mock_post.side_effect = [ok, ok, erro]
+        service = SMSDevService()
+        with patch.object(service, "enabled", True), patch.object(
+            service, "usuario", "u"
+        ), patch.object(service, "token", "t"):
+            for _ in range(3):
+                service.enviar_sms("11999999999", "Teste")
+            # Sem requisição (telefone inválido) não conta
+            service.enviar_sms("123", "Teste")
+
+        texto = self._coletar()
+        self.assertEqual(
+            self._valor(texto, 'barbearia_sms_envios_total{resultado="sucesso"}'), 2
+        )
+        self.assertEqual(
+            self._valor(texto, 'barbearia_sms_envios_total{resultado="falha"}'), 1
+        )
+        self.assertEqual(self._valor(texto, "barbearia_sms_segundos_count"), 3)
+
+    def test_soma_entre_processos(self):
+        """Testa a agregação dos arquivos de vários processos"""
+        metricas.observar("barbearia_requisicao_segundos", 0.02, rota="financeiro")
+        processo = multiprocessing.get_context("fork").Process(
+            target=_observar_em_outro_processo
+        )
+        processo.start()
+        processo.join(10)
+        self.assertEqual(processo.exitcode, 0)
+        self.assertEqual(os.listdir(self.diretorio), [f"{processo.pid}.json"])
+
+        texto = self._coletar()
+        # O processo já terminou: o arquivo dele foi incorporado ao deste
+        self.assertEqual(os.listdir(self.diretorio), [f"{os.getpid()}.json"])
+        rotulos = '{rota="financeiro"}'
+        self.assertEqual(
+            self._valor(texto, f"barbearia_requisicao_segundos_count{rotulos}"), 2
+        )
+        self.assertAlmostEqual(
+            self._valor(texto, f"barbearia_requisicao_segundos_sum{rotulos}"), 0.22
+        )
+        self.assertEqual(
+            self._valor(
+                texto,
+                'barbearia_requisicao_segundos_bucket{rota="financeiro",le="0.025"}',
+            ),
+            1,
+        )
+        self.assertEqual(
+            self._valor(texto, 'barbearia_sms_envios_total{resultado="falha"}'), 1
+        )
+
+    def test_processos_encerrados_nao_acumulam_arquivos(self):
+        """Testa que os arquivos de processos mortos somem sem zerar contadores"""
+        for _ in range(3):
+            processo = multiprocessing.get_context("fork").Process(
+                target=_observar_em_outro_processo
+            )
+            processo.start()
+            processo.join(10)
+            self.assertEqual(processo.exitcode, 0)
+        # Arquivo de um processo vivo (o pai do teste) fica onde está
+        vivo = f"{os.getppid()}.json"
+        with open(os.path.join(self.diretorio, vivo), "w") as arquivo:
+            json.dump(
+                [["barbearia_sms_envios_total", [["resultado", "falha"]], 10]], arquivo
+            )
+
+        serie = 'barbearia_sms_envios_total{resultado="falha"}'
+        self.assertEqual(self._valor(self._coletar(), serie), 13)
+        self.assertEqual(
+            sorted(os.listdir(self.diretorio)),
+            sorted([f"{os.getpid()}.json", vivo]),
+        )
+        self.assertEqual(self._valor(self._coletar(), serie), 13)
+        self.assertEqual(
+            self._valor(
+                self._coletar(),
+                'barbearia_requisicao_segundos_count{rota="financeiro"}',
+            ),
+            3,
+        )
+
+        # Um processo novo com este pid continua do total incorporado
+        metricas.zerar()
+        metricas.incrementar("barbearia_sms_envios_total", resultado="falha")
+        self.assertEqual(self._valor(self._coletar(), serie), 14)
+
+    def test_pid_reaproveitado_continua_do_arquivo(self):
+        """Testa que um processo novo com o mesmo pid não zera os contadores"""
+        metricas.incrementar("barbearia_sms_envios_total", resultado="sucesso")
+        metricas.gravar()
+        metricas.zerar()
+        metricas.incrementar("barbearia_sms_envios_total", resultado="sucesso")
+
+        texto = self._coletar()
+        self.assertEqual(
+            self._valor(texto, 'barbearia_sms_envios_total{resultado="sucesso"}'), 2
+        )
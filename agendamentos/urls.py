@@ -13,9 +13,15 @@ urlpatterns = [
     path("logout/", auth_views.LogoutView.as_view(next_page="login"), name="logout"),
     # PAINEL PRINCIPAL
     path("painel/", views.painel_barbeiro, name="painel_barbeiro"),
+    path("painel/eventos/", views.eventos_painel, name="eventos_painel"),
     path(
         "agendamentos-mensais/", views.agendamentos_mensais, name="agendamentos_mensais"
     ),
+    path(
+        "agendamentos-mensais/dia/",
+        views.agendamentos_do_dia,
+        name="agendamentos_do_dia",
+    ),
     # FINANCEIRO
     path("financeiro/", views.financeiro, name="financeiro"),
     path(
@@ -23,8 +29,19 @@ urlpatterns = [
         views.alterar_status_pagamento,
         name="alterar_status_pagamento",
     ),
+    path(
+        "agendamentos/alterar-em-lote/",
+        views.alterar_em_lote,
+        name="alterar_em_lote",
+    ),
     # AGENDAMENTOS
     path("agendar/", views.agendar, name="agendar"),
+    path("agendar/horarios/", views.horarios_livres, name="horarios_livres"),
+    path(
+        "agendar/proximos-horarios/",
+        views.proximos_horarios_livres,
+        name="proximos_horarios_livres",
+    ),
     path(
         "agendar/editar/<int:pk>/", views.editar_agendamento, name="editar_agendamento"
     ),
@@ -53,9 +70,16 @@ urlpatterns = [
     path("clientes/novo/", views.criar_cliente, name="criar_cliente"),
     path("clientes/editar/<int:pk>/", views.editar_cliente, name="editar_cliente"),
     path("clientes/deletar/<int:pk>/", views.deletar_cliente, name="deletar_cliente"),
+    path(
+        "clientes/autocomplete/",
+        views.autocomplete_clientes,
+        name="autocomplete_clientes",
+    ),
     # SERVIÇOS
     path("servicos/", views.lista_servicos, name="lista_servicos"),
     path("servicos/novo/", views.criar_servico, name="criar_servico"),
     path("servicos/editar/<int:pk>/", views.editar_servico, name="editar_servico"),
     path("servicos/deletar/<int:pk>/", views.deletar_servico, name="deletar_servico"),
+    # MONITORAMENTO
+    path("metrics", views.metricas_prometheus, name="metricas"),
 ]
@@ -1,33 +1,242 @@
+import hashlib
+import hmac
 from datetime import date, datetime, timedelta
+from pathlib import Path
 
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_GET, require_POST
+
+from . import alteracoes, cache_consultas, eventos, metricas
+from .busca import LIMITE_MAXIMO, LIMITE_PADRAO, buscar_clientes
+from .disponibilidade import (
+    DIAS_MAXIMO,
+    DIAS_PADRAO,
+    INTERVALO_MINUTOS,
+    QUANTIDADE_MAXIMA,
+    QUANTIDADE_PADRAO,
+    horarios_disponiveis,
+    proximos_horarios,
+)
+from .fila_sms import enfileirar_barbeiro_a_caminho
 from .forms import AgendamentoForm, ClienteForm, PrevisaoChegadaForm, ServicoForm
-from .models import Agendamento, Cliente, Servico
-from .smsdev_service import smsdev_service
+from .models import Agendamento, Cliente, MensagemSMS, Servico
+from .relatorios import (
+    contagens_por_dia,
+    intervalo_ano,
+    intervalo_mes,
+    resumo_financeiro,
+    resumo_status,
+    taxa_recebimento,
+)
+
+# Filtros do relatório financeiro que limitam os agendamentos do dia
+FILTROS_PAGAMENTO = ("pendente", "pago")
+
+# Alterações em lote permitidas; "a_caminho" precisa da previsão e do SMS
+VALORES_EM_LOTE = {
+    "status": ("confirmado", "concluido", "cancelado"),
+    "status_pagamento": ("pendente", "pago"),
+}
+LIMITE_LOTE = 500
+
+# Muda quando um deploy altera os templates, o que invalida os ETags
+VERSAO_TEMPLATES = max(
+    arquivo.stat().st_mtime_ns
+    for arquivo in (Path(__file__).parent / "templates").rglob("*.html")
+)
+
+
+def _etag_pagina(request, leitura, *extras):
+    """
+    ETag de uma página a partir das versões do cache que ela lê
 
+    O HTML também depende do usuário e do cookie CSRF (token dos
+    formulários). Sem ETag quando há mensagens pendentes, que uma resposta
+    304 esconderia, ou quando alguma versão ainda não é conhecida.
+    """
+    if not leitura.completa or len(messages.get_messages(request)):
+        return None
+
+    conteudo = repr(
+        (
+            VERSAO_TEMPLATES,
+            leitura.chave,
+            leitura.versoes,
+            extras,
+            request.user.pk,
+            request.COOKIES.get(settings.CSRF_COOKIE_NAME),
+        )
+    )
+    return f'"{hashlib.md5(conteudo.encode(), usedforsecurity=False).hexdigest()}"'
+
+
+def _nao_modificado(request, etag):
+    """Resposta 304 se o navegador já tem a página com ``etag``"""
+    if etag is None:
+        return None
+    return get_conditional_response(request, etag=etag)
+
+
+def _com_etag(response, etag):
+    if etag is not None:
+        response["ETag"] = etag
+        # Guardar, mas sempre revalidar com o servidor
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# Colunas do card do painel
+CAMPOS_CARD = (
+    "id",
+    "hora",
+    "status",
+    "status_pagamento",
+    "observacoes",
+    "previsao_chegada",
+    "status_sms",
+    "cliente__nome",
+    "cliente__telefone",
+    "cliente__endereco",
+    "servico__nome",
+)
+
+
+def _ultimo_sms():
+    # Status do último SMS de cada agendamento, calculado na mesma query
+    ultimo_sms = MensagemSMS.objects.filter(agendamento=OuterRef("pk")).order_by("-pk")
+    return Subquery(ultimo_sms.values("status")[:1])
+
+
+def _cards_painel(agendamentos):
+    # Uma única query com cliente e serviço, trazendo só as colunas do template
+    return cache_consultas.projetar(
+        agendamentos.annotate(status_sms=_ultimo_sms()).order_by("hora"),
+        *CAMPOS_CARD,
+    )
 
-@login_required
-def painel_barbeiro(request):
+
+def _anotacoes_card():
+    """
+    Campos do card que ``alteracoes.alterar`` não devolve, como subqueries
+    sem joins, para o card sair do próprio ``RETURNING`` do UPDATE
+    """
+    anotacoes = {
+        "hora": F("hora"),
+        "observacoes": F("observacoes"),
+        "status_sms": _ultimo_sms(),
+    }
+    for campo in CAMPOS_CARD:
+        relacao, _, coluna = campo.partition("__")
+        if coluna:
+            modelo = Agendamento._meta.get_field(relacao).related_model
+            anotacoes[campo] = Subquery(
+                modelo.objects.filter(pk=OuterRef(f"{relacao}_id")).values(coluna)
+            )
+    return anotacoes
+
+
+def _agendamentos_painel(data_selecionada):
+    return _cards_painel(Agendamento.objects.filter(data=data_selecionada))
+
+
+def _data_do_painel(request):
     # Verificar se foi selecionada uma data específica
     data_selecionada = request.GET.get("data")
     if data_selecionada:
         try:
-            data_selecionada = datetime.strptime(data_selecionada, "%Y-%m-%d").date()
+            return datetime.strptime(data_selecionada, "%Y-%m-%d").date()
         except ValueError:
-            data_selecionada = date.today()
-    else:
-        data_selecionada = date.today()
+            pass
+    return date.today()
+
+
+def _leitura_painel(data_selecionada):
+    return cache_consultas.Leitura(
+        "painel", [data_selecionada], [cache_consultas.escopo_dia(data_selecionada)]
+    )
 
-    agendamentos = Agendamento.objects.filter(data=data_selecionada).order_by("hora")
+
+@login_required
+def painel_barbeiro(request):
+    data_selecionada = _data_do_painel(request)
+
+    leitura = _leitura_painel(data_selecionada)
+    etag = _etag_pagina(request, leitura)
+    nao_modificado = _nao_modificado(request, etag)
+    if nao_modificado is not None:
+        return nao_modificado
 
     context = {
-        "agendamentos": agendamentos,
+        "agendamentos": leitura.valor(lambda: _agendamentos_painel(data_selecionada)),
         "data_selecionada": data_selecionada,
+        "versao_eventos": eventos.identificador(leitura.versoes),
+        "ao_vivo": settings.PAINEL_AO_VIVO,
     }
-    return render(request, "agendamentos/painel_barbeiro.html", context)
+    response = render(request, "agendamentos/painel_barbeiro.html", context)
+    return _com_etag(response, etag)
+
+
+@login_required
+async def eventos_painel(request):
+    """
+    Fluxo SSE com as mudanças nos agendamentos de uma data do painel
+
+    Sob ASGI a conexão fica aberta; sob WSGI responde uma vez e o navegador
+    reconecta (ver ``agendamentos/eventos.py``). Sem ``PAINEL_AO_VIVO`` ligado
+    a página não existe.
+    """
+    if not settings.PAINEL_AO_VIVO:
+        raise Http404
+
+    data_selecionada = _data_do_painel(request)
+    escopos = [cache_consultas.escopo_dia(data_selecionada)]
+
+    def carimbo():
+        return eventos.identificador(cache_consultas.versoes(escopos))
+
+    def carregar():
+        leitura = _leitura_painel(data_selecionada)
+        linhas = leitura.valor(lambda: _agendamentos_painel(data_selecionada))
+        return eventos.identificador(leitura.versoes), linhas
+
+    def renderizar(linhas):
+        return [
+            {
+                "id": agendamento["id"],
+                "hora": agendamento["hora"].strftime("%H:%M"),
+                "status": agendamento["status"],
+                "html": render_to_string(
+                    "agendamentos/card_agendamento.html",
+                    {"agendamento": agendamento},
+                    request=request,
+                ),
+            }
+            for agendamento in linhas
+        ]
+
+    versao_cliente = request.headers.get("Last-Event-ID") or request.GET.get(
+        "versao", ""
+    )
+    duracao = eventos.DURACAO_MAXIMA if isinstance(request, ASGIRequest) else 0
+    response = StreamingHttpResponse(
+        eventos.fluxo(carimbo, carregar, renderizar, versao_cliente, duracao),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Impede que um proxy (nginx) segure os eventos em buffer
+    response["X-Accel-Buffering"] = "no"
+    return response
 
 
 @login_required
@@ -80,6 +289,22 @@ def deletar_cliente(request, pk):
     )
 
 
+@login_required
+def autocomplete_clientes(request):
+    """
+    Retorna em JSON os clientes cujo nome ou telefone começa com ``q``.
+    Usado pelo seletor de clientes da tela de agendamento.
+    """
+    try:
+        limite = int(request.GET.get("limite", LIMITE_PADRAO))
+    except ValueError:
+        limite = LIMITE_PADRAO
+    limite = max(1, min(limite, LIMITE_MAXIMO))
+
+    clientes = buscar_clientes(request.GET.get("q", ""), limite)
+    return JsonResponse({"clientes": clientes})
+
+
 @login_required
 def agendar(request):
     """
@@ -89,21 +314,103 @@ def agendar(request):
     if request.method == "POST":
         form = AgendamentoForm(request.POST)
         if form.is_valid():
-            agendamento = form.save(commit=False)
-            agendamento.status = "confirmado"
-            agendamento.save()
-
-            messages.success(
-                request,
-                f"Agendamento criado com sucesso para {agendamento.cliente.nome}!",
-            )
-            return redirect("painel_barbeiro")
+            form.instance.status = "confirmado"
+            try:
+                agendamento = form.save()
+            except ValidationError as erro:
+                # Outro agendamento ocupou o horário durante a requisição
+                form.add_error("hora", erro)
+            else:
+                messages.success(
+                    request,
+                    f"Agendamento criado com sucesso para {agendamento.cliente.nome}!",
+                )
+                return redirect("painel_barbeiro")
     else:
         form = AgendamentoForm()
 
     return render(request, "agendamentos/agendar.html", {"form": form})
 
 
+@login_required
+def horarios_livres(request):
+    """
+    Retorna em JSON os horários livres de ``data`` para o serviço ``servico``.
+    Usado pelo seletor de horário da tela de agendamento; ``agendamento``
+    (opcional) é o agendamento em edição, que não ocupa a agenda.
+    """
+    try:
+        data = date.fromisoformat(request.GET.get("data", ""))
+        servico_id = int(request.GET.get("servico") or 0)
+        ignorar = int(request.GET.get("agendamento") or 0)
+    except ValueError:
+        return JsonResponse({"erro": "Parâmetros inválidos"}, status=400)
+
+    duracao = INTERVALO_MINUTOS
+    if servico_id:
+        duracao = (
+            Servico.objects.filter(pk=servico_id)
+            .values_list("duracao", flat=True)
+            .first()
+        )
+        if duracao is None:
+            return JsonResponse({"erro": "Serviço não encontrado"}, status=404)
+
+    disponiveis = horarios_disponiveis(data, duracao, ignorar=ignorar)
+    return JsonResponse(
+        {
+            "data": data.isoformat(),
+            "duracao": duracao,
+            "horarios": [
+                horario.strftime("%H:%M") for horario in disponiveis["horarios"]
+            ],
+            "livres": [
+                {"inicio": inicio.strftime("%H:%M"), "fim": fim.strftime("%H:%M")}
+                for inicio, fim in disponiveis["livres"]
+            ],
+        }
+    )
+
+
+@login_required
+def proximos_horarios_livres(request):
+    """
+    Retorna em JSON os primeiros horários livres para o serviço ``servico``
+    a partir de ``data`` (padrão: hoje), examinando até ``dias`` dias.
+    Usado pelo botão "Próximos horários livres" da tela de agendamento.
+    """
+    agora = timezone.localtime()
+    try:
+        servico_id = int(request.GET.get("servico") or 0)
+        inicio = date.fromisoformat(request.GET.get("data") or agora.date().isoformat())
+        quantidade = int(request.GET.get("quantidade", QUANTIDADE_PADRAO))
+        dias = int(request.GET.get("dias", DIAS_PADRAO))
+    except ValueError:
+        return JsonResponse({"erro": "Parâmetros inválidos"}, status=400)
+    quantidade = max(1, min(quantidade, QUANTIDADE_MAXIMA))
+    dias = max(1, min(dias, DIAS_MAXIMO))
+
+    duracao = (
+        Servico.objects.filter(pk=servico_id).values_list("duracao", flat=True).first()
+    )
+    if duracao is None:
+        return JsonResponse({"erro": "Serviço não encontrado"}, status=404)
+
+    # Hoje, só horários que ainda não passaram
+    a_partir_de = agora.time() if inicio == agora.date() else None
+
+    horarios = proximos_horarios(duracao, inicio, quantidade, dias, a_partir_de)
+    return JsonResponse(
+        {
+            "duracao": duracao,
+            "horarios": [
+                {"data": dia.isoformat(), "hora": hora.strftime("%H:%M")}
+                for dia, hora in horarios
+            ],
+        }
+    )
+
+
 @login_required
 def editar_agendamento(request, pk):
     """Editar um agendamento existente"""
@@ -112,9 +419,13 @@ def editar_agendamento(request, pk):
     if request.method == "POST":
         form = AgendamentoForm(request.POST, instance=agendamento)
         if form.is_valid():
-            form.save()
-            messages.success(request, "Agendamento atualizado com sucesso!")
-            return redirect("painel_barbeiro")
+            try:
+                form.save()
+            except ValidationError as erro:
+                form.add_error("hora", erro)
+            else:
+                messages.success(request, "Agendamento atualizado com sucesso!")
+                return redirect("painel_barbeiro")
     else:
         form = AgendamentoForm(instance=agendamento)
 
@@ -140,9 +451,110 @@ def deletar_agendamento(request, pk):
     )
 
 
+def _modo_rapido(request):
+    """
+    Modo de resposta de uma ação de status
+
+    Returns:
+        str: "json" (Accept: application/json), "card" (XHR que espera o
+             card do painel) ou None (formulário comum, com redirect)
+    """
+    if request.method != "POST":
+        return None
+    if "application/json" in request.headers.get("Accept", ""):
+        return "json"
+    if request.headers.get("X-Requested-With") == "XMLHttpRequest":
+        return "card"
+    return None
+
+
+def _acao_rapida(request, modo, pk, campo, novo, anterior=None, depois=None, **outros):
+    """
+    Aplica uma ação de status com um único UPDATE condicional
+
+    O valor anterior (campo ``de`` do POST, ou ``anterior``) é o que a tela
+    mostrava e é obrigatório: o UPDATE só vale se o agendamento ainda estiver
+    nele. Se já mudou, nada é gravado e a resposta (409) traz o estado atual.
+    Se ``de`` já é o valor pedido, não há o que gravar e só o estado atual é
+    lido. O card devolvido no modo "card" sai do ``RETURNING`` do UPDATE
+    (relido só quando ``depois`` grava algo que aparece nele, como o SMS).
+
+    Custo de uma alteração: o UPDATE, a saída e a entrada no resumo diário,
+    uma gravação de versões do cache e o início e o fim da transação.
+
+    Args:
+        anterior: Valor anterior quando não vem do POST
+        depois: Função chamada com o agendamento alterado, na mesma
+            transação; o dicionário que ela devolve entra no JSON
+
+    Returns:
+        JsonResponse ou HttpResponse com o card do painel
+    """
+    anterior = anterior or request.POST.get("de")
+    if anterior not in alteracoes.VALORES[campo]:
+        return JsonResponse(
+            {"erro": 'Informe o valor exibido em "de"'},
+            status=400,
+        )
+
+    extras, linhas = {}, []
+    if anterior != novo or outros:
+        # Com ``depois`` o card é relido no fim (ver abaixo)
+        anotacoes = _anotacoes_card() if modo == "card" and depois is None else None
+        with transaction.atomic():
+            linhas = alteracoes.alterar(
+                [pk], campo, novo, [anterior], anotacoes=anotacoes, **outros
+            )
+            if linhas and depois is not None:
+                extras = depois(linhas[0])
+
+    if linhas:
+        linha, status = linhas[0], 200
+    else:
+        agendamento = Agendamento.objects.filter(pk=pk)
+        if modo == "card":
+            linha = next(iter(_cards_painel(agendamento)), None)
+        else:
+            linha = agendamento.values(*alteracoes.CAMPOS_DEVOLVIDOS).first()
+        if linha is None:
+            return JsonResponse({"erro": "Agendamento não encontrado"}, status=404)
+        # Já estava no estado pedido (toque repetido) ou mudou em outra tela
+        status = 200 if linha[campo] == novo else 409
+
+    if modo == "json":
+        return JsonResponse(
+            {
+                "id": linha["id"],
+                "status": linha["status"],
+                "status_pagamento": linha["status_pagamento"],
+                "previsao_chegada": linha["previsao_chegada"],
+                "alterado": bool(linhas),
+                **extras,
+            },
+            status=status,
+        )
+
+    if not linhas:
+        card = linha
+    elif depois is None:
+        card = cache_consultas.aninhar((nome, linha[nome]) for nome in CAMPOS_CARD)
+    else:
+        [card] = _cards_painel(Agendamento.objects.filter(pk=pk))
+    return HttpResponse(
+        render_to_string(
+            "agendamentos/card_agendamento.html", {"agendamento": card}, request
+        ),
+        status=status,
+    )
+
+
 @login_required
 def confirmar_agendamento(request, pk):
     """Confirmar um agendamento"""
+    modo = _modo_rapido(request)
+    if modo:
+        return _acao_rapida(request, modo, pk, "status", "confirmado")
+
     agendamento = get_object_or_404(Agendamento, pk=pk)
     agendamento.status = "confirmado"
     agendamento.save()
@@ -153,6 +565,29 @@ def confirmar_agendamento(request, pk):
 @login_required
 def on_the_way_agendamento(request, pk):
     """Marcar um agendamento como 'À caminho' com previsão de chegada"""
+    modo = _modo_rapido(request)
+    if modo:
+        form = PrevisaoChegadaForm(request.POST)
+        if not form.is_valid():
+            return JsonResponse({"erro": form.errors.get_json_data()}, status=400)
+        previsao_minutos = form.cleaned_data["previsao_minutos"]
+
+        def enfileirar_sms(linha):
+            agendamento = Agendamento.objects.select_related("cliente").get(
+                pk=linha["id"]
+            )
+            return {"sms": enfileirar_barbeiro_a_caminho(agendamento, previsao_minutos)}
+
+        return _acao_rapida(
+            request,
+            modo,
+            pk,
+            "status",
+            "a_caminho",
+            depois=enfileirar_sms,
+            previsao_chegada=previsao_minutos,
+        )
+
     agendamento = get_object_or_404(Agendamento, pk=pk)
 
     if request.method == "POST":
@@ -160,33 +595,28 @@ def on_the_way_agendamento(request, pk):
         if form.is_valid():
             previsao_minutos = form.cleaned_data["previsao_minutos"]
 
-            # Atualiza o agendamento
-            agendamento.status = "a_caminho"
-            agendamento.previsao_chegada = previsao_minutos
-            agendamento.save()
+            # Atualiza o agendamento e enfileira o SMS na mesma transação:
+            # a mensagem só entra na fila se o status for gravado
+            with transaction.atomic():
+                agendamento.status = "a_caminho"
+                agendamento.previsao_chegada = previsao_minutos
+                agendamento.save()
 
-            # Envia SMS para o cliente (usando SMSDev)
-            sms_result = smsdev_service.enviar_barbeiro_a_caminho(
-                agendamento, previsao_minutos
-            )
+                sms_result = enfileirar_barbeiro_a_caminho(
+                    agendamento, previsao_minutos
+                )
 
             if sms_result["sucesso"]:
                 messages.success(
                     request,
-                    f'Status alterado para "À caminho" e SMS enviado! Previsão: {previsao_minutos} minutos.',
+                    f'Status alterado para "À caminho"! O SMS será enviado em instantes. Previsão: {previsao_minutos} minutos.',
                 )
             else:
                 messages.warning(
                     request,
-                    f'Status alterado para "À caminho", mas falha no SMS: {sms_result["erro"]}',
+                    f'Status alterado para "À caminho", mas o SMS não foi enviado: {sms_result["erro"]}',
                 )
 
-            # Log do resultado do SMS
-            import logging
-
-            logger = logging.getLogger(__name__)
-            logger.info(f"SMS enviado para {agendamento.cliente.nome}: {sms_result}")
-
             return redirect("painel_barbeiro")
     else:
         form = PrevisaoChegadaForm()
@@ -201,6 +631,10 @@ def on_the_way_agendamento(request, pk):
 @login_required
 def concluir_agendamento(request, pk):
     """Marcar um agendamento como concluído"""
+    modo = _modo_rapido(request)
+    if modo:
+        return _acao_rapida(request, modo, pk, "status", "concluido")
+
     agendamento = get_object_or_404(Agendamento, pk=pk)
     agendamento.status = "concluido"
     agendamento.save()
@@ -236,18 +670,18 @@ def agendamentos_mensais(request):
         ano = hoje.year
         mes = hoje.month
 
-    # Buscar agendamentos do mês
-    agendamentos = Agendamento.objects.filter(
-        data__gte=data_inicio, data__lt=data_fim
-    ).order_by("data", "hora")
-
-    # Organizar agendamentos por data
-    agendamentos_por_data = {}
-    for agendamento in agendamentos:
-        data_str = agendamento.data.strftime("%Y-%m-%d")
-        if data_str not in agendamentos_por_data:
-            agendamentos_por_data[data_str] = []
-        agendamentos_por_data[data_str].append(agendamento)
+    # Só as contagens por dia; os agendamentos de um dia são carregados sob
+    # demanda por agendamentos_do_dia. Estatísticas do mês: uma agregação
+    # sobre o resumo diário
+    contagens, estatisticas = cache_consultas.obter(
+        "mensais",
+        [data_inicio],
+        [cache_consultas.escopo_mes(data_inicio)],
+        lambda: (
+            contagens_por_dia(data_inicio, data_fim),
+            resumo_status(data_inicio, data_fim),
+        ),
+    )
 
     # Calcular informações do calendário
     primeiro_dia = datetime(ano, mes, 1)
@@ -279,6 +713,9 @@ def agendamentos_mensais(request):
                     "date_str": date_str,
                     "is_current_month": is_current_month,
                     "is_today": is_today,
+                    "contagem": (
+                        contagens.get(day_date.date()) if is_current_month else None
+                    ),
                 }
             )
 
@@ -311,16 +748,13 @@ def agendamentos_mensais(request):
         "Dezembro",
     ]
 
-    # Estatísticas do mês
-    total_agendamentos = len(agendamentos)
-    concluidos = len([a for a in agendamentos if a.status == "concluido"])
-    pendentes = len(
-        [a for a in agendamentos if a.status in ["confirmado", "a_caminho"]]
-    )
-
     context = {
-        "agendamentos": agendamentos,
-        "agendamentos_por_data": agendamentos_por_data,
+        "agendamentos": [
+            {"data": dia, **contagem} for dia, contagem in contagens.items()
+        ],
+        "contagens_por_data": {
+            dia.isoformat(): contagem for dia, contagem in contagens.items()
+        },
         "calendar_weeks": calendar_weeks,
         "ano": ano,
         "mes": mes,
@@ -331,14 +765,123 @@ def agendamentos_mensais(request):
         "ano_anterior": ano_anterior,
         "mes_proximo": mes_proximo,
         "ano_proximo": ano_proximo,
-        "total_agendamentos": total_agendamentos,
-        "concluidos": concluidos,
-        "pendentes": pendentes,
+        "total_agendamentos": estatisticas["total"],
+        "concluidos": estatisticas["concluidos"],
+        "pendentes": estatisticas["pendentes"],
     }
 
     return render(request, "agendamentos/agendamentos_mensais.html", context)
 
 
+@login_required
+def agendamentos_do_dia(request):
+    """
+    Retorna em JSON os agendamentos de ``data``, para a lista do dia no
+    calendário mensal. Responde com ETag; se o dia não mudou desde a última
+    visita, o navegador recebe 304 e usa a cópia em cache.
+
+    O ETag vem das versões do cache do dia e de ``GERAL``, como no painel:
+    qualquer alteração nos agendamentos do dia, ou em clientes e serviços
+    (nomes que entram no JSON), troca a versão, sem consultar o banco.
+    """
+    try:
+        dia = date.fromisoformat(request.GET.get("data", ""))
+    except ValueError:
+        return JsonResponse({"erro": "Data inválida"}, status=400)
+
+    versoes = cache_consultas.versoes([cache_consultas.escopo_dia(dia)])
+    etag = None
+    if None not in versoes:
+        etag = f'"{dia.isoformat()}-{"-".join(str(versao) for versao in versoes)}"'
+    nao_modificado = _nao_modificado(request, etag)
+    if nao_modificado is not None:
+        return nao_modificado
+
+    linhas = (
+        Agendamento.objects.filter(data=dia)
+        .order_by("hora")
+        .values(
+            "id",
+            "hora",
+            "status",
+            "observacoes",
+            "previsao_chegada",
+            cliente_nome=F("cliente__nome"),
+            servico_nome=F("servico__nome"),
+        )
+    )
+    response = JsonResponse(
+        {
+            "data": dia.isoformat(),
+            "agendamentos": [
+                {
+                    "id": linha["id"],
+                    "hora": linha["hora"].strftime("%H:%M"),
+                    "cliente": linha["cliente_nome"] or "",
+                    "servico": linha["servico_nome"],
+                    "status": linha["status"],
+                    "observacoes": linha["observacoes"] or "",
+                    "previsao_chegada": linha["previsao_chegada"],
+                }
+                for linha in linhas
+            ],
+        }
+    )
+    return _com_etag(response, etag)
+
+
+def _dados_financeiro(data_selecionada, filtro_pagamento):
+    # Buscar agendamentos do dia
+    agendamentos = Agendamento.objects.filter(data=data_selecionada).order_by("hora")
+
+    # Aplicar filtro de pagamento
+    if filtro_pagamento in FILTROS_PAGAMENTO:
+        agendamentos = agendamentos.filter(status_pagamento=filtro_pagamento)
+    # Se for 'todos' ou 'visao_geral', não precisa filtrar
+
+    # Totais do dia, do mês e do ano lidos do resumo diário em uma única query
+    resumo = resumo_financeiro(data_selecionada)
+
+    # Buscar cortes detalhados mensais e anuais
+    inicio_mes, fim_mes = intervalo_mes(data_selecionada)
+    inicio_ano, fim_ano = intervalo_ano(data_selecionada)
+    agendamentos_mes = Agendamento.objects.filter(
+        data__gte=inicio_mes, data__lt=fim_mes
+    ).order_by("-data", "hora")
+    agendamentos_ano = Agendamento.objects.filter(
+        data__gte=inicio_ano, data__lt=fim_ano
+    ).order_by("-data", "hora")
+    campos_cortes = ("id", "data", "valor", "cliente__nome", "servico__nome")
+
+    return {
+        "agendamentos": cache_consultas.projetar(
+            agendamentos,
+            "id",
+            "hora",
+            "status_pagamento",
+            "valor",
+            "cliente__nome",
+            "cliente__telefone",
+            "servico__nome",
+        ),
+        "dia": resumo["dia"],
+        "mes": resumo["mes"],
+        "ano": resumo["ano"],
+        "cortes_pagos_mes": cache_consultas.projetar(
+            agendamentos_mes.filter(status_pagamento="pago"), *campos_cortes
+        ),
+        "cortes_pendentes_mes": cache_consultas.projetar(
+            agendamentos_mes.filter(status_pagamento="pendente"), *campos_cortes
+        ),
+        "cortes_pagos_ano": cache_consultas.projetar(
+            agendamentos_ano.filter(status_pagamento="pago"), *campos_cortes
+        ),
+        "cortes_pendentes_ano": cache_consultas.projetar(
+            agendamentos_ano.filter(status_pagamento="pendente"), *campos_cortes
+        ),
+    }
+
+
 @login_required
 def financeiro(request):
     """Visualizar relatório financeiro com status de pagamento dos clientes"""
@@ -357,145 +900,93 @@ def financeiro(request):
         "filtro", "todos"
     )  # todos, pendente, pago, visao_geral
 
-    # Buscar agendamentos do dia
-    agendamentos = Agendamento.objects.filter(data=data_selecionada).order_by("hora")
-
-    # Aplicar filtro de pagamento
-    if filtro_pagamento == "pendente":
-        agendamentos = agendamentos.filter(status_pagamento="pendente")
-    elif filtro_pagamento == "pago":
-        agendamentos = agendamentos.filter(status_pagamento="pago")
-    # Se for 'todos' ou 'visao_geral', não precisa filtrar
-
-    # Calcular estatísticas do dia
-    todos_agendamentos = Agendamento.objects.filter(data=data_selecionada)
-    total_pendente = todos_agendamentos.filter(status_pagamento="pendente").count()
-    total_pago = todos_agendamentos.filter(status_pagamento="pago").count()
-    total_geral = todos_agendamentos.count()
-
-    # Calcular valores monetários do dia
-    valor_pendente = sum(
-        [
-            a.servico.preco
-            for a in todos_agendamentos.filter(status_pagamento="pendente")
-        ]
-    )
-    valor_recebido = sum(
-        [a.servico.preco for a in todos_agendamentos.filter(status_pagamento="pago")]
-    )
-    valor_total = valor_pendente + valor_recebido
-
-    # Calcular estatísticas mensais baseadas na data selecionada
-    mes_atual = data_selecionada.month
-    ano_atual = data_selecionada.year
-    data_inicio_mes = datetime(ano_atual, mes_atual, 1).date()
-    if mes_atual == 12:
-        data_fim_mes = datetime(ano_atual + 1, 1, 1).date()
+    if filtro_pagamento not in FILTROS_PAGAMENTO:
+        filtro_dados = "todos"
     else:
-        data_fim_mes = datetime(ano_atual, mes_atual + 1, 1).date()
-
-    agendamentos_mes = Agendamento.objects.filter(
-        data__gte=data_inicio_mes, data__lt=data_fim_mes
-    )
+        filtro_dados = filtro_pagamento
 
-    total_mes = sum([a.servico.preco for a in agendamentos_mes])
-    recebido_mes = sum(
-        [a.servico.preco for a in agendamentos_mes.filter(status_pagamento="pago")]
-    )
-    pendente_mes = sum(
-        [a.servico.preco for a in agendamentos_mes.filter(status_pagamento="pendente")]
-    )
-    pagos_mes = agendamentos_mes.filter(status_pagamento="pago").count()
-    pendentes_mes = agendamentos_mes.filter(status_pagamento="pendente").count()
-    agendamentos_mes_count = agendamentos_mes.count()
-
-    # Taxa de recebimento mensal
-    taxa_recebimento_mes = (recebido_mes / total_mes * 100) if total_mes > 0 else 0
-
-    # Calcular estatísticas anuais
-    data_inicio_ano = datetime(ano_atual, 1, 1).date()
-    data_fim_ano = datetime(ano_atual + 1, 1, 1).date()
-
-    agendamentos_ano = Agendamento.objects.filter(
-        data__gte=data_inicio_ano, data__lt=data_fim_ano
+    # Tudo o que a página mostra depende do ano inteiro (totais e cortes)
+    leitura = cache_consultas.Leitura(
+        "financeiro",
+        [data_selecionada, filtro_dados],
+        [cache_consultas.escopo_ano(data_selecionada)],
     )
+    # O filtro escolhido também aparece na página
+    etag = _etag_pagina(request, leitura, filtro_pagamento)
+    nao_modificado = _nao_modificado(request, etag)
+    if nao_modificado is not None:
+        return nao_modificado
 
-    total_ano = sum([a.servico.preco for a in agendamentos_ano])
-    recebido_ano = sum(
-        [a.servico.preco for a in agendamentos_ano.filter(status_pagamento="pago")]
-    )
-    pendente_ano = sum(
-        [a.servico.preco for a in agendamentos_ano.filter(status_pagamento="pendente")]
-    )
-    pagos_ano = agendamentos_ano.filter(status_pagamento="pago").count()
-    pendentes_ano = agendamentos_ano.filter(status_pagamento="pendente").count()
-    agendamentos_ano_count = agendamentos_ano.count()
-
-    # Taxa de recebimento anual
-    taxa_recebimento_ano = (recebido_ano / total_ano * 100) if total_ano > 0 else 0
+    dados = leitura.valor(lambda: _dados_financeiro(data_selecionada, filtro_dados))
+    agendamentos = dados["agendamentos"]
+    dia, mes, ano = dados["dia"], dados["mes"], dados["ano"]
 
     # Percentuais para gráfico
-    percentual_recebido_mes = (recebido_mes / total_mes * 100) if total_mes > 0 else 0
-    percentual_pendente_mes = (pendente_mes / total_mes * 100) if total_mes > 0 else 0
-
-    # Buscar cortes detalhados mensais
-    cortes_pagos_mes = agendamentos_mes.filter(status_pagamento="pago").order_by(
-        "-data", "hora"
-    )
-    cortes_pendentes_mes = agendamentos_mes.filter(
-        status_pagamento="pendente"
-    ).order_by("-data", "hora")
-
-    # Buscar cortes detalhados anuais
-    cortes_pagos_ano = agendamentos_ano.filter(status_pagamento="pago").order_by(
-        "-data", "hora"
+    total_mes = mes["valor_total"]
+    percentual_recebido_mes = taxa_recebimento(mes)
+    percentual_pendente_mes = (
+        (mes["valor_pendente"] / total_mes * 100) if total_mes > 0 else 0
     )
-    cortes_pendentes_ano = agendamentos_ano.filter(
-        status_pagamento="pendente"
-    ).order_by("-data", "hora")
 
     context = {
         "agendamentos": agendamentos,
         "data_selecionada": data_selecionada,
         "filtro_pagamento": filtro_pagamento,
-        "total_pendente": total_pendente,
-        "total_pago": total_pago,
-        "total_geral": total_geral,
-        "valor_pendente": valor_pendente,
-        "valor_recebido": valor_recebido,
-        "valor_total": valor_total,
+        "total_pendente": dia["pendentes"],
+        "total_pago": dia["pagos"],
+        "total_geral": dia["quantidade"],
+        "valor_pendente": dia["valor_pendente"],
+        "valor_recebido": dia["valor_pago"],
+        "valor_total": dia["valor_pendente"] + dia["valor_pago"],
         # Estatísticas mensais
-        "total_mes": total_mes,
-        "recebido_mes": recebido_mes,
-        "pendente_mes": pendente_mes,
-        "pagos_mes": pagos_mes,
-        "pendentes_mes": pendentes_mes,
-        "agendamentos_mes": agendamentos_mes_count,
-        "taxa_recebimento_mes": taxa_recebimento_mes,
+        "total_mes": mes["valor_total"],
+        "recebido_mes": mes["valor_pago"],
+        "pendente_mes": mes["valor_pendente"],
+        "pagos_mes": mes["pagos"],
+        "pendentes_mes": mes["pendentes"],
+        "agendamentos_mes": mes["quantidade"],
+        "taxa_recebimento_mes": taxa_recebimento(mes),
         # Estatísticas anuais
-        "total_ano": total_ano,
-        "recebido_ano": recebido_ano,
-        "pendente_ano": pendente_ano,
-        "pagos_ano": pagos_ano,
-        "pendentes_ano": pendentes_ano,
-        "agendamentos_ano": agendamentos_ano_count,
-        "taxa_recebimento_ano": taxa_recebimento_ano,
+        "total_ano": ano["valor_total"],
+        "recebido_ano": ano["valor_pago"],
+        "pendente_ano": ano["valor_pendente"],
+        "pagos_ano": ano["pagos"],
+        "pendentes_ano": ano["pendentes"],
+        "agendamentos_ano": ano["quantidade"],
+        "taxa_recebimento_ano": taxa_recebimento(ano),
         # Percentuais para gráfico
         "percentual_recebido_mes": percentual_recebido_mes,
         "percentual_pendente_mes": percentual_pendente_mes,
         # Cortes detalhados
-        "cortes_pagos_mes": cortes_pagos_mes,
-        "cortes_pendentes_mes": cortes_pendentes_mes,
-        "cortes_pagos_ano": cortes_pagos_ano,
-        "cortes_pendentes_ano": cortes_pendentes_ano,
+        "cortes_pagos_mes": dados["cortes_pagos_mes"],
+        "cortes_pendentes_mes": dados["cortes_pendentes_mes"],
+        "cortes_pagos_ano": dados["cortes_pagos_ano"],
+        "cortes_pendentes_ano": dados["cortes_pendentes_ano"],
     }
 
-    return render(request, "agendamentos/financeiro.html", context)
+    response = render(request, "agendamentos/financeiro.html", context)
+    return _com_etag(response, etag)
 
 
 @login_required
 def alterar_status_pagamento(request, pk):
     """Alternar status de pagamento de um agendamento"""
+    modo = _modo_rapido(request)
+    if modo:
+        # Sem carregar o agendamento: com dois valores possíveis, "para" e
+        # "de" (o valor exibido) são sempre o oposto um do outro
+        valores = alteracoes.VALORES["status_pagamento"]
+        novo, anterior = request.POST.get("para"), request.POST.get("de")
+        if novo in valores and anterior is None:
+            [anterior] = [valor for valor in valores if valor != novo]
+        elif anterior in valores and novo is None:
+            [novo] = [valor for valor in valores if valor != anterior]
+        if novo not in valores or anterior not in valores:
+            return JsonResponse(
+                {"erro": 'Informe "para" ou "de" (pendente ou pago)'}, status=400
+            )
+        return _acao_rapida(request, modo, pk, "status_pagamento", novo, anterior)
+
     agendamento = get_object_or_404(Agendamento, pk=pk)
 
     # Alternar entre pendente e pago
@@ -516,6 +1007,53 @@ def alterar_status_pagamento(request, pk):
     return redirect(f"{request.META.get('HTTP_REFERER', 'financeiro')}")
 
 
+@login_required
+@require_POST
+def alterar_em_lote(request):
+    """
+    Aplica um status ou um pagamento aos agendamentos selecionados
+
+    Cada valor anterior possível vira um único UPDATE com todos os ids
+    (ver ``alteracoes.alterar``), que também ajusta o resumo diário e o
+    cache. Responde JSON com Accept: application/json; senão volta para a
+    página de origem com a quantidade alterada.
+    """
+    campo = request.POST.get("campo")
+    valor = request.POST.get("valor")
+    try:
+        # A mesma linha pode vir repetida (tabela e cards do celular)
+        pks = list(dict.fromkeys(int(pk) for pk in request.POST.getlist("ids")))
+    except ValueError:
+        pks = None
+
+    erro = None
+    if campo not in VALORES_EM_LOTE or valor not in VALORES_EM_LOTE[campo]:
+        erro = "Alteração inválida"
+    elif not pks:
+        erro = "Nenhum agendamento selecionado"
+    elif len(pks) > LIMITE_LOTE:
+        erro = f"Selecione no máximo {LIMITE_LOTE} agendamentos"
+
+    quer_json = "application/json" in request.headers.get("Accept", "")
+    if erro:
+        if quer_json:
+            return JsonResponse({"erro": erro}, status=400)
+        messages.error(request, erro)
+    else:
+        linhas = alteracoes.alterar(pks, campo, valor)
+        if quer_json:
+            return JsonResponse(
+                {"alterados": len(linhas), "ids": [linha["id"] for linha in linhas]}
+            )
+        rotulos = dict(Agendamento.STATUS_CHOICES + Agendamento.PAGAMENTO_CHOICES)
+        messages.success(
+            request,
+            f'{len(linhas)} agendamento(s) alterado(s) para "{rotulos[valor]}".',
+        )
+
+    return redirect(request.META.get("HTTP_REFERER") or "painel_barbeiro")
+
+
 # ===== GESTÃO DE SERVIÇOS =====
 
 
@@ -599,3 +1137,27 @@ def deletar_servico(request, pk):
         "agendamentos/servico_confirm_delete.html",
         {"servico": servico, "agendamentos_count": agendamentos_count},
     )
+
+
+@require_GET
+def metricas_prometheus(request):
+    """
+    Métricas no formato do Prometheus
+
+    Acesso com login de staff ou com ``Authorization: Bearer <METRICAS_TOKEN>``
+    (para o coletor); sem ``METRICAS`` ligado a página não existe.
+    """
+    if not settings.METRICAS:
+        raise Http404
+
+    token = settings.METRICAS_TOKEN
+    autorizacao = request.headers.get("Authorization", "")
+    por_token = bool(token) and hmac.compare_digest(
+        autorizacao.encode(), f"Bearer {token}".encode()
+    )
+    if not (por_token or request.user.is_staff):
+        response = HttpResponse("Acesso restrito", status=401)
+        response["WWW-Authenticate"] = 'Bearer realm="metricas"'
+        return response
+
+    return HttpResponse(metricas.exportar(), content_type=metricas.CONTENT_TYPE)
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -60,6 +61,16 @@ SMS_ENABLED = (
 SMSDEV_USUARIO = os.getenv("SMSDEV_USUARIO", "")  # Seu email cadastrado na SMSDev
 SMSDEV_TOKEN = os.getenv("SMSDEV_TOKEN", "")  # Token obtido na SMSDev
 
+# Conexões HTTP com a SMSDev (reaproveitadas entre mensagens)
+SMSDEV_POOL_TAMANHO = int(os.getenv("SMSDEV_POOL_TAMANHO", "10"))
+SMSDEV_TENTATIVAS = int(os.getenv("SMSDEV_TENTATIVAS", "2"))
+SMSDEV_TIMEOUT_CONEXAO = float(os.getenv("SMSDEV_TIMEOUT_CONEXAO", "3.05"))
+SMSDEV_TIMEOUT_LEITURA = float(os.getenv("SMSDEV_TIMEOUT_LEITURA", "10"))
+
+# Envio em lote: mensagens em paralelo e limite de taxa do provedor (0 = sem limite)
+SMSDEV_MAX_SIMULTANEOS = int(os.getenv("SMSDEV_MAX_SIMULTANEOS", "5"))
+SMSDEV_MENSAGENS_POR_SEGUNDO = float(os.getenv("SMSDEV_MENSAGENS_POR_SEGUNDO", "0"))
+
 # Configuração básica de Logs
 LOGGING = {
     "version": 1,
@@ -72,8 +83,39 @@ LOGGING = {
     "root": {
         "handlers": ["console"],
     },
+    "loggers": {
+        # Uma linha por requisição quando INSTRUMENTACAO está ligado
+        "agendamentos.instrumentacao": {"level": "INFO"},
+    },
 }
 
+# Instrumentação por requisição: header Server-Timing e log com queries, tempo
+# de SQL, de templates e da view (desligada por padrão)
+INSTRUMENTACAO = os.getenv("INSTRUMENTACAO", "False").lower() == "true"
+
+# Queries acima deste tempo (ms) vão para o log "agendamentos.consultas_lentas"
+# com a view e a linha de origem (0 desliga). No PostgreSQL, com
+# CONSULTAS_LENTAS_EXPLAIN, a primeira de cada forma leva o plano do EXPLAIN
+CONSULTAS_LENTAS_MS = float(os.getenv("CONSULTAS_LENTAS_MS", "0"))
+CONSULTAS_LENTAS_EXPLAIN = (
+    os.getenv("CONSULTAS_LENTAS_EXPLAIN", "False").lower() == "true"
+)
+
+# Atualização ao vivo do painel por server-sent events em /painel/eventos/
+# (desligada por padrão). Cada aba aberta mantém uma conexão com o servidor e
+# uma consulta ao cache a cada 2 segundos; só vale a pena servida em ASGI
+# (barbearia/asgi.py), com o número de abas abertas em mente
+PAINEL_AO_VIVO = os.getenv("PAINEL_AO_VIVO", "False").lower() == "true"
+
+# Métricas do Prometheus em /metrics (latência e queries por rota, cache e
+# SMS), somadas entre os workers por arquivos em METRICAS_DIR. A página exige
+# login de staff ou o header "Authorization: Bearer <METRICAS_TOKEN>"
+METRICAS = os.getenv("METRICAS", "False").lower() == "true"
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN", "")
+METRICAS_DIR = os.getenv(
+    "METRICAS_DIR", os.path.join(tempfile.gettempdir(), "barbearia-metricas")
+)
+
 
 # Application definition
 
@@ -88,6 +130,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Primeiro da lista, para medir também os outros middlewares
+    "agendamentos.instrumentacao.InstrumentacaoMiddleware",
+    "agendamentos.metricas.MetricasMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -102,7 +147,9 @@ ROOT_URLCONF = "barbearia.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates que entra na medição da instrumentação (sem custo
+        # com INSTRUMENTACAO desligado)
+        "BACKEND": "agendamentos.instrumentacao.TemplatesMedidos",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -133,8 +180,43 @@ else:
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            # Vale só para este SQLite local. O runserver (uma thread por
+            # requisição) e o processar_fila_sms escrevem no mesmo arquivo; no
+            # modo padrão (DEFERRED) uma transação que leu antes de escrever
+            # falha na hora com "database is locked", sem respeitar o timeout.
+            # IMMEDIATE pega o lock de escrita no BEGIN e aguarda a vez.
+            "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 20},
+            # Banco de teste em arquivo: o SQLite em memória compartilhada
+            # falha na hora ("table is locked") em vez de aguardar quando
+            # duas threads escrevem ao mesmo tempo (arquivo no .gitignore)
+            "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+        }
+    }
+    # O INCLUDE do índice de pagamento só existe no PostgreSQL; no SQLite a
+    # coluna extra é ignorada
+    SILENCED_SYSTEM_CHECKS = ["models.W040"]
+
+# Cache compartilhado entre os workers do gunicorn, sem serviço externo: uma
+# tabela no banco (criada com "python manage.py createcachetable") ou, se
+# CACHE_DIR estiver definido, arquivos nesse diretório
+if os.getenv("CACHE_DIR"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_DIR"),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+            "LOCATION": "cache_barbearia",
         }
     }
+CACHES["default"]["TIMEOUT"] = int(os.getenv("CACHE_TIMEOUT", "86400"))
+CACHES["default"]["OPTIONS"] = {
+    "MAX_ENTRIES": int(os.getenv("CACHE_MAX_ENTRIES", "5000"))
+}
 
 
 # Password validation
@@ -2,10 +2,15 @@ import os
 
 import django
 
+import pytest
+
 # Configurar Django para pytest
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "barbearia.settings")
 django.setup()
 
+from django.core.cache import cache  # noqa: E402
+from django.test import TransactionTestCase  # noqa: E402
+
 
 # Configurar pytest para encontrar arquivos tests.py
 def pytest_collect_file(file_path, parent):
@@ -14,3 +19,15 @@ def pytest_collect_file(file_path, parent):
         from _pytest.python import Module
 
         return Module.from_parent(parent, path=file_path)
+
+
+@pytest.fixture(autouse=True)
+def limpar_cache(request):
+    """
+    Esvazia o cache antes de cada teste com banco
+
+    O cache fica em uma tabela do banco que o TransactionTestCase não apaga
+    entre um teste e outro.
+    """
+    if isinstance(request.instance, TransactionTestCase):
+        cache.clear()